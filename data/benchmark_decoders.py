@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import tempfile
+from listing_decoder import ListingDecoder, available_backends
+from synthetic_listings import write_synthetic_feed
+
+def benchmark_backend(path, backend, repeats=3):
+    """Medir líneas por segundo de un backend (lectura, strip y decodificación)"""
+    decode = ListingDecoder(backend).decode
+    best = None
+    n_lines = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        n_lines = 0
+        with open(path, 'rb') as file:
+            for raw_line in file:
+                line = raw_line.strip()
+                if line:
+                    decode(line)
+                    n_lines += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return n_lines / best
+
+def main():
+    """Función principal del benchmark"""
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    with tempfile.TemporaryDirectory(prefix='bench_decoders_') as tmp_dir:
+        path = os.path.join(tmp_dir, 'listings.json')
+        print(f"📝 Generando {n_lines:,} propiedades sintéticas...")
+        write_synthetic_feed(path, n_lines)
+        print(f"   Tamaño: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        results = {}
+        for backend in available_backends():
+            results[backend] = benchmark_backend(path, backend)
+
+    baseline = results['json']
+    print("\n⏱️ Líneas por segundo por backend:")
+    for backend, lines_per_sec in sorted(results.items(), key=lambda item: item[1], reverse=True):
+        print(f"   {backend:<8} {lines_per_sec:>12,.0f} líneas/s  ({lines_per_sec / baseline:.2f}x json)")
+
+if __name__ == "__main__":
+    main()
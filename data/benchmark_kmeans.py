@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+from kmeans_clustering import KMEANS_MODES, perform_kmeans_clustering
+
+N_FEATURES = 10
+N_CLUSTERS = 8
+# Por encima de este tamaño el modo completo se omite (demasiado lento para comparar)
+FULL_MODE_MAX_ROWS = 1000000
+
+def write_synthetic_features(path, n_rows, n_features=N_FEATURES, n_centers=N_CLUSTERS,
+                             seed=42, chunk_size=500000):
+    """
+    Escribir una matriz float32 de características escaladas sintéticas (.npy).
+
+    Los datos son grupos gaussianos de distinta dispersión, escritos por
+    bloques para que 5M de filas no requieran la matriz completa en memoria.
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(scale=3.0, size=(n_centers, n_features))
+    spreads = rng.uniform(0.5, 1.5, size=n_centers)
+
+    features = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_rows, n_features))
+    for start in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - start)
+        labels = rng.randint(n_centers, size=size)
+        noise = rng.normal(size=(size, n_features)) * spreads[labels, None]
+        features[start:start + size] = centers[labels] + noise
+    features.flush()
+    del features
+    return path
+
+def benchmark_mode(X, n_clusters, mode):
+    """Ajustar un modo y devolver (segundos, inercia, etiquetas)"""
+    start = time.perf_counter()
+    labels, model = perform_kmeans_clustering(X, n_clusters, mode=mode)
+    return time.perf_counter() - start, model.inertia_, labels
+
+def main():
+    """Comparar calidad y velocidad: python benchmark_kmeans.py [filas,filas,...]"""
+    sizes = [int(size) for size in sys.argv[1].split(',')] if len(sys.argv) > 1 else [100000, 1000000, 5000000]
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='bench_kmeans_') as tmp_dir:
+        for n_rows in sizes:
+            path = os.path.join(tmp_dir, f'features_{n_rows}.npy')
+            print(f"\n📝 Generando {n_rows:,} filas sintéticas...")
+            write_synthetic_features(path, n_rows)
+            X = np.load(path, mmap_mode='r')
+
+            results = {}
+            for mode in KMEANS_MODES:
+                if mode == 'full' and n_rows > FULL_MODE_MAX_ROWS:
+                    continue
+                # Los modos completo y mini-batch necesitan la matriz en memoria
+                data = X if mode == 'streaming' else np.asarray(X)
+                results[mode] = benchmark_mode(data, N_CLUSTERS, mode)
+                del data
+
+            reference = 'full' if 'full' in results else 'minibatch'
+            ref_seconds, ref_inertia, ref_labels = results[reference]
+            for mode, (seconds, inertia, labels) in results.items():
+                rows.append((n_rows, mode, seconds, inertia, inertia / ref_inertia - 1,
+                             adjusted_rand_score(ref_labels, labels), reference))
+            del X
+
+    print("\n⏱️ Calidad vs velocidad por modo:")
+    print(f"   {'filas':>10} {'modo':<10} {'segundos':>9} {'inercia':>16} {'Δ inercia':>10} {'ARI':>6}  referencia")
+    for n_rows, mode, seconds, inertia, gap, ari, reference in rows:
+        print(f"   {n_rows:>10,} {mode:<10} {seconds:>9.2f} {inertia:>16,.0f} {gap:>+10.2%} {ari:>6.3f}  {reference}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+import platform
+import matplotlib
+matplotlib.use('Agg')
+from json2csv import CHUNK_SIZE, json_to_csv
+from kmeans_clustering import load_and_preprocess_data, perform_kmeans_clustering
+from cluster_categories import categorize_listings
+from generate_colombia_map import build_map_html, process_data
+from synthetic_listings import write_synthetic_feed
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'pipeline_baseline.json')
+# Margen sobre la línea base antes de marcar una regresión
+REGRESSION_TOLERANCE = 0.20
+# Por debajo de estos valores las variaciones son ruido y no se marcan
+MIN_SECONDS, MIN_MEGABYTES = 0.5, 5.0
+BENCHMARK_CLUSTERS = 8
+
+def measure(name, results, function, *args, **kwargs):
+    """
+    Ejecutar una etapa midiendo su tiempo y su pico de memoria.
+
+    El pico se mide con tracemalloc (Python y arreglos numpy/pandas) y es
+    relativo a la memoria ya ocupada al empezar la etapa.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {'seconds': round(seconds, 3), 'peak_mb': round(peak / 1e6, 1)}
+        print(f"   {name:<24} {seconds:>8.2f} s {peak / 1e6:>9.1f} MB")
+
+def run_benchmark(n_rows, work_dir):
+    """Ejecutar todas las etapas del pipeline sobre un feed sintético de `n_rows` filas"""
+    results = {}
+    json_path = os.path.join(work_dir, f'listings_{n_rows}.json')
+    csv_path = os.path.join(work_dir, f'listings_{n_rows}.csv')
+
+    print(f"\n📝 Generando {n_rows:,} propiedades sintéticas...")
+    write_synthetic_feed(json_path, n_rows)
+
+    measure('json_to_csv', results, json_to_csv, json_path, csv_path, chunksize=CHUNK_SIZE)
+    df, X_scaled, _, _ = measure('load_and_preprocess_data', results, load_and_preprocess_data, csv_path)
+    clusters, _ = measure('perform_kmeans_clustering', results, perform_kmeans_clustering,
+                          X_scaled, BENCHMARK_CLUSTERS)
+    df['cluster'] = clusters
+    df = measure('cluster_categories', results, categorize_listings, df, visualize=False)
+    map_df = process_data(df)
+    measure('create_interactive_map', results, build_map_html, map_df)
+
+    os.remove(json_path)
+    os.remove(csv_path)
+    return results
+
+def find_regressions(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Comparar con la línea base: (tamaño, etapa, métrica, base, actual)"""
+    regressions = []
+    for size, stages in current.items():
+        for stage, metrics in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None:
+                continue
+            for metric, floor in (('seconds', MIN_SECONDS), ('peak_mb', MIN_MEGABYTES)):
+                if metrics[metric] > max(reference[metric] * (1 + tolerance), floor):
+                    regressions.append((size, stage, metric, reference[metric], metrics[metric]))
+    return regressions
+
+def main():
+    """Benchmark del pipeline: python benchmark_pipeline.py [filas,filas,...] [--save-baseline]"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    sizes = [int(size) for size in args[0].split(',')] if args else DEFAULT_SIZES
+
+    current = {}
+    with tempfile.TemporaryDirectory(prefix='bench_pipeline_') as work_dir:
+        for n_rows in sizes:
+            current[str(n_rows)] = run_benchmark(n_rows, work_dir)
+
+    if '--save-baseline' in sys.argv:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as file:
+            json.dump({'machine': platform.node(), 'python': platform.python_version(),
+                       'results': current}, file, indent=2)
+        print(f"\n📁 Línea base guardada en: {BASELINE_PATH}")
+        return
+
+    if not os.path.exists(BASELINE_PATH):
+        print(f"\nℹ️ Sin línea base en {BASELINE_PATH}; ejecute con --save-baseline para crearla")
+        return
+
+    with open(BASELINE_PATH, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)['results']
+
+    regressions = find_regressions(current, baseline)
+    if not regressions:
+        print(f"\n✅ Sin regresiones frente a la línea base (tolerancia {REGRESSION_TOLERANCE:.0%})")
+        return
+
+    print(f"\n⚠️ {len(regressions)} regresiones frente a la línea base:")
+    for size, stage, metric, reference, value in regressions:
+        print(f"   {int(size):>9,} filas  {stage:<24} {metric:<8} {reference:>9.2f} → {value:>9.2f}")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from cluster_model import CLUSTER_FEATURES
+from listings_io import atomic_write, dataset_path, iter_listing_chunks
+
+CHUNK_SIZE = 100000
+# Elementos por nivel del sketch de cuantiles; el error de rango es ~ log2(n / capacidad) / capacidad
+SKETCH_CAPACITY = 4096
+FEATURES_FORMAT_VERSION = 1
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles en streaming con memoria acotada (compactadores tipo KLL).
+
+    Cada nivel h guarda valores que representan 2^h observaciones. Cuando un
+    nivel supera su capacidad se ordena y se promueve al siguiente la mitad
+    de sus elementos (los de posición par o impar, al azar), de modo que la
+    memoria crece solo con el logaritmo del número de valores.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY, seed=0):
+        self.capacity = capacity
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        """Añadir un bloque de valores (los NaN se ignoran)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity:
+                items.sort()
+                # Con un número impar de elementos, el último se queda en el nivel
+                even = len(items) - len(items) % 2
+                promoted = items[int(self._rng.integers(2)):even:2]
+                self.levels[level] = items[even:].copy()
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q):
+        """Cuantil aproximado `q` (entre 0 y 1); NaN si el sketch está vacío"""
+        if self.count == 0:
+            return np.nan
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return float(values[order][min(position, len(values) - 1)])
+
+class RunningMoments:
+    """Conteo, media y suma de cuadrados centrados por columna, combinados por bloques (Chan et al.)"""
+
+    def __init__(self, n_features):
+        self.count = np.zeros(n_features)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, X):
+        """Añadir un bloque de filas (los NaN se ignoran columna por columna)"""
+        present = ~np.isnan(X)
+        count = present.sum(axis=0).astype(np.float64)
+        sums = np.where(present, X, 0.0).sum(axis=0)
+        mean = np.divide(sums, count, out=np.zeros_like(sums), where=count > 0)
+        m2 = np.where(present, (X - mean) ** 2, 0.0).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        safe_total = np.maximum(total, 1)
+        self.mean = self.mean + delta * count / safe_total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / safe_total
+        self.count = total
+
+def _numeric_matrix(chunk, features):
+    """Matriz float64 de las características de un bloque (faltantes como NaN)"""
+    frame = chunk.reindex(columns=features)
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in frame.dtypes):
+        frame = frame.apply(pd.to_numeric, errors='coerce')
+    return frame.to_numpy(dtype=np.float64, na_value=np.nan)
+
+def features_path_for(source_path):
+    """Ruta por defecto de la matriz escalada de un dataset"""
+    return os.path.splitext(source_path)[0] + '_features.npy'
+
+def _source_signature(source_path):
+    """Tamaño y fecha de modificación del dataset, para detectar matrices obsoletas"""
+    stat = os.stat(source_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def preprocess_to_memmap(source_path, features_path=None, features=None, chunksize=CHUNK_SIZE):
+    """
+    Imputar y escalar un dataset por bloques y guardar la matriz como .npy float32.
+
+    Hace dos pasadas sobre el archivo sin cargarlo completo:
+    1. Un sketch de cuantiles por columna (para las medianas) y la media y
+       varianza incrementales de los valores presentes.
+    2. Imputa con las medianas, escala y escribe cada bloque en un .npy
+       mapeado en memoria.
+
+    La media y la varianza de los datos imputados se obtienen de forma
+    analítica al combinar los valores presentes con los faltantes (todos
+    iguales a la mediana), así que coinciden con SimpleImputer + StandardScaler
+    salvo por la aproximación de la mediana. Las columnas sin ningún valor se
+    descartan, como hace SimpleImputer.
+
+    Returns:
+        tuple: (matriz np.memmap de solo lectura, parámetros del preprocesamiento)
+    """
+    features_path = features_path or features_path_for(source_path)
+    features = list(features or CLUSTER_FEATURES)
+
+    # Primera pasada: cuantiles y momentos
+    sketches = [QuantileSketch(seed=position) for position in range(len(features))]
+    moments = RunningMoments(len(features))
+    n_rows = 0
+    for chunk in iter_listing_chunks(source_path, columns=features, chunksize=chunksize):
+        X = _numeric_matrix(chunk, features)
+        n_rows += len(X)
+        moments.update(X)
+        for position, sketch in enumerate(sketches):
+            sketch.update(X[:, position])
+
+    kept = moments.count > 0
+    features = [feature for feature, keep in zip(features, kept) if keep]
+    medians = np.array([sketch.quantile(0.5) for sketch, keep in zip(sketches, kept) if keep])
+    present = moments.count[kept]
+    missing = n_rows - present
+
+    mean = (present * moments.mean[kept] + missing * medians) / max(n_rows, 1)
+    m2 = moments.m2[kept] + (moments.mean[kept] - medians) ** 2 * present * missing / max(n_rows, 1)
+    scale = np.sqrt(m2 / max(n_rows, 1))
+    scale[scale == 0] = 1.0
+
+    # Segunda pasada: imputar, escalar y escribir
+    with atomic_write(features_path) as tmp_path:
+        X_scaled = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                             shape=(n_rows, len(features)))
+        start = 0
+        for chunk in iter_listing_chunks(source_path, columns=features, chunksize=chunksize):
+            X = _numeric_matrix(chunk, features)
+            X = np.where(np.isnan(X), medians, X)
+            X_scaled[start:start + len(X)] = (X - mean) / scale
+            start += len(X)
+        X_scaled.flush()
+        del X_scaled
+
+    params = {
+        'format_version': FEATURES_FORMAT_VERSION,
+        'source': _source_signature(source_path),
+        'n_rows': n_rows,
+        'features': features,
+        'medians': medians.tolist(),
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+    }
+    with open(f"{features_path}.json", 'w', encoding='utf-8') as file:
+        json.dump(params, file, indent=2)
+
+    return np.load(features_path, mmap_mode='r'), params
+
+def load_scaled_features(source_path, features_path=None):
+    """
+    Mapear la matriz escalada de un dataset si existe y está al día.
+
+    Returns:
+        tuple: (matriz np.memmap, parámetros) o None si hay que recalcularla
+    """
+    features_path = features_path or features_path_for(source_path)
+    if not (os.path.exists(features_path) and os.path.exists(f"{features_path}.json")):
+        return None
+    with open(f"{features_path}.json", 'r', encoding='utf-8') as file:
+        params = json.load(file)
+    if (params.get('format_version') != FEATURES_FORMAT_VERSION
+            or params.get('source') != _source_signature(source_path)):
+        return None
+    return np.load(features_path, mmap_mode='r'), params
+
+def scaled_features(source_path, features_path=None, chunksize=CHUNK_SIZE):
+    """Matriz escalada de un dataset: la mapea si está al día o la calcula por bloques"""
+    cached = load_scaled_features(source_path, features_path)
+    if cached is not None:
+        print(f"♻️ Usando matriz escalada existente: {features_path or features_path_for(source_path)}")
+        return cached
+    print(f"⚙️ Preprocesando por bloques: {source_path}")
+    return preprocess_to_memmap(source_path, features_path, chunksize=chunksize)
+
+def main():
+    """Preprocesar un dataset fuera de memoria: python chunked_preprocess.py [DATASET] [SALIDA.npy]"""
+    source_path = sys.argv[1] if len(sys.argv) > 1 else dataset_path("inmobiliario")
+    features_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    try:
+        start = time.perf_counter()
+        X_scaled, params = preprocess_to_memmap(source_path, features_path)
+        print(f"✅ {X_scaled.shape[0]:,} filas x {X_scaled.shape[1]} características en "
+              f"{time.perf_counter() - start:.2f} s")
+        print(f"📁 Matriz float32 guardada en: {X_scaled.filename}")
+    except Exception as e:
+        print(f"❌ Error durante el preprocesamiento: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
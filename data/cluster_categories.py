@@ -1,22 +1,179 @@
+import os
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
+# plotting elige el backend (Agg sin pantalla) antes de que se importe pyplot
+from plotting import PLOTS_DIR, submit_figure, wait_for_figures
 import matplotlib.pyplot as plt
-import seaborn as sns
+from listings_io import dataset_path, load_listing_frame, write_listings
+
+def _column(df, name):
+    """Columna numérica del DataFrame, o NaN si no existe (las comparaciones dan False)"""
+    if name not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[name], errors='coerce')
+
+def _contains(df, name, pattern):
+    """str.contains sin distinguir mayúsculas; en categóricas se evalúa una vez por categoría"""
+    if name not in df.columns:
+        return pd.Series(False, index=df.index)
+    series = df[name]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        matches = series.cat.categories.astype(str).str.contains(pattern, case=False, regex=True)
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(np.append(matches, False)[codes], index=df.index)
+    return series.astype('string').str.contains(pattern, case=False, na=False).astype(bool)
+
+# Categorías basadas en características, como expresiones sobre columnas completas.
+# El orden define el bit de cada categoría en la columna 'category_mask'.
+CATEGORY_RULES = {
+    'Premium_Lujo': {
+        'criteria': lambda df: (_column(df, 'rent_value') >= 1000000000) |
+                               (_column(df, 'sale_value') >= 5000000000),
+        'description': 'Propiedades de ultra lujo con valores excepcionales'
+    },
+    'Alto_Valor': {
+        'criteria': lambda df: (_column(df, 'rent_value') >= 50000000) &
+                               (_column(df, 'rent_value') < 1000000000),
+        'description': 'Propiedades de alto valor con amenities premium'
+    },
+    'Medio_Alto': {
+        'criteria': lambda df: (_column(df, 'rent_value') >= 20000000) &
+                               (_column(df, 'rent_value') < 50000000) &
+                               (_column(df, 'stratum') >= 5),
+        'description': 'Propiedades de clase media-alta en estratos altos'
+    },
+    'Medio': {
+        'criteria': lambda df: (_column(df, 'rent_value') >= 10000000) &
+                               (_column(df, 'rent_value') < 20000000) &
+                               (_column(df, 'stratum') >= 4),
+        'description': 'Propiedades de clase media con buen estándar'
+    },
+    'Económico': {
+        'criteria': lambda df: (_column(df, 'rent_value') >= 1000000) &
+                               (_column(df, 'rent_value') < 10000000),
+        'description': 'Propiedades económicas con buen valor'
+    },
+    'Comercial': {
+        'criteria': lambda df: _contains(df, 'property_type', 'local|bodega|oficina'),
+        'description': 'Propiedades comerciales y de negocio'
+    },
+    'Residencial_Familiar': {
+        'criteria': lambda df: (_column(df, 'rooms') >= 3) &
+                               (_column(df, 'bathrooms') >= 2) &
+                               (_column(df, 'area') >= 100),
+        'description': 'Propiedades familiares con amplio espacio'
+    },
+    'Estudio_Eficiencia': {
+        'criteria': lambda df: (_column(df, 'rooms') <= 1) &
+                               (_column(df, 'area') < 60),
+        'description': 'Estudios y apartamentos eficientes'
+    }
+}
+CATEGORY_BITS = {name: 1 << position for position, name in enumerate(CATEGORY_RULES)}
+CATEGORY_MASK_DTYPE = np.uint8 if len(CATEGORY_RULES) <= 8 else np.uint32
+
+def category_matrix(df):
+    """Evaluar todas las reglas sobre el DataFrame completo: matriz booleana filas x categorías"""
+    return pd.DataFrame({
+        name: rule['criteria'](df).to_numpy(dtype=bool) for name, rule in CATEGORY_RULES.items()
+    }, index=df.index)
+
+def category_bitmask(matrix):
+    """Combinar la matriz de categorías en un entero por fila (un bit por categoría)"""
+    mask = np.zeros(len(matrix), dtype=CATEGORY_MASK_DTYPE)
+    for name, bit in CATEGORY_BITS.items():
+        mask |= matrix[name].to_numpy().astype(CATEGORY_MASK_DTYPE) * CATEGORY_MASK_DTYPE(bit)
+    return mask
+
+def _bits(names):
+    """Máscara de bits de una lista de categorías"""
+    unknown = [name for name in names if name not in CATEGORY_BITS]
+    if unknown:
+        raise KeyError(f"Categorías desconocidas: {unknown}")
+    bits = 0
+    for name in names:
+        bits |= CATEGORY_BITS[name]
+    return CATEGORY_MASK_DTYPE(bits)
+
+def category_filter(masks, all_of=(), any_of=(), none_of=()):
+    """
+    Filtrar propiedades por combinación de categorías con operaciones de bits.
+
+    Args:
+        masks: Columna 'category_mask' (Series o arreglo)
+        all_of: Categorías que deben cumplirse todas
+        any_of: Categorías de las que debe cumplirse al menos una
+        none_of: Categorías que no deben cumplirse
+
+    Returns:
+        np.ndarray: Máscara booleana de las filas que cumplen el filtro
+    """
+    masks = np.asarray(masks, dtype=CATEGORY_MASK_DTYPE)
+    keep = np.ones(len(masks), dtype=bool)
+    if all_of:
+        required = _bits(all_of)
+        keep &= (masks & required) == required
+    if any_of:
+        keep &= (masks & _bits(any_of)) != 0
+    if none_of:
+        keep &= (masks & _bits(none_of)) == 0
+    return keep
+
+def category_names(mask):
+    """Categorías codificadas en un valor de 'category_mask'"""
+    return [name for name, bit in CATEGORY_BITS.items() if int(mask) & bit]
+
+def _render_category_figure(cluster_counts, rent_by_cluster, area_by_cluster, stratum_by_cluster):
+    """Figura de distribución, renta, área y estrato por cluster"""
+    # Configurar estilo
+    plt.style.use('seaborn-v0_8')
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+
+    # 1. Distribución de clusters
+    axes[0, 0].bar(cluster_counts.index.astype(str), cluster_counts.values)
+    axes[0, 0].set_title('Distribución de Propiedades por Cluster')
+    axes[0, 0].set_xlabel('Cluster')
+    axes[0, 0].set_ylabel('Número de Propiedades')
+
+    # 2. Valor de renta promedio por cluster
+    axes[0, 1].bar(rent_by_cluster.index.astype(str), rent_by_cluster.values)
+    axes[0, 1].set_title('Valor de Renta Promedio por Cluster (Millones)')
+    axes[0, 1].set_xlabel('Cluster')
+    axes[0, 1].set_ylabel('Valor de Renta (Millones COP)')
+
+    # 3. Área promedio por cluster
+    axes[1, 0].bar(area_by_cluster.index.astype(str), area_by_cluster.values)
+    axes[1, 0].set_title('Área Promedio por Cluster')
+    axes[1, 0].set_xlabel('Cluster')
+    axes[1, 0].set_ylabel('Área (m²)')
+
+    # 4. Estrato promedio por cluster
+    if stratum_by_cluster is not None:
+        axes[1, 1].bar(stratum_by_cluster.index.astype(str), stratum_by_cluster.values)
+        axes[1, 1].set_title('Estrato Promedio por Cluster')
+        axes[1, 1].set_xlabel('Cluster')
+        axes[1, 1].set_ylabel('Estrato')
+        axes[1, 1].set_ylim(0, 7)
+
+    fig.tight_layout()
+    return fig
 
 class ClusterCategoryAnalyzer:
     """Analizador de categorías de clusters para datos inmobiliarios"""
 
-    def __init__(self, csv_path):
-        """Inicializar el analizador con la ruta del archivo CSV"""
+    def __init__(self, csv_path=None, df=None):
+        """Inicializar el analizador con la ruta del archivo CSV o un DataFrame ya cargado"""
         self.csv_path = csv_path
-        self.df = None
+        self.df = df
         self.cluster_descriptions = {}
+        self.category_matrix = None
 
     def load_data(self):
-        """Cargar datos del archivo CSV"""
-        print("📊 Cargando datos con clusters...")
-        self.df = pd.read_csv(self.csv_path)
+        """Cargar datos del archivo CSV o Parquet"""
+        if self.csv_path is not None:
+            print("📊 Cargando datos con clusters...")
+            self.df = load_listing_frame(self.csv_path)
 
         # Verificar que existe la columna de clusters
         if 'cluster' not in self.df.columns:
@@ -33,51 +190,10 @@ class ClusterCategoryAnalyzer:
         print("\n🎯 ANALIZANDO CATEGORÍAS DE CLUSTERS")
         print("=" * 50)
 
-        # Definir categorías basadas en características
-        categories = {
-            'Premium_Lujo': {
-                'criteria': lambda x: (x['rent_value'] >= 1000000000) or
-                                    (x['sale_value'] >= 5000000000),
-                'description': 'Propiedades de ultra lujo con valores excepcionales'
-            },
-            'Alto_Valor': {
-                'criteria': lambda x: (x['rent_value'] >= 50000000) and
-                                    (x['rent_value'] < 1000000000),
-                'description': 'Propiedades de alto valor con amenities premium'
-            },
-            'Medio_Alto': {
-                'criteria': lambda x: (x['rent_value'] >= 20000000) and
-                                    (x['rent_value'] < 50000000) and
-                                    (x['stratum'] >= 5),
-                'description': 'Propiedades de clase media-alta en estratos altos'
-            },
-            'Medio': {
-                'criteria': lambda x: (x['rent_value'] >= 10000000) and
-                                    (x['rent_value'] < 20000000) and
-                                    (x['stratum'] >= 4),
-                'description': 'Propiedades de clase media con buen estándar'
-            },
-            'Económico': {
-                'criteria': lambda x: (x['rent_value'] >= 1000000) and
-                                    (x['rent_value'] < 10000000),
-                'description': 'Propiedades económicas con buen valor'
-            },
-            'Comercial': {
-                'criteria': lambda x: (x['property_type'].str.contains('local|bodega|oficina', case=False, na=False)) if 'property_type' in x else False,
-                'description': 'Propiedades comerciales y de negocio'
-            },
-            'Residencial_Familiar': {
-                'criteria': lambda x: (x['rooms'] >= 3) and
-                                    (x['bathrooms'] >= 2) and
-                                    (x['area'] >= 100),
-                'description': 'Propiedades familiares con amplio espacio'
-            },
-            'Estudio_Eficiencia': {
-                'criteria': lambda x: (x['rooms'] <= 1) and
-                                    (x['area'] < 60),
-                'description': 'Estudios y apartamentos eficientes'
-            }
-        }
+        # Evaluar todas las reglas una vez sobre el DataFrame completo
+        self.category_matrix = category_matrix(self.df)
+        # Porcentaje de propiedades de cada cluster que cumple cada categoría
+        category_percentages_by_cluster = self.category_matrix.groupby(self.df['cluster'], observed=True).mean() * 100
 
         # Asignar categorías a cada cluster
         cluster_stats = self.df.groupby('cluster').agg({
@@ -92,25 +208,18 @@ class ClusterCategoryAnalyzer:
         print("\n📋 CATEGORIZACIÓN DE CLUSTERS:")
         print("-" * 40)
 
+        cluster_sizes = self.df['cluster'].value_counts()
         for cluster_id in sorted(self.df['cluster'].unique()):
-            cluster_data = self.df[self.df['cluster'] == cluster_id]
-            cluster_size = len(cluster_data)
+            cluster_size = int(cluster_sizes.get(cluster_id, 0))
 
             if cluster_size == 0:
                 continue
 
             print(f"\n🔹 Cluster {cluster_id} ({cluster_size} propiedades)")
 
-            # Calcular porcentajes para cada categoría
-            category_percentages = {}
-            for cat_name, cat_info in categories.items():
-                try:
-                    mask = cluster_data.apply(cat_info['criteria'], axis=1)
-                    percentage = (mask.sum() / cluster_size) * 100
-                    if percentage > 20:  # Solo mostrar categorías significativas
-                        category_percentages[cat_name] = percentage
-                except:
-                    continue
+            # Solo las categorías significativas (más del 20% del cluster)
+            percentages = category_percentages_by_cluster.loc[cluster_id]
+            category_percentages = percentages[percentages > 20].to_dict()
 
             # Ordenar categorías por porcentaje
             sorted_categories = sorted(category_percentages.items(), key=lambda x: x[1], reverse=True)
@@ -118,7 +227,7 @@ class ClusterCategoryAnalyzer:
             if sorted_categories:
                 print("   Categorías principales:")
                 for cat_name, percentage in sorted_categories[:3]:  # Top 3 categorías
-                    print(f"   • {cat_name}: {percentage:.1f}% - {categories[cat_name]['description']}")
+                    print(f"   • {cat_name}: {percentage:.1f}% - {CATEGORY_RULES[cat_name]['description']}")
             else:
                 print("   📍 Categoría mixta o única")
 
@@ -146,43 +255,15 @@ class ClusterCategoryAnalyzer:
 
         print("\n📈 GENERANDO VISUALIZACIONES...")
 
-        # Configurar estilo
-        plt.style.use('seaborn-v0_8')
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-
-        # 1. Distribución de clusters
+        # Agregados por cluster; solo estos resúmenes se envían al proceso que dibuja
+        grouped = self.df.groupby('cluster', observed=True)
         cluster_counts = self.df['cluster'].value_counts().sort_index()
-        axes[0, 0].bar(cluster_counts.index.astype(str), cluster_counts.values)
-        axes[0, 0].set_title('Distribución de Propiedades por Cluster')
-        axes[0, 0].set_xlabel('Cluster')
-        axes[0, 0].set_ylabel('Número de Propiedades')
-
-        # 2. Valor de renta promedio por cluster
-        rent_by_cluster = self.df.groupby('cluster')['rent_value'].mean() / 1000000
-        axes[0, 1].bar(rent_by_cluster.index.astype(str), rent_by_cluster.values)
-        axes[0, 1].set_title('Valor de Renta Promedio por Cluster (Millones)')
-        axes[0, 1].set_xlabel('Cluster')
-        axes[0, 1].set_ylabel('Valor de Renta (Millones COP)')
-
-        # 3. Área promedio por cluster
-        area_by_cluster = self.df.groupby('cluster')['area'].mean()
-        axes[1, 0].bar(area_by_cluster.index.astype(str), area_by_cluster.values)
-        axes[1, 0].set_title('Área Promedio por Cluster')
-        axes[1, 0].set_xlabel('Cluster')
-        axes[1, 0].set_ylabel('Área (m²)')
-
-        # 4. Estrato promedio por cluster
-        if 'stratum' in self.df.columns:
-            stratum_by_cluster = self.df.groupby('cluster')['stratum'].mean()
-            axes[1, 1].bar(stratum_by_cluster.index.astype(str), stratum_by_cluster.values)
-            axes[1, 1].set_title('Estrato Promedio por Cluster')
-            axes[1, 1].set_xlabel('Cluster')
-            axes[1, 1].set_ylabel('Estrato')
-            axes[1, 1].set_ylim(0, 7)
-
-        plt.tight_layout()
-        plt.savefig('plots/cluster_categories_analysis.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        rent_by_cluster = grouped['rent_value'].mean() / 1000000
+        area_by_cluster = grouped['area'].mean()
+        stratum_by_cluster = grouped['stratum'].mean() if 'stratum' in self.df.columns else None
+
+        submit_figure(_render_category_figure, os.path.join(PLOTS_DIR, 'cluster_categories_analysis.png'),
+                      cluster_counts, rent_by_cluster, area_by_cluster, stratum_by_cluster)
 
         print("✅ Visualizaciones guardadas en: plots/cluster_categories_analysis.png")
 
@@ -209,31 +290,65 @@ class ClusterCategoryAnalyzer:
 
             print(f"   {'─'*40}")
 
-    def save_detailed_analysis(self, output_path):
-        """Guardar análisis detallado en CSV"""
+    def add_category_column(self):
+        """
+        Añadir a cada propiedad la categoría de su cluster y sus propias categorías.
+
+        - 'category': las categorías principales del cluster de la propiedad
+        - 'category_mask': entero con un bit por cada categoría que cumple la
+          propiedad (ver CATEGORY_BITS y category_filter)
+
+        Returns:
+            pd.DataFrame: Copia de los datos con ambas columnas (self.df no se modifica)
+        """
         if self.df is None:
             self.load_data()
 
-        # Crear DataFrame con análisis detallado
-        detailed_df = self.df.copy()
+        cluster_category = {
+            cluster_id: '_'.join(info['main_categories']) if info['main_categories'] else 'Mixto'
+            for cluster_id, info in self.cluster_descriptions.items()
+        }
+
+        matrix = self.category_matrix
+        if matrix is None or len(matrix) != len(self.df):
+            matrix = category_matrix(self.df)
+        return self.df.assign(
+            category=self.df['cluster'].map(cluster_category).fillna('No_Categorizado'),
+            category_mask=category_bitmask(matrix),
+        )
 
-        # Añadir información de categorización
-        def assign_category(row):
-            for cluster_id, info in self.cluster_descriptions.items():
-                if row['cluster'] == cluster_id:
-                    return '_'.join(info['main_categories']) if info['main_categories'] else 'Mixto'
-            return 'No_Categorizado'
+    def filter_by_categories(self, all_of=(), any_of=(), none_of=()):
+        """Propiedades que cumplen una combinación de categorías (ver category_filter)"""
+        detailed_df = self.df if 'category_mask' in self.df.columns else self.add_category_column()
+        return detailed_df[category_filter(detailed_df['category_mask'], all_of, any_of, none_of)]
 
-        detailed_df['category'] = detailed_df.apply(assign_category, axis=1)
-        detailed_df.to_csv(output_path, index=False, encoding='utf-8')
+    def save_detailed_analysis(self, output_path):
+        """Guardar análisis detallado en CSV o Parquet"""
+        detailed_df = self.add_category_column()
+        write_listings(detailed_df, output_path)
 
         print(f"✅ Análisis detallado guardado en: {output_path}")
 
+def categorize_listings(df, visualize=True):
+    """
+    Ejecutar el análisis de categorías sobre un DataFrame en memoria.
+
+    Returns:
+        pd.DataFrame: Datos con la columna 'category'
+    """
+    analyzer = ClusterCategoryAnalyzer(df=df)
+    analyzer.load_data()
+    analyzer.analyze_cluster_categories()
+    if visualize:
+        analyzer.generate_visualizations()
+    analyzer.generate_summary_report()
+    return analyzer.add_category_column()
+
 def main():
     """Función principal"""
     # Configuración
-    input_csv = "json_habi_data/inmobiliario_clustered.csv"
-    output_csv = "json_habi_data/inmobiliario_categorized.csv"
+    input_csv = dataset_path("inmobiliario_clustered")
+    output_csv = dataset_path("inmobiliario_categorized")
 
     try:
         # Crear analizador
@@ -253,6 +368,7 @@ def main():
 
         # Guardar análisis detallado
         analyzer.save_detailed_analysis(output_csv)
+        wait_for_figures()
 
         print(f"\n🎉 Análisis de categorías completado!")
         print(f"📊 Archivo categorizado guardado en: {output_csv}")
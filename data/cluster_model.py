@@ -0,0 +1,322 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+import sklearn
+from listings_io import DATA_DIR, atomic_write, dataset_path, read_listings, write_listings
+
+# Versión del formato del artefacto; cambiarla invalida los modelos guardados
+MODEL_FORMAT_VERSION = 2
+MODEL_DIR = os.path.join(DATA_DIR, 'models')
+MODEL_PREFIX = 'cluster_model'
+PREDICT_BATCH_SIZE = 100000
+# Características numéricas relevantes para el clustering
+CLUSTER_FEATURES = [
+    'rent_value', 'rooms', 'bathrooms', 'garage', 'area',
+    'built_area', 'sale_value', 'stratum', 'lon', 'lat'
+]
+# Cuantiles de la distancia al centroide guardados como referencia de entrenamiento
+DISTANCE_QUANTILES = (0.5, 0.9, 0.99)
+
+# Arreglos del artefacto además de los parámetros de preprocesamiento y centroides
+STATE_ARRAYS = ('counts', 'reference_centers', 'baseline_inertia', 'distance_quantiles',
+                'new_counts', 'new_sq_dist')
+
+def model_path(version, model_dir=MODEL_DIR):
+    """Ruta del artefacto de una versión del modelo"""
+    return os.path.join(model_dir, f"{MODEL_PREFIX}-{version}.npz")
+
+def latest_model_path(model_dir=MODEL_DIR):
+    """Ruta de la versión más reciente del modelo (None si no hay ninguna)"""
+    paths = sorted(glob.glob(os.path.join(model_dir, f"{MODEL_PREFIX}-*.npz")))
+    return paths[-1] if paths else None
+
+class ClusterModel:
+    """
+    Modelo de clustering listo para asignar segmentos a propiedades nuevas.
+
+    Guarda solo lo necesario para reproducir la asignación: las medianas del
+    imputer, la media y escala del scaler y los centroides de KMeans, como
+    arreglos numpy. Así el artefacto es pequeño, se carga en milisegundos y no
+    depende de la versión de scikit-learn con la que se entrenó.
+    """
+
+    def __init__(self, features, medians, mean, scale, centers, metadata=None, **state):
+        """
+        Args:
+            features (list): Columnas usadas, en orden
+            medians, mean, scale: Parámetros del imputer y del scaler
+            centers: Centroides actuales
+            metadata (dict, optional): Versión y datos del entrenamiento
+            **state: Arreglos de STATE_ARRAYS (conteos por cluster, centroides
+                     y estadísticas del último ajuste completo, y acumulados de
+                     las propiedades incorporadas desde entonces)
+        """
+        self.features = list(features)
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.metadata = dict(metadata or {})
+
+        n_clusters = self.centers.shape[0]
+        self.counts = np.asarray(state.get('counts', np.zeros(n_clusters)), dtype=np.float64)
+        self.reference_centers = np.asarray(state.get('reference_centers', self.centers), dtype=np.float64)
+        self.baseline_inertia = np.asarray(state.get('baseline_inertia', np.zeros(n_clusters)), dtype=np.float64)
+        self.distance_quantiles = np.asarray(state.get('distance_quantiles', np.zeros(len(DISTANCE_QUANTILES))),
+                                             dtype=np.float64)
+        self.new_counts = np.asarray(state.get('new_counts', np.zeros(n_clusters)), dtype=np.float64)
+        self.new_sq_dist = np.asarray(state.get('new_sq_dist', np.zeros(n_clusters)), dtype=np.float64)
+        self._center_norms = (self.centers ** 2).sum(axis=1)
+
+    @staticmethod
+    def _new_version(centers):
+        """Identificador de versión: fecha UTC y hash de los centroides"""
+        digest = hashlib.blake2b(np.ascontiguousarray(centers).tobytes(), digest_size=4).hexdigest()
+        return f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{digest}"
+
+    @classmethod
+    def from_fitted(cls, features, imputer, scaler, kmeans, X_scaled, labels, **metadata):
+        """Construir el modelo a partir del imputer, el scaler y el KMeans ajustados"""
+        # Medianas de las características conservadas (el imputer omite las columnas vacías)
+        medians = pd.Series(imputer.statistics_, index=imputer.feature_names_in_)[list(features)]
+        return cls.from_params(features, medians.to_numpy(), scaler.mean_, scaler.scale_,
+                               kmeans, X_scaled, labels, **metadata)
+
+    @classmethod
+    def from_params(cls, features, medians, mean, scale, kmeans, X_scaled, labels, **metadata):
+        """
+        Construir el modelo a partir de los parámetros de preprocesamiento y el KMeans ajustado.
+
+        `X_scaled` y `labels` son los datos de entrenamiento y sus clusters; de
+        ellos se guardan los conteos, la inercia media por cluster y los
+        cuantiles de distancia que sirven de referencia para medir la deriva.
+        """
+        centers = np.asarray(kmeans.cluster_centers_, dtype=np.float64)
+        n_clusters = centers.shape[0]
+        labels = np.asarray(labels)
+
+        sq_dist = np.empty(len(labels), dtype=np.float64)
+        for start in range(0, len(labels), PREDICT_BATCH_SIZE):
+            chunk = np.asarray(X_scaled[start:start + PREDICT_BATCH_SIZE], dtype=np.float64)
+            chunk_labels = labels[start:start + PREDICT_BATCH_SIZE]
+            sq_dist[start:start + len(chunk)] = ((chunk - centers[chunk_labels]) ** 2).sum(axis=1)
+
+        counts = np.bincount(labels, minlength=n_clusters).astype(np.float64)
+        baseline_inertia = np.bincount(labels, weights=sq_dist, minlength=n_clusters) / np.maximum(counts, 1)
+
+        version = cls._new_version(centers)
+        metadata = {
+            'version': version,
+            # Versión del último ajuste completo; partial_fit no la cambia
+            'fit_version': version,
+            'format_version': MODEL_FORMAT_VERSION,
+            'n_clusters': int(n_clusters),
+            'inertia': float(kmeans.inertia_),
+            'sklearn_version': sklearn.__version__,
+            'n_train': int(len(labels)),
+            'n_updates': 0,
+            'n_new_far': 0,
+            **metadata,
+        }
+        return cls(features, medians, mean, scale, centers, metadata,
+                   counts=counts, reference_centers=centers, baseline_inertia=baseline_inertia,
+                   distance_quantiles=np.quantile(np.sqrt(sq_dist), DISTANCE_QUANTILES))
+
+    @property
+    def version(self):
+        return self.metadata.get('version')
+
+    @property
+    def fit_version(self):
+        """Versión del último ajuste completo (los modelos anteriores no la guardan)"""
+        return self.metadata.get('fit_version', self.version)
+
+    @property
+    def n_clusters(self):
+        return self.centers.shape[0]
+
+    def save(self, path=None):
+        """
+        Guardar el artefacto de forma atómica.
+
+        Args:
+            path (str, optional): Ruta del archivo .npz. Por defecto la ruta
+                                  versionada dentro de MODEL_DIR.
+
+        Returns:
+            str: Ruta del artefacto
+        """
+        path = path or model_path(self.version)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        metadata = {**self.metadata, 'features': self.features}
+        with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as file:
+            np.savez(file, medians=self.medians, mean=self.mean, scale=self.scale,
+                     centers=self.centers, metadata=np.array(json.dumps(metadata)),
+                     **{name: getattr(self, name) for name in STATE_ARRAYS})
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        """Cargar un artefacto (por defecto, la versión más reciente)"""
+        path = path or latest_model_path()
+        if path is None:
+            raise FileNotFoundError(f"No hay modelos de clustering en {MODEL_DIR}")
+
+        with np.load(path, allow_pickle=False) as artifact:
+            metadata = json.loads(str(artifact['metadata']))
+            if metadata.get('format_version') != MODEL_FORMAT_VERSION:
+                raise ValueError(f"{path} usa el formato {metadata.get('format_version')}, "
+                                 f"se esperaba {MODEL_FORMAT_VERSION}")
+            features = metadata.pop('features')
+            return cls(features, artifact['medians'], artifact['mean'], artifact['scale'],
+                       artifact['centers'], metadata, **{name: artifact[name] for name in STATE_ARRAYS})
+
+    def transform(self, df):
+        """Imputar y escalar las características de un DataFrame como en el entrenamiento"""
+        missing = [col for col in self.features if col not in df.columns]
+        if missing:
+            raise KeyError(f"Faltan columnas requeridas por el modelo: {missing}")
+        frame = df[self.features]
+        if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in frame.dtypes):
+            frame = frame.apply(pd.to_numeric, errors='coerce')
+        X = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+        X = np.where(np.isnan(X), self.medians, X)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def predict(self, df, batch_size=PREDICT_BATCH_SIZE):
+        """
+        Asignar el cluster más cercano a cada propiedad, por lotes vectorizados.
+
+        Returns:
+            np.ndarray: Etiqueta de cluster de cada fila
+        """
+        labels = np.empty(len(df), dtype=np.int32)
+        for start in range(0, len(df), batch_size):
+            labels[start:start + batch_size] = self.predict_scaled(self.transform(df.iloc[start:start + batch_size]))
+        return labels
+
+    def predict_scaled(self, X_scaled):
+        """Centroide más cercano de filas ya escaladas (‖x‖² - 2x·c + ‖c‖²)"""
+        distances = self._center_norms - 2.0 * (X_scaled @ self.centers.T)
+        return distances.argmin(axis=1).astype(np.int32)
+
+    def partial_fit(self, df):
+        """
+        Incorporar propiedades nuevas a los centroides existentes.
+
+        Cada centroide se mueve a la media ponderada entre su posición actual
+        (con el peso de las propiedades que ya resume) y las nuevas propiedades
+        asignadas a él, como en KMeans mini-batch. Los clusters conservan su
+        numeración. Las distancias de las nuevas propiedades a su centroide
+        se acumulan para las estadísticas de deriva.
+
+        Returns:
+            tuple: (etiquetas, distancias al centroide antes de la actualización)
+        """
+        X_scaled = self.transform(df)
+        labels = self.predict_scaled(X_scaled)
+        sq_dist = ((X_scaled - self.centers[labels]) ** 2).sum(axis=1)
+        n_clusters, n_features = self.centers.shape
+
+        batch_counts = np.bincount(labels, minlength=n_clusters).astype(np.float64)
+        sums = np.column_stack([
+            np.bincount(labels, weights=X_scaled[:, col], minlength=n_clusters)
+            for col in range(n_features)
+        ]) if len(labels) else np.zeros_like(self.centers)
+
+        total = self.counts + batch_counts
+        updated = batch_counts > 0
+        self.centers[updated] = ((self.counts[updated, None] * self.centers[updated] + sums[updated])
+                                 / total[updated, None])
+        self.counts = total
+        self._center_norms = (self.centers ** 2).sum(axis=1)
+
+        distances = np.sqrt(sq_dist)
+        self.new_counts += batch_counts
+        self.new_sq_dist += np.bincount(labels, weights=sq_dist, minlength=n_clusters)
+        self.metadata['n_new_far'] = int(self.metadata.get('n_new_far', 0)
+                                         + (distances > self.distance_quantiles[-1]).sum())
+        self.metadata['n_updates'] = int(self.metadata.get('n_updates', 0)) + 1
+        self.metadata['parent_version'] = self.version
+        self.metadata['version'] = self._new_version(self.centers)
+        return labels, distances
+
+    def drift_stats(self, distances=None):
+        """
+        Deriva acumulada desde el último ajuste completo.
+
+        Args:
+            distances (np.ndarray, optional): Distancias de la última tanda de
+                                              propiedades nuevas, para comparar
+                                              sus cuantiles con los de entrenamiento
+
+        Returns:
+            dict: Desplazamiento de cada centroide (en unidades escaladas),
+                  crecimiento relativo de la inercia media por cluster,
+                  fracción de propiedades nuevas más lejos que el p99 de
+                  entrenamiento y cuantiles de distancia
+        """
+        centroid_shift = np.linalg.norm(self.centers - self.reference_centers, axis=1)
+        new_inertia = np.divide(self.new_sq_dist, self.new_counts,
+                                out=np.full_like(self.new_sq_dist, np.nan), where=self.new_counts > 0)
+        inertia_growth = np.divide(new_inertia, self.baseline_inertia,
+                                   out=np.full_like(new_inertia, np.nan), where=self.baseline_inertia > 0) - 1
+        n_new = float(self.new_counts.sum())
+
+        stats = {
+            'n_new': int(n_new),
+            'centroid_shift': centroid_shift.round(4).tolist(),
+            'max_centroid_shift': float(centroid_shift.max()),
+            'inertia_growth': [None if np.isnan(value) else round(float(value), 4) for value in inertia_growth],
+            'max_inertia_growth': float(np.nanmax(inertia_growth)) if np.any(self.new_counts > 0) else 0.0,
+            'far_fraction': self.metadata.get('n_new_far', 0) / n_new if n_new else 0.0,
+            'baseline_distance_quantiles': dict(zip(map(str, DISTANCE_QUANTILES),
+                                                    self.distance_quantiles.round(4).tolist())),
+        }
+        if distances is not None and len(distances):
+            stats['new_distance_quantiles'] = dict(zip(map(str, DISTANCE_QUANTILES),
+                                                       np.quantile(distances, DISTANCE_QUANTILES).round(4).tolist()))
+        return stats
+
+def predict_clusters(df, model=None, batch_size=PREDICT_BATCH_SIZE):
+    """Asignar clusters a un DataFrame con un modelo guardado (por defecto, el más reciente)"""
+    model = model if isinstance(model, ClusterModel) else ClusterModel.load(model)
+    return model.predict(df, batch_size=batch_size)
+
+def main():
+    """Asignar clusters a propiedades nuevas: python cluster_model.py ENTRADA [SALIDA] [MODELO]"""
+    if len(sys.argv) < 2:
+        print("Uso: python cluster_model.py ENTRADA [SALIDA] [MODELO]")
+        sys.exit(1)
+
+    input_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else dataset_path("inmobiliario_predicted")
+    path = sys.argv[3] if len(sys.argv) > 3 else None
+
+    try:
+        model = ClusterModel.load(path)
+        print(f"📦 Modelo {model.version}: {model.n_clusters} clusters, características {model.features}")
+
+        df = read_listings(input_path)
+        start = time.perf_counter()
+        df['cluster'] = model.predict(df)
+        elapsed = time.perf_counter() - start
+        print(f"✅ {len(df):,} propiedades asignadas en {elapsed * 1000:.1f} ms")
+
+        write_listings(df, output_path)
+        print(f"📁 Resultado guardado en: {output_path}")
+
+    except Exception as e:
+        print(f"❌ Error durante la asignación de clusters: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from listings_io import DATA_DIR, _require_pyarrow, dataset_path, is_parquet_path, read_listings
+
+PROFILE_REPORT_PATH = os.path.join(DATA_DIR, 'cluster_profile.json')
+PROFILE_FORMAT_VERSION = 1
+
+# Estadísticas por columna calculadas en la pasada de groupby
+PROFILE_STATS = {
+    'rent_value': ['count', 'mean', 'std', 'min', 'max'],
+    'sale_value': ['mean', 'std', 'min', 'max'],
+    'area': ['mean', 'std'],
+    'rooms': ['mean', 'std'],
+    'bathrooms': ['mean', 'std'],
+    'stratum': ['mean', 'std'],
+}
+# Columnas que usa el perfil, además de 'cluster'
+PROFILE_COLUMNS = ['city_name', 'property_type', 'title', *PROFILE_STATS]
+TOP_N = 3
+# Clusters con estas propiedades o menos incluyen títulos de ejemplo
+SMALL_CLUSTER_SIZE = 5
+
+def _json_value(value):
+    """Convertir escalares numpy/pandas a tipos JSON (NaN como null)"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and np.isnan(value) else value
+    return value
+
+def top_values(df, column, n=TOP_N):
+    """
+    Valores más frecuentes de una columna en cada cluster, en una sola agrupación.
+
+    Returns:
+        dict: cluster -> lista de {'value', 'count'} ordenada por frecuencia
+    """
+    counts = (df.groupby(['cluster', column], observed=True, sort=False).size()
+              .rename('count').reset_index())
+    counts = counts[counts['count'] > 0].sort_values(['cluster', 'count'], ascending=[True, False], kind='stable')
+    counts = counts.groupby('cluster', sort=False).head(n)
+
+    top = {}
+    for cluster_id, value, count in counts[['cluster', column, 'count']].itertuples(index=False):
+        top.setdefault(_json_value(cluster_id), []).append({'value': _json_value(value), 'count': int(count)})
+    return top
+
+def profile_clusters(df, top_n=TOP_N, small_cluster_size=SMALL_CLUSTER_SIZE):
+    """
+    Perfil de todos los clusters en una pasada de groupby.
+
+    Returns:
+        dict: Reporte con el tamaño, las estadísticas por columna, las
+              ciudades y tipos de propiedad principales y, en los clusters
+              pequeños, títulos de ejemplo
+    """
+    grouped = df.groupby('cluster', observed=True, sort=True)
+    sizes = grouped.size()
+    stats = grouped.agg({col: funcs for col, funcs in PROFILE_STATS.items() if col in df.columns})
+
+    top_cities = top_values(df, 'city_name', top_n) if 'city_name' in df.columns else {}
+    top_property_types = top_values(df, 'property_type', top_n) if 'property_type' in df.columns else {}
+
+    sample_titles = {}
+    small = sizes.index[sizes <= small_cluster_size]
+    if 'title' in df.columns and len(small):
+        samples = df.loc[df['cluster'].isin(small) & df['title'].notna(), ['cluster', 'title']]
+        for cluster_id, titles in samples.groupby('cluster', observed=True)['title']:
+            sample_titles[_json_value(cluster_id)] = titles.head(3).astype(str).tolist()
+
+    clusters = []
+    for cluster_id, size in sizes.items():
+        key = _json_value(cluster_id)
+        column_stats = {}
+        for (col, func), value in stats.loc[cluster_id].items():
+            value = _json_value(value)
+            column_stats.setdefault(col, {})[func] = int(value) if func == 'count' and value is not None else value
+        clusters.append({
+            'cluster': key,
+            'size': int(size),
+            'stats': column_stats,
+            'top_cities': top_cities.get(key, []),
+            'top_property_types': top_property_types.get(key, []),
+            'sample_titles': sample_titles.get(key, []),
+        })
+
+    return {
+        'format_version': PROFILE_FORMAT_VERSION,
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'n_listings': int(len(df)),
+        'n_clusters': len(clusters),
+        'clusters': clusters,
+    }
+
+def profile_frame(report):
+    """Reporte como tabla plana: una fila por cluster y una columna por estadística"""
+    rows = []
+    for cluster in report['clusters']:
+        row = {'cluster': cluster['cluster'], 'size': cluster['size']}
+        for col, values in cluster['stats'].items():
+            for func, value in values.items():
+                row[f"{col}_{func}"] = value
+        row['top_cities'] = [item['value'] for item in cluster['top_cities']]
+        row['top_property_types'] = [item['value'] for item in cluster['top_property_types']]
+        row['sample_titles'] = cluster['sample_titles']
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def stats_table(report):
+    """Estadísticas del reporte como tabla por cluster, con columnas (columna, estadística)"""
+    table = pd.DataFrame.from_dict({
+        cluster['cluster']: {(col, func): value for col, values in cluster['stats'].items()
+                             for func, value in values.items()}
+        for cluster in report['clusters']
+    }, orient='index')
+    table.columns = pd.MultiIndex.from_tuples(table.columns)
+    table.index.name = 'cluster'
+    return table.round(2)
+
+def save_profile_report(report, path=PROFILE_REPORT_PATH):
+    """Guardar el reporte como JSON o, si la ruta es .parquet, como tabla Parquet"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if is_parquet_path(path):
+        _require_pyarrow()
+        profile_frame(report).to_parquet(path, index=False)
+    else:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return path
+
+def print_profile(report):
+    """Imprimir el perfil de los clusters en consola"""
+    for cluster in report['clusters']:
+        stats = cluster['stats']
+
+        def mean(col):
+            value = stats.get(col, {}).get('mean')
+            return np.nan if value is None else value
+
+        print(f"\n--- Cluster {cluster['cluster']} ({cluster['size']} propiedades) ---")
+        print(f"Valor de renta promedio: ${mean('rent_value'):,.0f}")
+        print(f"Valor de venta promedio: ${mean('sale_value'):,.0f}")
+        print(f"Área promedio: {mean('area'):.0f} m²")
+        print(f"Habitaciones promedio: {mean('rooms'):.1f}")
+        print(f"Baños promedio: {mean('bathrooms'):.1f}")
+        print(f"Estrato promedio: {mean('stratum'):.1f}")
+        if cluster['top_cities']:
+            print(f"Ciudades principales: {', '.join(str(item['value']) for item in cluster['top_cities'])}")
+        if cluster['top_property_types']:
+            print(f"Tipos de propiedad: {', '.join(str(item['value']) for item in cluster['top_property_types'])}")
+        if cluster['sample_titles']:
+            print("🔍 Propiedades en este cluster:")
+            for title in cluster['sample_titles']:
+                print(f"   - {title}")
+
+def main():
+    """Perfilar un dataset con clusters: python cluster_profile.py [DATASET] [REPORTE.json|.parquet]"""
+    input_path = sys.argv[1] if len(sys.argv) > 1 else dataset_path("inmobiliario_clustered")
+    output_path = sys.argv[2] if len(sys.argv) > 2 else PROFILE_REPORT_PATH
+
+    try:
+        df = read_listings(input_path, columns=['cluster', *PROFILE_COLUMNS])
+        start = time.perf_counter()
+        report = profile_clusters(df)
+        print(f"✅ {report['n_clusters']} clusters perfilados en {time.perf_counter() - start:.2f} s")
+        print(f"📁 Reporte guardado en: {save_profile_report(report, output_path)}")
+    except Exception as e:
+        print(f"❌ Error durante el perfilado: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+from sklearn.metrics import silhouette_score
+
+# Filas muestreadas para la silueta (su costo es cuadrático en la muestra)
+QUALITY_SAMPLE_SIZE = 10000
+# Filas por bloque en las pasadas sobre todos los datos
+QUALITY_CHUNK_SIZE = 100000
+
+def cluster_centers(X, labels, n_clusters=None, chunk_size=QUALITY_CHUNK_SIZE):
+    """
+    Centroides y tamaños de los clusters, calculados por bloques.
+
+    Returns:
+        tuple: (centroides k x d, número de filas por cluster)
+    """
+    labels = np.asarray(labels)
+    n_clusters = n_clusters or int(labels.max()) + 1
+    sums = np.zeros((n_clusters, X.shape[1]), dtype=np.float64)
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = np.asarray(X[start:start + chunk_size], dtype=np.float64)
+        chunk_labels = labels[start:start + chunk_size]
+        for col in range(X.shape[1]):
+            sums[:, col] += np.bincount(chunk_labels, weights=chunk[:, col], minlength=n_clusters)
+    counts = np.bincount(labels, minlength=n_clusters).astype(np.float64)
+    return sums / np.maximum(counts, 1)[:, None], counts
+
+def sampled_silhouette(X, labels, sample_size=QUALITY_SAMPLE_SIZE, random_state=42):
+    """
+    Silueta sobre una muestra aleatoria de filas.
+
+    La silueta exacta es O(n²); con una muestra de tamaño s el costo es O(s²)
+    y scikit-learn calcula las distancias por bloques, con memoria acotada.
+    """
+    labels = np.asarray(labels)
+    if len(np.unique(labels)) < 2:
+        return np.nan
+    if X.shape[0] > sample_size:
+        rows = np.sort(np.random.RandomState(random_state).choice(X.shape[0], sample_size, replace=False))
+        X, labels = np.asarray(X[rows]), labels[rows]
+        if len(np.unique(labels)) < 2:
+            return np.nan
+    return float(silhouette_score(X, labels))
+
+def cluster_quality(X, labels, centers=None, sample_size=QUALITY_SAMPLE_SIZE,
+                    chunk_size=QUALITY_CHUNK_SIZE, random_state=42):
+    """
+    Métricas de calidad de un clustering con memoria acotada.
+
+    - silhouette: silueta sobre una muestra de `sample_size` filas (mayor es mejor)
+    - simplified_silhouette: silueta con centroides sobre todas las filas,
+      (b - a) / max(a, b) con a la distancia al centroide propio y b al
+      centroide más cercano de otro cluster
+    - davies_bouldin: exacto, a partir de la dispersión media de cada
+      cluster y la distancia entre centroides (menor es mejor)
+    - calinski_harabasz: exacto, dispersión entre clusters sobre dispersión
+      interna, corregidas por grados de libertad (mayor es mejor)
+
+    Todas salvo la silueta muestreada se calculan en una pasada por bloques,
+    de modo que X puede ser un np.memmap.
+
+    Returns:
+        dict: Métricas por nombre
+    """
+    labels = np.asarray(labels)
+    n_rows = X.shape[0]
+    if centers is None:
+        centers, counts = cluster_centers(X, labels, chunk_size=chunk_size)
+    else:
+        centers = np.asarray(centers, dtype=np.float64)
+        counts = np.bincount(labels, minlength=len(centers)).astype(np.float64)
+    n_clusters = len(centers)
+
+    center_norms = (centers ** 2).sum(axis=1)
+    within_sq = 0.0
+    spread = np.zeros(n_clusters)
+    simplified = 0.0
+    total = np.zeros(X.shape[1])
+    for start in range(0, n_rows, chunk_size):
+        chunk = np.asarray(X[start:start + chunk_size], dtype=np.float64)
+        chunk_labels = labels[start:start + chunk_size]
+        total += chunk.sum(axis=0)
+
+        sq_distances = (chunk ** 2).sum(axis=1)[:, None] - 2.0 * (chunk @ centers.T) + center_norms
+        distances = np.sqrt(np.maximum(sq_distances, 0.0))
+        own = distances[np.arange(len(chunk)), chunk_labels]
+        within_sq += float((own ** 2).sum())
+        spread += np.bincount(chunk_labels, weights=own, minlength=n_clusters)
+
+        distances[np.arange(len(chunk)), chunk_labels] = np.inf
+        other = distances.min(axis=1) if n_clusters > 1 else own
+        denominator = np.maximum(own, other)
+        simplified += float(np.divide(other - own, denominator, out=np.zeros_like(own),
+                                      where=denominator > 0).sum())
+
+    populated = counts > 0
+    metrics = {
+        'silhouette': sampled_silhouette(X, labels, sample_size, random_state),
+        'simplified_silhouette': simplified / n_rows if n_rows else np.nan,
+        'davies_bouldin': np.nan,
+        'calinski_harabasz': np.nan,
+    }
+    if populated.sum() < 2:
+        return metrics
+
+    # Davies-Bouldin: media del peor cociente (S_i + S_j) / d(c_i, c_j) de cada cluster
+    spread = spread[populated] / counts[populated]
+    populated_centers = centers[populated]
+    center_distances = np.sqrt(((populated_centers[:, None, :] - populated_centers[None, :, :]) ** 2).sum(axis=2))
+    np.fill_diagonal(center_distances, np.inf)
+    ratios = (spread[:, None] + spread[None, :]) / center_distances
+    metrics['davies_bouldin'] = float(ratios.max(axis=1).mean())
+
+    # Calinski-Harabasz: traza entre clusters / traza interna
+    overall_mean = total / n_rows
+    between_sq = float((counts[populated] * ((populated_centers - overall_mean) ** 2).sum(axis=1)).sum())
+    k = int(populated.sum())
+    if n_rows > k and within_sq > 0:
+        metrics['calinski_harabasz'] = between_sq * (n_rows - k) / (within_sq * (k - 1))
+    return metrics
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import pandas as pd
+from cluster_model import MODEL_DIR, ClusterModel
+from comparables_index import ComparablesIndex
+from listings_io import dataset_path, load_listing_frame, read_listings, write_listings
+
+# Umbrales de deriva a partir de los cuales se reentrena desde cero
+DRIFT_THRESHOLDS = {
+    # Desplazamiento máximo de un centroide, en desviaciones estándar
+    'max_centroid_shift': 0.25,
+    # Crecimiento relativo máximo de la inercia media de un cluster
+    'max_inertia_growth': 0.30,
+    # Fracción de propiedades nuevas más lejos que el p99 de entrenamiento (se espera ~1%)
+    'far_fraction': 0.05,
+}
+DRIFT_LOG = os.path.join(MODEL_DIR, 'drift_log.jsonl')
+
+def drift_exceeded(stats, thresholds=None):
+    """Devolver los umbrales de deriva superados por las estadísticas"""
+    thresholds = {**DRIFT_THRESHOLDS, **(thresholds or {})}
+    return [name for name, limit in thresholds.items() if stats.get(name, 0) > limit]
+
+def log_drift(entry, log_path=DRIFT_LOG):
+    """Añadir una entrada al historial de deriva (JSON Lines)"""
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    with open(log_path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+def merge_new_listings(clustered, new_df, labels):
+    """Añadir al dataset con clusters las propiedades nuevas que aún no están en él"""
+    new_df = new_df.assign(cluster=labels)
+    if 'web_id' in clustered.columns and 'web_id' in new_df.columns:
+        known = clustered['web_id'].astype(str)
+        new_df = new_df[~new_df['web_id'].astype(str).isin(known)]
+    if len(new_df) == 0:
+        return clustered
+    return pd.concat([clustered, new_df], ignore_index=True)
+
+def update_clusters(new_df, model=None, thresholds=None, refit_path=None, clustered_path=None,
+                    log_path=DRIFT_LOG):
+    """
+    Incorporar propiedades nuevas al modelo guardado y reentrenar solo si hay deriva.
+
+    Los centroides se actualizan de forma incremental y se guarda una nueva
+    versión del modelo. Si la deriva acumulada desde el último ajuste completo
+    supera algún umbral y se indica `refit_path`, se carga ese dataset
+    completo y se ejecuta el clustering desde cero.
+
+    Un reentrenamiento renumera los clusters, así que todo lo derivado de
+    ellos queda desactualizado. El dataset completo con los nuevos clusters
+    (incluidas las propiedades nuevas que no estaban en `refit_path`) se
+    devuelve y, con `clustered_path`, se guarda ahí. Después hay que
+    regenerar las categorías (cluster_categories.py), los mapas
+    (generate_colombia_map.py o map_pages.py) y el índice de comparables
+    (comparables_index.py build).
+
+    Args:
+        new_df (pd.DataFrame): Propiedades nuevas
+        model (ClusterModel o str, optional): Modelo o ruta; por defecto el más reciente
+        thresholds (dict, optional): Umbrales que reemplazan a DRIFT_THRESHOLDS
+        refit_path (str, optional): Dataset completo para el reentrenamiento
+        clustered_path (str, optional): Dónde guardar el dataset con clusters tras reentrenar
+
+    Returns:
+        tuple: (etiquetas de las propiedades nuevas, estadísticas de deriva,
+                si se reentrenó, dataset completo con clusters o None si no
+                se reentrenó)
+    """
+    model = model if isinstance(model, ClusterModel) else ClusterModel.load(model)
+    parent_version = model.version
+
+    labels, distances = model.partial_fit(new_df)
+    stats = model.drift_stats(distances)
+    breached = drift_exceeded(stats, thresholds)
+
+    refit = bool(breached) and refit_path is not None
+    clustered = None
+    if refit:
+        # Importación diferida: kmeans_clustering depende de este paquete de modelos
+        from kmeans_clustering import cluster_listings
+        print(f"⚠️ Deriva por encima del umbral ({', '.join(breached)}): reentrenando con {refit_path}")
+        clustered = cluster_listings(load_listing_frame(refit_path), visualize=False, save_model=True)[0]
+        model = ClusterModel.load()
+        labels = model.predict(new_df)
+        clustered = merge_new_listings(clustered, new_df, labels)
+        if clustered_path:
+            write_listings(clustered, clustered_path)
+            print(f"📁 Dataset con los nuevos clusters guardado en: {clustered_path}")
+    else:
+        if breached:
+            print(f"⚠️ Deriva por encima del umbral ({', '.join(breached)}), sin dataset para reentrenar")
+        model.save()
+
+    log_drift({
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'parent_version': parent_version,
+        'version': model.version,
+        'breached': breached,
+        'refit': refit,
+        **stats,
+    }, log_path)
+    return labels, stats, refit, clustered
+
+def main():
+    """
+    Actualizar clusters con propiedades nuevas:
+    python cluster_updates.py NUEVAS [SALIDA] [--dedup | --no-dedup]
+    """
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not paths:
+        print("Uso: python cluster_updates.py NUEVAS [SALIDA] [--dedup | --no-dedup]")
+        sys.exit(1)
+
+    input_path = paths[0]
+    output_path = paths[1] if len(paths) > 1 else dataset_path("inmobiliario_new_clustered")
+
+    try:
+        new_df = read_listings(input_path)
+        print(f"📊 {len(new_df):,} propiedades nuevas")
+
+        # El reentrenamiento usa el mismo dataset que kmeans_clustering.py
+        from kmeans_clustering import clustering_input_path
+        labels, stats, refit, clustered = update_clusters(new_df, refit_path=clustering_input_path(),
+                                                          clustered_path=dataset_path("inmobiliario_clustered"))
+        new_df['cluster'] = labels
+
+        print(f"📐 Desplazamiento máximo de centroides: {stats['max_centroid_shift']:.3f}")
+        print(f"📈 Crecimiento máximo de inercia por cluster: {stats['max_inertia_growth']:+.1%}")
+        print(f"📏 Propiedades nuevas lejos de su centroide: {stats['far_fraction']:.2%}")
+        print("🔁 Modelo reentrenado desde cero" if refit else "✅ Centroides actualizados de forma incremental")
+
+        write_listings(new_df, output_path)
+        print(f"📁 Propiedades nuevas con cluster guardadas en: {output_path}")
+
+        if refit:
+            print(f"🌳 Índice de comparables reconstruido en: {ComparablesIndex.build(clustered).save()}")
+            print("⚠️ Los clusters cambiaron de numeración: regenere las categorías "
+                  "(cluster_categories.py) y los mapas (map_pages.py)")
+
+    except Exception as e:
+        print(f"❌ Error durante la actualización de clusters: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
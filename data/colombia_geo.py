@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from listings_io import DATA_DIR, dataset_path, read_listings
+
+# GeoJSON locales de divisiones administrativas (p. ej. el Marco Geoestadístico
+# Nacional del DANE exportado a GeoJSON en WGS84)
+GEO_DIR = os.path.join(DATA_DIR, 'geo')
+DEPARTMENTS_GEOJSON_PATH = os.environ.get('MIIA_DEPARTMENTS_GEOJSON',
+                                          os.path.join(GEO_DIR, 'colombia_departamentos.geojson'))
+MUNICIPALITIES_GEOJSON_PATH = os.environ.get('MIIA_MUNICIPALITIES_GEOJSON',
+                                             os.path.join(GEO_DIR, 'colombia_municipios.geojson'))
+# Propiedades que se prueban, en orden, para el nombre de cada región (primero
+# las de municipio: los GeoJSON de municipios también traen el departamento)
+NAME_PROPERTIES = ['MPIO_CNMBR', 'NOMBRE_MPI', 'NAME_2', 'municipio', 'name',
+                   'NOMBRE_DPT', 'DPTO_CNMBR', 'NAME_1', 'departamento']
+# Propiedades con el código DANE del municipio (5 dígitos) o de sus partes
+MUNICIPALITY_CODE_PROPERTIES = ['MPIO_CDPMP', 'COD_MPIO', 'codigo_municipio']
+MUNICIPALITY_PART_PROPERTIES = ('DPTO_CCDGO', 'MPIO_CCDGO')
+# Propiedades con el nombre del municipio y del departamento al que pertenece
+MUNICIPALITY_NAME_PROPERTIES = ['MPIO_CNMBR', 'NOMBRE_MPI', 'NAME_2', 'municipio']
+DEPARTMENT_NAME_PROPERTIES = ['DPTO_CNMBR', 'NOMBRE_DPT', 'NAME_1', 'departamento']
+# Propiedades con el código DANE del departamento (2 dígitos)
+DEPARTMENT_CODE_PROPERTIES = ['DPTO_CCDGO', 'DPTO', 'COD_DPTO', 'codigo_departamento']
+# Decimales de las coordenadas al cargar (5 decimales ~ 1 metro); reduce el GeoJSON embebido en el mapa
+GEOJSON_DECIMALS = 5
+# Regiones por nodo del STR-tree
+NODE_CAPACITY = 8
+# Puntos por bloque en la prueba vectorizada de contención
+POINT_BLOCK_SIZE = 65536
+
+def _round_coordinates(coordinates, decimals):
+    """Redondear recursivamente las coordenadas de una geometría GeoJSON"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, decimals) for value in coordinates]
+    return [_round_coordinates(part, decimals) for part in coordinates]
+
+def _first_property(properties, keys):
+    """Valor de la primera propiedad disponible (None si no hay ninguna)"""
+    for key in keys:
+        if properties.get(key) not in (None, ''):
+            return str(properties[key]).strip()
+    return None
+
+def _feature_name(feature, position, name_property=None):
+    """Nombre de una región según la primera propiedad disponible"""
+    properties = feature.get('properties') or {}
+    name = _first_property(properties, [name_property] if name_property else NAME_PROPERTIES)
+    return name.title() if name is not None else str(feature.get('id', position))
+
+def _feature_id(feature, name):
+    """
+    Identificador de una región: el código DANE si el GeoJSON lo trae.
+
+    Los nombres de municipios se repiten entre departamentos, así que sin
+    código un municipio se identifica por su nombre y el de su departamento.
+    """
+    properties = feature.get('properties') or {}
+    code = _first_property(properties, MUNICIPALITY_CODE_PROPERTIES)
+    if code is not None:
+        return code
+    parts = [_first_property(properties, [key]) for key in MUNICIPALITY_PART_PROPERTIES]
+    if all(part is not None for part in parts):
+        return ''.join(parts)
+    if _first_property(properties, MUNICIPALITY_NAME_PROPERTIES) is not None:
+        department = _first_property(properties, DEPARTMENT_NAME_PROPERTIES)
+        return f"{name}, {department.title()}" if department is not None else name
+    return _first_property(properties, DEPARTMENT_CODE_PROPERTIES) or name
+
+def load_region_geojson(path=DEPARTMENTS_GEOJSON_PATH, name_property=None, decimals=GEOJSON_DECIMALS):
+    """
+    Cargar un GeoJSON local de regiones (departamentos o municipios).
+
+    Solo conserva los polígonos, redondea las coordenadas y asigna a cada
+    feature un 'id' único (el código DANE o, sin él, el nombre calificado
+    con el departamento; ver _feature_id), que es la clave que usa
+    Choroplethmapbox. El nombre para mostrar queda en properties['name'].
+
+    Returns:
+        dict: FeatureCollection, o None si el archivo no existe
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        collection = json.load(file)
+
+    features = []
+    seen_ids = set()
+    for position, feature in enumerate(collection.get('features', [])):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            continue
+        name = _feature_name(feature, position, name_property)
+        feature_id = _feature_id(feature, name)
+        if feature_id in seen_ids:
+            feature_id = f"{feature_id} #{position}"
+        seen_ids.add(feature_id)
+        features.append({
+            'type': 'Feature',
+            'id': feature_id,
+            'properties': {'name': name},
+            'geometry': {'type': geometry['type'],
+                         'coordinates': _round_coordinates(geometry['coordinates'], decimals)},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+def _feature_edges(geometry):
+    """
+    Aristas (x1, y1, x2, y2) de todos los anillos de una geometría.
+
+    Con la regla par-impar, contar cruces sobre todos los anillos a la vez
+    (exteriores y huecos de todas las partes) da la contención correcta.
+    """
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    edges = []
+    for polygon in polygons:
+        for ring in polygon:
+            ring = np.asarray(ring, dtype=np.float64)[:, :2]
+            if len(ring) < 3:
+                continue
+            if not np.array_equal(ring[0], ring[-1]):
+                ring = np.vstack([ring, ring[:1]])
+            edges.append(np.hstack([ring[:-1], ring[1:]]))
+    return np.vstack(edges) if edges else np.empty((0, 4))
+
+class _BandedEdges:
+    """
+    Aristas de una región repartidas en franjas horizontales.
+
+    Un punto solo puede cruzar (con un rayo horizontal) las aristas cuya
+    franja contiene su latitud, así que cada punto se compara con unas pocas
+    aristas en lugar de con todo el contorno.
+    """
+
+    def __init__(self, edges, edges_per_band=8, max_bands=1024):
+        self.edges = edges
+        y_low = np.minimum(edges[:, 1], edges[:, 3])
+        y_high = np.maximum(edges[:, 1], edges[:, 3])
+        self.y_min = float(y_low.min())
+        self.n_bands = int(np.clip(len(edges) // edges_per_band, 1, max_bands))
+        self.band_height = max((float(y_high.max()) - self.y_min) / self.n_bands, 1e-12)
+
+        first = self.band(y_low)
+        last = self.band(y_high)
+        counts = last - first + 1
+        edge_ids = np.repeat(np.arange(len(edges)), counts)
+        offsets_in_edge = np.arange(len(edge_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        band_ids = np.repeat(first, counts) + offsets_in_edge
+
+        order = np.argsort(band_ids, kind='stable')
+        self.band_edges = edge_ids[order]
+        self.band_starts = np.searchsorted(band_ids[order], np.arange(self.n_bands + 1))
+
+    def band(self, y):
+        """Franja de cada latitud"""
+        return np.clip(((np.asarray(y) - self.y_min) / self.band_height).astype(np.int64), 0, self.n_bands - 1)
+
+    def contains(self, x, y):
+        """Contención par-impar de puntos (x, y) ya dentro del rectángulo de la región"""
+        inside = np.zeros(len(x), dtype=bool)
+        bands = self.band(y)
+        order = np.argsort(bands, kind='stable')
+        sorted_bands = bands[order]
+        boundaries = np.flatnonzero(np.diff(sorted_bands)) + 1
+        for group in np.split(order, boundaries):
+            if len(group) == 0:
+                continue
+            band = bands[group[0]]
+            edges = self.edges[self.band_edges[self.band_starts[band]:self.band_starts[band + 1]]]
+            if len(edges) == 0:
+                continue
+            x1, y1, x2, y2 = (edges[:, column] for column in range(4))
+            dy = np.where(y2 == y1, 1.0, y2 - y1)
+            for start in range(0, len(group), POINT_BLOCK_SIZE):
+                block = group[start:start + POINT_BLOCK_SIZE]
+                px, py = x[block, None], y[block, None]
+                straddles = (y1 > py) != (y2 > py)
+                crosses = straddles & (px < x1 + (py - y1) * (x2 - x1) / dy)
+                inside[block] = (np.count_nonzero(crosses, axis=1) & 1).astype(bool)
+        return inside
+
+class RegionIndex:
+    """
+    Índice espacial de regiones para asignar puntos a su departamento o municipio.
+
+    Los rectángulos de las regiones se empaquetan en un STR-tree
+    (sort-tile-recursive): cada nivel ordena los nodos por x, los corta en
+    franjas verticales, ordena cada franja por y y agrupa de a NODE_CAPACITY.
+    Los puntos bajan por el árbol como bloques (solo siguen los que caen en
+    el rectángulo de cada nodo) y en las hojas se prueba la contención exacta
+    de forma vectorizada, sin bucles por punto.
+    """
+
+    def __init__(self, geojson, node_capacity=NODE_CAPACITY):
+        self.ids = []
+        self.names = []
+        self._regions = []
+        boxes = []
+        for feature in geojson.get('features', []):
+            edges = _feature_edges(feature['geometry'])
+            if len(edges) == 0:
+                continue
+            name = (feature.get('properties') or {}).get('name')
+            self.ids.append(feature.get('id', name))
+            self.names.append(name if name is not None else feature.get('id'))
+            self._regions.append(_BandedEdges(edges))
+            xs, ys = edges[:, [0, 2]], edges[:, [1, 3]]
+            boxes.append((xs.min(), ys.min(), xs.max(), ys.max()))
+        self.boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        self.root = self._build(node_capacity)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _build(self, capacity):
+        """Construir el STR-tree: cada nodo es (rectángulo, hijos, es_hoja)"""
+        nodes = [(box, [position], True) for position, box in enumerate(self.boxes)]
+        if not nodes:
+            return None
+        leaf_level = True
+        while len(nodes) > 1 or leaf_level:
+            boxes = np.array([node[0] for node in nodes])
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            n_groups = int(np.ceil(len(nodes) / capacity))
+            n_slices = int(np.ceil(np.sqrt(n_groups)))
+            slice_size = n_slices * capacity
+
+            parents = []
+            by_x = np.argsort(centers[:, 0], kind='stable')
+            for start in range(0, len(nodes), slice_size):
+                vertical_slice = by_x[start:start + slice_size]
+                by_y = vertical_slice[np.argsort(centers[vertical_slice, 1], kind='stable')]
+                for group_start in range(0, len(by_y), capacity):
+                    group = by_y[group_start:group_start + capacity]
+                    box = np.concatenate([boxes[group, :2].min(axis=0), boxes[group, 2:].max(axis=0)])
+                    if leaf_level:
+                        children = [nodes[i][1][0] for i in group]
+                    else:
+                        children = [nodes[i] for i in group]
+                    parents.append((box, children, leaf_level))
+            nodes = parents
+            leaf_level = False
+        return nodes[0]
+
+    def locate(self, lon, lat):
+        """
+        Región de cada punto.
+
+        Returns:
+            np.ndarray: Posición de la región en self.names, o -1 si el punto
+                        no cae en ninguna (o tiene coordenadas vacías)
+        """
+        x = np.asarray(lon, dtype=np.float64)
+        y = np.asarray(lat, dtype=np.float64)
+        regions = np.full(len(x), -1, dtype=np.int32)
+        if self.root is None:
+            return regions
+
+        candidates = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        stack = [(self.root, candidates)]
+        while stack:
+            (box, children, is_leaf), points = stack.pop()
+            points = points[(x[points] >= box[0]) & (x[points] <= box[2]) &
+                            (y[points] >= box[1]) & (y[points] <= box[3])]
+            if len(points) == 0:
+                continue
+            if not is_leaf:
+                stack.extend((child, points) for child in children)
+                continue
+            for region in children:
+                region_box = self.boxes[region]
+                inside_box = points[(regions[points] < 0) &
+                                    (x[points] >= region_box[0]) & (x[points] <= region_box[2]) &
+                                    (y[points] >= region_box[1]) & (y[points] <= region_box[3])]
+                if len(inside_box):
+                    inside = self._regions[region].contains(x[inside_box], y[inside_box])
+                    regions[inside_box[inside]] = region
+        return regions
+
+    def region_names(self, lon, lat):
+        """Nombre de la región de cada punto (None fuera de todas)"""
+        positions = self.locate(lon, lat)
+        names = np.array(self.names + [None], dtype=object)
+        return names[positions]
+
+def aggregate_by_region(df, index):
+    """
+    Asignar cada propiedad a su región y agregar conteo y precio por m².
+
+    Returns:
+        pd.DataFrame: Una fila por región con propiedades: 'region' (id del
+                      feature), 'name', 'count', 'median_price_m2' y
+                      'median_sale_value'
+    """
+    positions = index.locate(pd.to_numeric(df['lon'], errors='coerce').to_numpy(),
+                             pd.to_numeric(df['lat'], errors='coerce').to_numpy())
+    sale_value = pd.to_numeric(df['sale_value'], errors='coerce').to_numpy(dtype=np.float64)
+    area = pd.to_numeric(df['area'], errors='coerce').to_numpy(dtype=np.float64)
+    price_m2 = np.divide(sale_value, area, out=np.full(len(df), np.nan), where=area > 0)
+
+    located = positions >= 0
+    frame = pd.DataFrame({'position': positions[located], 'price_m2': price_m2[located],
+                          'sale_value': sale_value[located]})
+    summary = frame.groupby('position', sort=True).agg(
+        count=('price_m2', 'size'),
+        median_price_m2=('price_m2', 'median'),
+        median_sale_value=('sale_value', 'median'),
+    ).reset_index()
+    positions = summary.pop('position').to_numpy()
+    summary.insert(0, 'region', np.array(index.ids, dtype=object)[positions])
+    summary.insert(1, 'name', np.array(index.names, dtype=object)[positions])
+    return summary
+
+def main():
+    """Agregar propiedades por departamento: python colombia_geo.py [DATASET] [GEOJSON]"""
+    input_path = sys.argv[1] if len(sys.argv) > 1 else dataset_path("inmobiliario_categorized")
+    geojson_path = sys.argv[2] if len(sys.argv) > 2 else DEPARTMENTS_GEOJSON_PATH
+
+    try:
+        geojson = load_region_geojson(geojson_path)
+        if geojson is None:
+            print(f"❌ No se encontró el GeoJSON de regiones: {geojson_path}")
+            return
+
+        df = read_listings(input_path, columns=['lon', 'lat', 'sale_value', 'area'])
+        start = time.perf_counter()
+        index = RegionIndex(geojson)
+        summary = aggregate_by_region(df, index)
+        print(f"✅ {len(df):,} propiedades asignadas a {len(index)} regiones en "
+              f"{time.perf_counter() - start:.2f} s ({int(summary['count'].sum()):,} dentro de alguna)")
+        for row in summary.sort_values('count', ascending=False).itertuples(index=False):
+            print(f"   {row.name:<30} {row.count:>9,} propiedades · ${row.median_price_m2:,.0f}/m²")
+    except Exception as e:
+        print(f"❌ Error durante la agregación por regiones: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+from cluster_model import MODEL_DIR, ClusterModel
+from listings_io import atomic_write, dataset_path, read_listings
+
+INDEX_FORMAT_VERSION = 1
+INDEX_PREFIX = 'comparables'
+DEFAULT_K = 10
+
+def comparables_path(model_version, model_dir=MODEL_DIR):
+    """Ruta del índice de comparables construido con una versión del modelo"""
+    return os.path.join(model_dir, f"{INDEX_PREFIX}-{model_version}.pkl")
+
+def find_comparables_path(model=None, model_dir=MODEL_DIR):
+    """
+    Índice de comparables para un modelo.
+
+    El índice depende solo del imputer y el scaler, que cambian con un ajuste
+    completo pero no con partial_fit, así que se busca por `fit_version`, que
+    va en el nombre del archivo. Si no hay índice para esa versión hay que
+    construirlo: un índice de otro ajuste usa otra escala.
+    """
+    model = model if isinstance(model, ClusterModel) else ClusterModel.load(model)
+    path = comparables_path(model.fit_version, model_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No hay índice de comparables para el modelo {model.version} "
+                                f"(ajuste {model.fit_version}); ejecute: python comparables_index.py build")
+    return path
+
+class ComparablesIndex:
+    """
+    Índice KD-tree de propiedades comparables en el espacio de características del clustering.
+
+    Las propiedades se imputan y escalan con el mismo ClusterModel usado para
+    los segmentos (valores, habitaciones, baños, garajes, área, estrato,
+    coordenadas), de modo que la distancia euclídea en el árbol es la misma
+    que usa KMeans.
+    """
+
+    def __init__(self, model, tree, web_ids, id_order=None):
+        self.model = model
+        self.tree = tree
+        self.web_ids = np.asarray(web_ids, dtype=object)
+        # Orden de los web_id para buscarlos por bisección en query_ids
+        self.id_order = np.argsort(self.web_ids, kind='stable') if id_order is None else id_order
+        self._sorted_ids = self.web_ids[self.id_order]
+
+    @classmethod
+    def build(cls, df, model=None, leaf_size=40):
+        """Construir el índice sobre un DataFrame de propiedades"""
+        model = model if isinstance(model, ClusterModel) else ClusterModel.load(model)
+        X_scaled = model.transform(df)
+        if 'web_id' in df.columns:
+            web_ids = df['web_id'].astype(str).to_numpy(dtype=object)
+        else:
+            web_ids = np.arange(len(df)).astype(str).astype(object)
+        return cls(model, KDTree(X_scaled, leaf_size=leaf_size), web_ids)
+
+    def __len__(self):
+        return len(self.web_ids)
+
+    def save(self, path=None):
+        """Guardar el índice de forma atómica (por defecto junto a su modelo)"""
+        path = path or comparables_path(self.model.fit_version)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as file:
+            pickle.dump({'format_version': INDEX_FORMAT_VERSION, 'model': self.model,
+                         'tree': self.tree, 'web_ids': self.web_ids,
+                         'id_order': self.id_order}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        """Cargar un índice (por defecto, el del modelo más reciente; ver find_comparables_path)"""
+        path = path or find_comparables_path()
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+        if state.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"{path} usa el formato {state.get('format_version')}, "
+                             f"se esperaba {INDEX_FORMAT_VERSION}")
+        return cls(state['model'], state['tree'], state['web_ids'], state['id_order'])
+
+    def query_scaled(self, X_scaled, k=DEFAULT_K):
+        """
+        Top-k vecinos de filas ya escaladas.
+
+        Returns:
+            tuple: (distancias n x k, posiciones n x k en el índice)
+        """
+        X_scaled = np.atleast_2d(np.asarray(X_scaled, dtype=np.float64))
+        return self.tree.query(X_scaled, k=min(k, len(self)), sort_results=True)
+
+    def query(self, df, k=DEFAULT_K, exclude_self=True):
+        """
+        Top-k comparables de cada propiedad de un DataFrame.
+
+        Args:
+            df (pd.DataFrame): Propiedades a tasar
+            k (int): Comparables por propiedad
+            exclude_self (bool): Descartar la propia propiedad (mismo web_id)
+                                 si ya está en el índice
+
+        Returns:
+            pd.DataFrame: Una fila por par con query (posición en `df`), rank,
+                          web_id del comparable y distancia
+        """
+        query_ids = None
+        if exclude_self and 'web_id' in df.columns:
+            query_ids = df['web_id'].astype(str).to_numpy(dtype=object)
+        extra = 1 if query_ids is not None else 0
+        distances, positions = self.query_scaled(self.model.transform(df), k + extra)
+        return self._results(distances, positions, query_ids, k)
+
+    def query_ids(self, web_ids, k=DEFAULT_K):
+        """Top-k comparables de propiedades que ya están en el índice, por web_id"""
+        query_ids = np.asarray([str(web_id) for web_id in web_ids], dtype=object)
+        found = np.searchsorted(self._sorted_ids, query_ids).clip(max=max(len(self) - 1, 0))
+        missing = self._sorted_ids[found] != query_ids
+        if missing.any():
+            raise KeyError(f"web_id fuera del índice: {list(query_ids[missing][:5])}")
+        positions = self.id_order[found]
+        X_scaled = np.asarray(self.tree.data)[positions]
+        distances, positions = self.query_scaled(X_scaled, k + 1)
+        return self._results(distances, positions, query_ids, k)
+
+    def _results(self, distances, positions, query_ids, k):
+        """Aplanar los resultados del árbol, descartando la propia propiedad"""
+        keep = np.ones(positions.shape, dtype=bool)
+        if query_ids is not None:
+            keep &= self.web_ids[positions] != query_ids[:, None]
+        # Conservar los primeros k vecinos válidos de cada fila
+        keep &= np.cumsum(keep, axis=1) <= k
+
+        rows, ranks = np.nonzero(keep)
+        return pd.DataFrame({
+            'query': rows,
+            'rank': np.cumsum(keep, axis=1)[rows, ranks] - 1,
+            'web_id': self.web_ids[positions[rows, ranks]],
+            'distance': distances[rows, ranks],
+        })
+
+def main():
+    """Construir o consultar: python comparables_index.py build | query WEB_ID [WEB_ID ...]"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'query'):
+        print("Uso: python comparables_index.py build | query WEB_ID [WEB_ID ...]")
+        sys.exit(1)
+
+    try:
+        if sys.argv[1] == 'build':
+            data_path = dataset_path("inmobiliario_clustered")
+            print(f"📊 Cargando datos: {data_path}")
+            df = read_listings(data_path)
+            start = time.perf_counter()
+            index = ComparablesIndex.build(df)
+            print(f"🌳 Índice de {len(index):,} propiedades construido en {time.perf_counter() - start:.2f} s")
+            print(f"📁 Índice guardado en: {index.save()}")
+        else:
+            index = ComparablesIndex.load()
+            start = time.perf_counter()
+            results = index.query_ids(sys.argv[2:])
+            print(f"🔎 Consulta resuelta en {(time.perf_counter() - start) * 1000:.2f} ms")
+            print(results.to_string(index=False))
+
+    except Exception as e:
+        print(f"❌ Error en el índice de comparables: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import re
+import zlib
+import unicodedata
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from listings_io import dataset_path, read_listings, write_listings
+
+# Palabras que aparecen en casi todos los títulos y no ayudan a distinguir propiedades
+TITLE_STOPWORDS = {'en', 'de', 'la', 'el', 'los', 'las', 'y', 'con', 'para', 'venta', 'vendo', 'se', 'vende'}
+
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+def normalize_title(title):
+    """Normalizar un título: minúsculas, sin tildes y sin palabras vacías"""
+    if not isinstance(title, str):
+        return []
+    title = unicodedata.normalize('NFKD', title.lower()).encode('ascii', 'ignore').decode('ascii')
+    return [token for token in re.findall(r'\w+', title) if token not in TITLE_STOPWORDS]
+
+def minhash_signatures(titles, num_perm=64, seed=42, batch_rows=50000):
+    """
+    Calcular firmas MinHash de los tokens normalizados de cada título.
+
+    Los títulos del feed se repiten mucho, así que las firmas se calculan una
+    vez por título distinto y se reparten a las filas.
+
+    Returns:
+        tuple: (matriz de firmas n x num_perm, máscara de filas con tokens)
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+    b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+
+    title_codes, unique_titles = pd.factorize(pd.Series(titles, dtype=object), use_na_sentinel=False)
+    token_lists = [sorted(set(normalize_title(title))) for title in unique_titles]
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    token_hashes = np.fromiter(
+        (zlib.crc32(token.encode('utf-8')) for tokens in token_lists for token in tokens),
+        dtype=np.uint64, count=int(lengths.sum())
+    )
+    token_hashes %= MERSENNE_PRIME
+
+    has_tokens = lengths > 0
+    signatures = np.full((len(token_lists), num_perm), MERSENNE_PRIME, dtype=np.uint32)
+    row_starts = np.concatenate([[0], np.cumsum(lengths)])
+
+    # Procesar por lotes de filas para acotar la matriz tokens x permutaciones
+    for start in range(0, len(token_lists), batch_rows):
+        rows = np.arange(start, min(start + batch_rows, len(token_lists)))
+        rows = rows[has_tokens[rows]]
+        if len(rows) == 0:
+            continue
+        token_slice = token_hashes[row_starts[rows[0]]:row_starts[rows[-1] + 1]]
+        hashed = (token_slice[:, None] * a[None, :] + b[None, :]) % MERSENNE_PRIME
+        signatures[rows] = np.minimum.reduceat(hashed, row_starts[rows] - row_starts[rows[0]], axis=0)
+
+    return signatures[title_codes], has_tokens[title_codes]
+
+def _relative_close(x, y, tolerance):
+    """Comparar valores con tolerancia relativa; un valor faltante descarta el par"""
+    with np.errstate(invalid='ignore'):
+        return np.abs(x - y) <= tolerance * np.maximum(np.abs(x), np.abs(y))
+
+def find_duplicate_groups(df, num_perm=64, bands=16, window=20, min_similarity=0.6,
+                          value_tolerance=0.05, area_tolerance=0.05, max_distance_deg=0.002):
+    """
+    Encontrar grupos de propiedades casi duplicadas en tiempo aproximadamente lineal.
+
+    Las propiedades se agrupan por bloque (ciudad y tipo de propiedad) y por
+    banda LSH de su firma MinHash. Dentro de cada bucket se ordenan por
+    precio y área y solo se comparan con sus `window` vecinos, por lo que
+    nunca se evalúan todos los pares. Un par candidato es duplicado si la
+    similitud estimada de títulos, el precio, el área, el barrio y las
+    coordenadas están dentro de las tolerancias; un precio, área o
+    coordenada faltante descarta el par.
+
+    Los pares se unen en grupos y luego cada miembro se compara con la
+    propiedad canónica del grupo: los que no la cumplen quedan como
+    propiedades independientes, así una cadena A~B~C no une A y C si no
+    son duplicados entre sí.
+
+    Returns:
+        np.ndarray: Posición de la propiedad canónica de cada fila (la primera
+                    aparición de su grupo; ella misma si no tiene duplicados)
+    """
+    n = len(df)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    rows_per_band = num_perm // bands
+
+    signatures, has_tokens = minhash_signatures(df['title'].tolist() if 'title' in df.columns else [None] * n, num_perm)
+
+    def numeric(col):
+        if col not in df.columns:
+            return np.full(n, np.nan)
+        return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype='float64')
+
+    def codes(col):
+        if col not in df.columns:
+            return np.zeros(n, dtype=np.int64)
+        normalized = df[col].astype('string').str.strip().str.lower()
+        return pd.factorize(normalized, use_na_sentinel=True)[0].astype(np.int64)
+
+    sale_value = numeric('sale_value')
+    area = numeric('area')
+    lat = numeric('lat')
+    lon = numeric('lon')
+    neighborhood = codes('neighborhood')
+    block = codes('city_name') * (codes('property_type').max() + 2) + codes('property_type')
+
+    sort_price = np.nan_to_num(sale_value, nan=-1.0)
+    sort_area = np.nan_to_num(area, nan=-1.0)
+    candidates = np.flatnonzero(has_tokens)
+
+    def is_duplicate(i, j):
+        """Máscara de los pares que cumplen todas las tolerancias"""
+        # Primero el precio, que es el criterio más selectivo
+        result = _relative_close(sale_value[i], sale_value[j], value_tolerance)
+        rest = np.flatnonzero(result)
+        i, j = i[rest], j[rest]
+        with np.errstate(invalid='ignore'):
+            distance_ok = np.hypot(lat[i] - lat[j], lon[i] - lon[j]) <= max_distance_deg
+        keep = (
+            _relative_close(area[i], area[j], area_tolerance)
+            & ((neighborhood[i] == neighborhood[j]) | (neighborhood[i] < 0) | (neighborhood[j] < 0))
+            & distance_ok
+            & ((signatures[i] == signatures[j]).mean(axis=1) >= min_similarity)
+        )
+        result[rest] = keep
+        return result
+
+    def verify(i, j):
+        """Filtrar los pares candidatos que cumplen todas las tolerancias"""
+        keep = is_duplicate(i, j)
+        return i[keep], j[keep]
+
+    pairs_i = []
+    pairs_j = []
+    for band in range(bands):
+        band_values = signatures[candidates, band * rows_per_band:(band + 1) * rows_per_band]
+        bucket = block[candidates].astype(np.uint64)
+        for col in range(rows_per_band):
+            bucket = (bucket * np.uint64(1000003)) ^ band_values[:, col].astype(np.uint64)
+
+        local_order = np.lexsort((sort_area[candidates], sort_price[candidates], bucket))
+        order = candidates[local_order]
+        sorted_bucket = bucket[local_order]
+
+        # Vecindario ordenado: cada propiedad se compara con las siguientes del mismo bucket
+        for offset in range(1, min(window, len(order) - 1) + 1):
+            same_bucket = sorted_bucket[:-offset] == sorted_bucket[offset:]
+            i, j = verify(order[:-offset][same_bucket], order[offset:][same_bucket])
+            pairs_i.append(i)
+            pairs_j.append(j)
+
+    i = np.concatenate(pairs_i) if pairs_i else np.empty(0, dtype=np.int64)
+    j = np.concatenate(pairs_j) if pairs_j else np.empty(0, dtype=np.int64)
+
+    graph = coo_matrix((np.ones(len(i), dtype=bool), (i, j)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+
+    # La canónica de cada grupo es su primera aparición en el dataset
+    first_position = np.full(labels.max() + 1, n, dtype=np.int64)
+    np.minimum.at(first_position, labels, np.arange(n))
+    canonical = first_position[labels]
+
+    # Cada miembro debe ser duplicado de la canónica, no solo de otro miembro
+    members = np.flatnonzero(canonical != np.arange(n))
+    rejected = members[~is_duplicate(members, canonical[members])]
+    canonical[rejected] = rejected
+    return canonical
+
+def deduplicate_listings(df, **kwargs):
+    """
+    Eliminar propiedades casi duplicadas.
+
+    Returns:
+        tuple: (DataFrame sin duplicados, mapeo web_id -> web_id canónico de
+                las propiedades que pertenecen a un grupo de duplicados)
+    """
+    canonical = find_duplicate_groups(df, **kwargs)
+    is_canonical = canonical == np.arange(len(df))
+    group_size = np.bincount(canonical, minlength=len(df))[canonical]
+    in_group = group_size > 1
+
+    web_ids = df['web_id'].to_numpy() if 'web_id' in df.columns else np.arange(len(df))
+    mapping = pd.DataFrame({
+        'web_id': web_ids[in_group],
+        'canonical_web_id': web_ids[canonical[in_group]],
+        'group_size': group_size[in_group],
+    })
+
+    return df[is_canonical], mapping
+
+def main():
+    """Función principal"""
+    input_path = dataset_path("inmobiliario")
+    output_path = dataset_path("inmobiliario_dedup")
+    mapping_path = dataset_path("inmobiliario_duplicates")
+
+    try:
+        print(f"📊 Cargando datos: {input_path}")
+        df = read_listings(input_path)
+
+        print("🔎 Buscando propiedades duplicadas...")
+        deduplicated, mapping = deduplicate_listings(df)
+
+        n_groups = mapping['canonical_web_id'].nunique()
+        print(f"✅ {n_groups} grupos de duplicados, {len(df) - len(deduplicated)} propiedades eliminadas")
+
+        write_listings(deduplicated, output_path)
+        write_listings(mapping, mapping_path)
+
+        print(f"📁 Datos sin duplicados guardados en: {output_path}")
+        print(f"🔗 Mapeo a propiedades canónicas guardado en: {mapping_path}")
+
+    except Exception as e:
+        print(f"❌ Error durante la deduplicación: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,16 @@
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+import os
+import gzip
+import html
 import json
 from urllib.request import urlopen
 import numpy as np
+from listings_io import atomic_write, dataset_path, load_listing_frame
+from colombia_geo import DEPARTMENTS_GEOJSON_PATH, RegionIndex, aggregate_by_region, load_region_geojson
 
 # Paleta de colores especificada
 COLOR_PALETTE = ['#6334a4', '#af94ce', '#8c7cae', '#9684ac', '#a474d0', '#dbc8ed', '#c4bcd4']
@@ -20,51 +27,98 @@ SEGMENT_MAPPING = {
     5: "Nicho Especializado - Oportunidades únicas"
 }
 
-def load_and_process_data():
+# Columnas que usa el mapa; el resto del dataset no se carga
+MAP_COLUMNS = [
+    'title', 'city_name', 'property_type', 'rooms', 'bathrooms', 'area',
+    'sale_value', 'cluster', 'lon', 'lat'
+]
+# Decimales de las coordenadas en el HTML (5 decimales ~ 1 metro)
+COORDINATE_DECIMALS = 5
+MAP_ZOOM = 4.5
+# Vista por defecto (mapa nacional); las páginas por ciudad la sobrescriben
+DEFAULT_VIEW = {
+    'title': 'Mapa de Propiedades Inmobiliarias en Colombia',
+    'subtitle': 'Distribución geográfica por segmentos de mercado',
+    'center': {'lat': 4.570868, 'lon': -74.297333},
+    'zoom': MAP_ZOOM,
+}
+# Capas del mapa por nivel de zoom: (zoom mínimo, tamaño de la celda en grados).
+# La última capa (celda None) muestra las propiedades individuales.
+ZOOM_LAYERS = [(0, 0.5), (6, 0.1), (8, 0.02), (10, None)]
+# Capas de un mapa agregado con los datos embebidos en la página: los puntos
+# individuales solo se incluyen con el payload externo (MIIA_MAP_EXTERNAL_DATA)
+INLINE_ZOOM_LAYERS = [layer for layer in ZOOM_LAYERS if layer[1] is not None]
+# Con menos propiedades que esto el mapa muestra siempre los puntos individuales
+AGGREGATE_MIN_POINTS = 20000
+
+MAP_OUTPUT_PATH = 'colombia_properties_map.html'
+# Puntos individuales en un archivo aparte (.points.json.gz) que la página
+# descarga después de pintarse; requiere servir la carpeta por HTTP
+MAP_EXTERNAL_DATA = os.environ.get('MIIA_MAP_EXTERNAL_DATA', '0') == '1'
+# plotly.js desde una copia local compartida por todas las páginas, sin CDN
+MAP_OFFLINE = os.environ.get('MIIA_MAP_OFFLINE', '0') == '1'
+PLOTLYJS_ASSET = os.path.join('assets', 'plotly.min.js')
+POINTS_FORMAT_VERSION = 1
+
+def process_data(df):
+    """Procesar un DataFrame de propiedades ya cargado para el mapa"""
+    # Trabajar sobre una copia de las columnas del mapa, sin modificar el DataFrame recibido
+    df = df[[col for col in MAP_COLUMNS if col in df.columns]].copy()
+
+    # Convertir coordenadas y cluster a numérico (los vacíos quedan como NaN)
+    df['lon'] = pd.to_numeric(df['lon'], errors='coerce')
+    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
+    cluster = pd.to_numeric(df['cluster'], errors='coerce')
+    df['cluster'] = cluster.fillna(-1).astype('int8')
+
+    # Limpiar nombres de ciudades
+    df['city_name'] = df['city_name'].str.strip().str.title().astype('category')
+
+    # Un único filtro: coordenadas válidas dentro de Colombia aproximadamente y cluster
+    df = df[df['lon'].between(-82, -66) & df['lat'].between(-4, 13) & cluster.notna()]
+
+    # Mapear clusters a descripciones de segmentos para la interfaz
+    # (los clusters sin descripción, con k > 6, usan un nombre genérico)
+    df['segment_label'] = df['cluster'].map(SEGMENT_MAPPING).fillna(
+        'Segmento ' + df['cluster'].astype(str) + ' - Sin descripción')
+
+    print(f"Propiedades con coordenadas válidas: {len(df)}")
+    print(f"Ciudades únicas: {df['city_name'].nunique()}")
+    print(f"Categorías únicas: {df['cluster'].nunique()}")
+
+    return df
+
+def load_and_process_data(data_path=None):
     """Cargar y procesar los datos de propiedades"""
+    if data_path is None:
+        data_path = dataset_path('inmobiliario_categorized')
+
     try:
-        # Cargar datos
-        df = pd.read_csv('json_habi_data/inmobiliario_categorized.csv')
+        # Cargar solo las columnas necesarias, con dtypes compactos
+        df = load_listing_frame(data_path, columns=MAP_COLUMNS)
 
         print(f"Datos cargados: {len(df)} propiedades totales")
 
-        # Filtrar solo propiedades con coordenadas válidas
-        df = df.dropna(subset=['lon', 'lat'])
-        df = df[(df['lon'] != '') & (df['lat'] != '')]
-
-        # Convertir coordenadas a numérico
-        df['lon'] = pd.to_numeric(df['lon'], errors='coerce')
-        df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
-        df = df.dropna(subset=['lon', 'lat'])
-
-        # Filtrar coordenadas dentro de Colombia aproximadamente
-        df = df[(df['lon'] >= -82) & (df['lon'] <= -66) &
-                (df['lat'] >= -4) & (df['lat'] <= 13)]
-
-        # Limpiar nombres de ciudades
-        df['city_name'] = df['city_name'].str.strip().str.title()
-
-        # Asegurar que cluster sea numérico
-        df['cluster'] = pd.to_numeric(df['cluster'], errors='coerce')
-        df = df.dropna(subset=['cluster'])
-        df['cluster'] = df['cluster'].astype(int)
-
-        # Mapear clusters a descripciones de segmentos para la interfaz
-        df['segment_label'] = df['cluster'].map(SEGMENT_MAPPING)
-
-        print(f"Propiedades con coordenadas válidas: {len(df)}")
-        print(f"Ciudades únicas: {df['city_name'].nunique()}")
-        print(f"Categorías únicas: {df['cluster'].nunique()}")
-
-        return df
+        return process_data(df)
 
     except Exception as e:
         print(f"Error al cargar datos: {e}")
         return None
 
-def get_colombia_geojson():
-    """Obtener GeoJSON de Colombia"""
+def get_colombia_geojson(path=DEPARTMENTS_GEOJSON_PATH):
+    """
+    Obtener GeoJSON de Colombia.
+
+    Usa el GeoJSON local de departamentos si existe (ver colombia_geo); si
+    no, un rectángulo aproximado de Colombia como fondo.
+    """
     try:
+        geojson = load_region_geojson(path)
+        if geojson is not None and geojson['features']:
+            print(f"🗺️ {len(geojson['features'])} regiones cargadas de {path}")
+            return geojson
+        print(f"ℹ️ Sin GeoJSON de departamentos en {path}; se usa un contorno aproximado")
+
         # GeoJSON simplificado de Colombia para evitar problemas de conexión
         return {
             "type": "FeatureCollection",
@@ -89,73 +143,295 @@ def get_colombia_geojson():
             "features": []
         }
 
-def create_interactive_map(df, geojson):
-    """Crear mapa interactivo de Colombia"""
+def has_regions(geojson):
+    """Indica si el GeoJSON trae regiones con nombre (cargadas con load_region_geojson)"""
+    features = geojson.get('features', []) if geojson else []
+    return bool(features) and all('id' in feature for feature in features)
 
-    # Configurar colores para categorías
-    category_colors = {i: COLOR_PALETTE[i % len(COLOR_PALETTE)] for i in range(6)}
+def region_choropleth(df, geojson):
+    """
+    Capa de regiones coloreada por la mediana del precio por m².
 
-    # Crear figura base
-    fig = go.Figure()
+    Cada propiedad se asigna a su región con RegionIndex (STR-tree y
+    contención vectorizada); las regiones sin propiedades quedan sin color.
 
-    # Añadir el mapa de Colombia como fondo
-    fig.add_trace(go.Choroplethmapbox(
+    Returns:
+        dict: Traza Choroplethmapbox, o None si el GeoJSON no trae regiones
+    """
+    if not has_regions(geojson):
+        return None
+    summary = aggregate_by_region(df, RegionIndex(geojson))
+    return dict(
+        type='choroplethmapbox',
         geojson=geojson,
-        locations=["COL"],
-        z=[1],
-        colorscale=[[0, 'rgba(0,0,0,0.1)'], [1, 'rgba(0,0,0,0.1)']],
-        marker_opacity=0.3,
-        marker_line_width=0,
-        showscale=False
-    ))
-
-    # Añadir marcadores para cada categoría
+        locations=summary['region'].tolist(),
+        text=summary['name'].tolist(),
+        z=summary['median_price_m2'].fillna(0).round(0).to_numpy(),
+        customdata=np.column_stack([summary['count'].to_numpy(),
+                                    summary['median_sale_value'].fillna(0).round(0).to_numpy()]),
+        colorscale=[[0, COLOR_PALETTE[5]], [1, COLOR_PALETTE[0]]],
+        marker=dict(opacity=0.45, line=dict(width=0.5, color='white')),
+        colorbar=dict(title=dict(text='$/m²'), thickness=12, len=0.5, x=0.99, xanchor='right'),
+        hovertemplate=(
+            "<b>%{text}</b><br>"
+            "🏠 %{customdata[0]:,} propiedades<br>"
+            "📐 Mediana: $%{z:,.0f}/m²<br>"
+            "💰 Mediana venta: $%{customdata[1]:,.0f}"
+            "<extra></extra>"
+        ),
+        name='Precio por m²',
+        showlegend=False
+    )
+
+def _hover_text(df, column, default):
+    """Columna como lista de textos para el hover, con `default` en los vacíos"""
+    if column not in df.columns:
+        return [default] * len(df)
+    values = df[column].astype(object)
+    return values.where(values.notna(), default).tolist()
+
+def _hover_number(df, column, decimals, default='N/A'):
+    """Columna numérica redondeada como lista para el hover, con `default` en los vacíos"""
+    if column not in df.columns:
+        return [default] * len(df)
+    values = pd.to_numeric(df[column], errors='coerce').round(decimals)
+    if decimals == 0:
+        values = values.astype('Int64')
+    values = values.astype(object)
+    return values.where(values.notna(), default).tolist()
+
+def hover_columns(df):
+    """
+    Campos del hover de los puntos, una lista por campo.
+
+    La plantilla de hover_template() los referencia por posición, así que el
+    orden de los campos debe coincidir.
+    """
+    return [
+        _hover_text(df, 'title', 'Sin título'),
+        _hover_text(df, 'city_name', 'Desconocida'),
+        _hover_text(df, 'property_type', 'Desconocido'),
+        _hover_number(df, 'rooms', 0),
+        _hover_number(df, 'bathrooms', 0),
+        _hover_number(df, 'area', 1),
+        _hover_number(df, 'sale_value', 0, default=0),
+    ]
+
+def hover_customdata(df):
+    """Campos del hover de cada punto, una tupla por punto (customdata de plotly)"""
+    return list(zip(*hover_columns(df)))
+
+def encode_column(values):
+    """Columna del payload externo; con muchos valores repetidos se codifica como diccionario"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    if len(uniques) * 2 < len(values):
+        return {'values': uniques.tolist(), 'codes': codes.tolist()}
+    return {'data': values}
+
+def hover_template(segment_label):
+    """Plantilla de hover compartida por todos los puntos de un segmento"""
+    return (
+        "<b>%{customdata[0]}</b><br>"
+        "📍 %{customdata[1]}<br>"
+        "🏠 %{customdata[2]}<br>"
+        "🛏️ %{customdata[3]} hab · 🚿 %{customdata[4]} baños<br>"
+        "📏 %{customdata[5]} m²<br>"
+        "💰 $%{customdata[6]:,.0f}<br>"
+        f"🏷️ {segment_label}"
+        "<extra></extra>"
+    )
+
+def aggregate_grid(df, cell_size):
+    """
+    Agregar las propiedades en una rejilla de `cell_size` grados por segmento.
+
+    Returns:
+        pd.DataFrame: Una fila por (cluster, celda) con el número de
+                      propiedades, la mediana de sale_value y el centroide
+    """
+    cells = df[['cluster', 'lat', 'lon']].copy()
+    cells['sale_value'] = pd.to_numeric(df['sale_value'], errors='coerce') if 'sale_value' in df.columns else np.nan
+    cells['cell_lat'] = np.floor(cells['lat'].to_numpy() / cell_size).astype(np.int32)
+    cells['cell_lon'] = np.floor(cells['lon'].to_numpy() / cell_size).astype(np.int32)
+
+    grid = cells.groupby(['cluster', 'cell_lat', 'cell_lon'], sort=False).agg(
+        count=('lat', 'size'),
+        median_sale_value=('sale_value', 'median'),
+        lat=('lat', 'mean'),
+        lon=('lon', 'mean'),
+    ).reset_index()
+    return grid
+
+def build_zoom_layers(df, zoom_layers=ZOOM_LAYERS):
+    """
+    Precalcular la agregación de cada capa de zoom.
+
+    Returns:
+        list: (zoom mínimo, rejilla agregada o None para los puntos individuales)
+    """
+    return [(min_zoom, None if cell_size is None else aggregate_grid(df, cell_size))
+            for min_zoom, cell_size in zoom_layers]
+
+def active_zoom_layer(zoom, zoom_layers=ZOOM_LAYERS):
+    """Índice de la capa que corresponde a un nivel de zoom"""
+    layer = 0
+    for position, (min_zoom, _) in enumerate(zoom_layers):
+        if zoom >= min_zoom:
+            layer = position
+    return layer
+
+def aggregate_template(segment_label):
+    """Plantilla de hover de las celdas agregadas de un segmento"""
+    return (
+        "<b>%{customdata[0]:,} propiedades</b><br>"
+        "💰 Mediana: $%{customdata[1]:,.0f}<br>"
+        f"🏷️ {segment_label}"
+        "<extra></extra>"
+    )
+
+def aggregate_traces(grid, layer, visible, category_colors, segment_labels):
+    """Trazas de una capa agregada: una por segmento, con el tamaño según el conteo"""
+    traces = []
+    max_count = max(int(grid['count'].max()), 1) if len(grid) else 1
+    for category, cells in grid.groupby('cluster', sort=True):
+        counts = cells['count'].to_numpy()
+        traces.append(dict(
+            type='scattermapbox',
+            lat=cells['lat'].round(COORDINATE_DECIMALS).to_numpy(),
+            lon=cells['lon'].round(COORDINATE_DECIMALS).to_numpy(),
+            mode='markers',
+            marker=dict(
+                size=np.round(6 + 24 * np.sqrt(counts / max_count), 1),
+                color=category_colors[category],
+                opacity=0.7,
+            ),
+            name=segment_labels[category],
+            legendgroup=str(category),
+            visible=visible,
+            meta=dict(zoom_layer=layer),
+            customdata=np.column_stack([counts, cells['median_sale_value'].fillna(0).round(0).to_numpy()]),
+            hovertemplate=aggregate_template(segment_labels[category])
+        ))
+    return traces
+
+def segment_styles(df):
+    """Color y etiqueta de cada segmento del mapa"""
+    category_colors = {i: COLOR_PALETTE[i % len(COLOR_PALETTE)] for i in df['cluster'].unique()}
+    segment_labels = df.groupby('cluster', sort=True)['segment_label'].first().to_dict()
+    return category_colors, segment_labels
+
+def individual_point_traces(df, category_colors, segment_labels, aggregated, columnar=False, zoom=MAP_ZOOM):
+    """
+    Trazas con una propiedad por punto, una por segmento.
+
+    Los campos de cada punto van una sola vez en customdata y todos comparten
+    la misma plantilla de hover. Se construyen como dicts para que plotly no
+    valide ni copie punto por punto. Con `columnar` los campos se guardan por
+    columna (customdata_columns) para el payload externo; ahí todo va como
+    listas, porque plotly >= 6 serializa los arrays de numpy como objetos
+    base64 (bdata) que el script de points_loader_script() no decodifica.
+    """
+    points_layer = len(ZOOM_LAYERS) - 1
+    visible = not aggregated or active_zoom_layer(zoom) == points_layer
+
+    traces = []
     for category in sorted(df['cluster'].unique()):
         category_df = df[df['cluster'] == category]
-        color = category_colors[category]
-
-        # Texto para hover
-        hover_text = []
-        for _, row in category_df.iterrows():
-            text = f"""
-            <b>{row.get('title', 'Sin título')}</b><br>
-            📍 {row.get('city_name', 'Desconocida')}<br>
-            🏠 {row.get('property_type', 'Desconocido')}<br>
-            🛏️ {row.get('rooms', 'N/A')} hab · 🚿 {row.get('bathrooms', 'N/A')} baños<br>
-            📏 {row.get('area', 'N/A')} m²<br>
-            💰 ${row.get('sale_value', 0):,.0f}<br>
-            🏷️ {row.get('segment_label', 'Sin segmento')}
-            """
-            hover_text.append(text)
-
-        fig.add_trace(go.Scattermapbox(
-            lat=category_df['lat'],
-            lon=category_df['lon'],
+        segment = segment_labels.get(category, f'Categoría {category}')
+        lat = category_df['lat'].round(COORDINATE_DECIMALS).to_numpy()
+        lon = category_df['lon'].round(COORDINATE_DECIMALS).to_numpy()
+
+        trace = dict(
+            type='scattermapbox',
+            lat=lat.tolist() if columnar else lat,
+            lon=lon.tolist() if columnar else lon,
             mode='markers',
             marker=dict(
                 size=10,
-                color=color,
+                color=category_colors[category],
                 opacity=0.8,
                 symbol='circle'
             ),
-            name=category_df['segment_label'].iloc[0] if not category_df.empty else f'Categoría {category}',
-            text=hover_text,
-            hoverinfo='text'
+            name=segment,
+            legendgroup=str(category),
+            visible=visible,
+            meta=dict(zoom_layer=points_layer) if aggregated else None,
+            hovertemplate=hover_template(segment)
+        )
+        if columnar:
+            trace['customdata_columns'] = [encode_column(column) for column in hover_columns(category_df)]
+        else:
+            trace['customdata'] = hover_customdata(category_df)
+        traces.append(trace)
+    return traces
+
+def create_interactive_map(df, geojson, include_points=True, view=None):
+    """
+    Crear mapa interactivo de Colombia.
+
+    Args:
+        include_points: Si es False la figura no lleva los puntos individuales
+                        (van en el payload externo, ver points_payload). Con
+                        muchas propiedades tampoco se incluyen con True: la
+                        figura solo lleva las celdas de INLINE_ZOOM_LAYERS,
+                        para que la página no cargue todos los puntos
+        view: Título, subtítulo, centro y zoom (ver DEFAULT_VIEW)
+
+    Returns:
+        dict: Figura de plotly (data y layout) lista para plotly.io.to_html
+    """
+
+    view = {**DEFAULT_VIEW, **(view or {})}
+
+    # Configurar colores y etiquetas de los segmentos
+    category_colors, segment_labels = segment_styles(df)
+
+    # Crear figura base
+    fig = go.Figure()
+
+    # Fondo: departamentos coloreados por precio por m² o, sin GeoJSON de
+    # regiones, el contorno aproximado de Colombia
+    background = region_choropleth(df, geojson)
+    if background is None:
+        fig.add_trace(go.Choroplethmapbox(
+            geojson=geojson,
+            locations=["COL"],
+            z=[1],
+            colorscale=[[0, 'rgba(0,0,0,0.1)'], [1, 'rgba(0,0,0,0.1)']],
+            marker_opacity=0.3,
+            marker_line_width=0,
+            showscale=False
         ))
 
+    # Con muchas propiedades, el zoom nacional muestra celdas agregadas y los
+    # puntos individuales solo aparecen al acercarse (ver ZOOM_LAYERS)
+    point_traces = []
+    aggregated = len(df) >= AGGREGATE_MIN_POINTS
+    if aggregated:
+        zoom_layers = INLINE_ZOOM_LAYERS if include_points else ZOOM_LAYERS
+        current_layer = active_zoom_layer(view['zoom'], zoom_layers)
+        for layer, (_, grid) in enumerate(build_zoom_layers(df, zoom_layers)):
+            if grid is not None:
+                point_traces.extend(aggregate_traces(grid, layer, layer == current_layer,
+                                                     category_colors, segment_labels))
+
+    if include_points and not aggregated:
+        point_traces.extend(individual_point_traces(df, category_colors, segment_labels, aggregated,
+                                                    zoom=view['zoom']))
+
     # Configurar layout del mapa
     fig.update_layout(
         title=dict(
-            text='<b>🌎 Mapa de Propiedades Inmobiliarias en Colombia</b><br>'
-             '<sub>Distribución geográfica por segmentos de mercado</sub>',
+            text=f"<b>🌎 {view['title']}</b><br>"
+             f"<sub>{view['subtitle']}</sub>",
             x=0.5,
             xanchor='center',
             font=dict(size=18, color='#333333')
         ),
         mapbox=dict(
             style="carto-positron",
-            zoom=4.5,
-            center=dict(lat=4.570868, lon=-74.297333)
+            zoom=view['zoom'],
+            center=view['center']
         ),
         plot_bgcolor=BACKGROUND_COLOR,
         paper_bgcolor=BACKGROUND_COLOR,
@@ -174,7 +450,169 @@ def create_interactive_map(df, geojson):
         margin=dict(l=0, r=0, t=100, b=0)
     )
 
-    return fig
+    figure = fig.to_dict()
+    if background is not None:
+        figure['data'].insert(0, background)
+    figure['data'].extend(point_traces)
+    return figure
+
+def zoom_layers_script(div_id='map', zoom_layers=ZOOM_LAYERS):
+    """
+    Script que cambia la capa visible del mapa según el zoom.
+
+    Cada traza de una capa lleva meta.zoom_layer; al cruzar un umbral de
+    ZOOM_LAYERS se ocultan las trazas de la capa anterior y se muestran las
+    de la nueva, conservando los segmentos ocultados desde la leyenda.
+    """
+    min_zooms = json.dumps([min_zoom for min_zoom, _ in zoom_layers])
+    return f"""
+    <script>
+    (function() {{
+        var gd = document.getElementById('{div_id}');
+        if (!gd || !gd.on) return;
+        var minZooms = {min_zooms};
+        function layerFor(zoom) {{
+            var layer = 0;
+            minZooms.forEach(function(minZoom, i) {{ if (zoom >= minZoom) layer = i; }});
+            return layer;
+        }}
+        function traceLayer(trace) {{
+            return trace.meta && trace.meta.zoom_layer !== undefined ? trace.meta.zoom_layer : null;
+        }}
+        var current = layerFor(gd.layout.mapbox.zoom);
+        gd.on('plotly_relayout', function(event) {{
+            var zoom = event['mapbox.zoom'];
+            if (zoom === undefined) return;
+            var layer = layerFor(zoom);
+            if (layer === current) return;
+            var hidden = {{}};
+            gd.data.forEach(function(trace) {{
+                if (traceLayer(trace) === current && trace.visible === 'legendonly') hidden[trace.legendgroup] = true;
+            }});
+            var indices = [], visible = [];
+            gd.data.forEach(function(trace, i) {{
+                var traceLayerIndex = traceLayer(trace);
+                if (traceLayerIndex === null) return;
+                indices.push(i);
+                visible.push(traceLayerIndex !== layer ? false : (hidden[trace.legendgroup] ? 'legendonly' : true));
+            }});
+            current = layer;
+            if (indices.length) Plotly.restyle(gd, {{visible: visible}}, indices);
+        }});
+    }})();
+    </script>
+    """
+
+def points_payload(df, zoom=MAP_ZOOM):
+    """
+    Puntos individuales del mapa como payload columnar para descargar aparte.
+
+    Cada traza guarda lat/lon y los campos del hover por columna; los campos
+    con muchos valores repetidos (ciudad, tipo, título) van codificados como
+    diccionario. El script de points_loader_script() reconstruye customdata.
+    """
+    category_colors, segment_labels = segment_styles(df)
+    aggregated = len(df) >= AGGREGATE_MIN_POINTS
+    return {
+        'format_version': POINTS_FORMAT_VERSION,
+        'traces': individual_point_traces(df, category_colors, segment_labels, aggregated,
+                                          columnar=True, zoom=zoom),
+    }
+
+def write_points_payload(payload, path):
+    """Guardar el payload como JSON comprimido con gzip (sin fecha, para que sea reproducible)"""
+    data = pio.json.to_json_plotly(payload).encode('utf-8')
+    with open(path, 'wb') as file:
+        file.write(gzip.compress(data, compresslevel=6, mtime=0))
+    return path
+
+def vendor_plotlyjs(output_dir):
+    """
+    Copiar plotly.js (el incluido en el paquete de plotly) a `output_dir`/assets.
+
+    Se escribe una sola vez y lo comparten todas las páginas de esa carpeta;
+    solo se reescribe si cambia la versión instalada.
+    """
+    path = os.path.join(output_dir, PLOTLYJS_ASSET)
+    script = get_plotlyjs().encode('utf-8')
+    if os.path.exists(path) and os.path.getsize(path) == len(script):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as file:
+        file.write(script)
+    return path
+
+def plotlyjs_src(page_path=None, output_dir=None, offline=MAP_OFFLINE):
+    """URL de plotly.js para una página: copia local relativa a la página o CDN de la versión instalada"""
+    if not offline:
+        return f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+    page_dir = os.path.dirname(os.path.abspath(page_path or MAP_OUTPUT_PATH))
+    asset_path = vendor_plotlyjs(output_dir or page_dir)
+    return os.path.relpath(asset_path, page_dir).replace(os.sep, '/')
+
+def points_path_for(page_path):
+    """Ruta del payload de puntos de una página"""
+    return os.path.splitext(page_path)[0] + '.points.json.gz'
+
+def points_loader_script(points_url, div_id='map', zoom_layers=ZOOM_LAYERS):
+    """
+    Script que descarga los puntos individuales después de pintar la página.
+
+    Acepta el archivo tanto si el servidor lo descomprime (Content-Encoding:
+    gzip) como si lo entrega tal cual, en cuyo caso lo descomprime con
+    DecompressionStream.
+    """
+    min_zooms = json.dumps([min_zoom for min_zoom, _ in zoom_layers])
+    return f"""
+    <script>
+    (function() {{
+        var gd = document.getElementById('{div_id}');
+        if (!gd) return;
+        var minZooms = {min_zooms};
+        function layerFor(zoom) {{
+            var layer = 0;
+            minZooms.forEach(function(minZoom, i) {{ if (zoom >= minZoom) layer = i; }});
+            return layer;
+        }}
+        function readPayload(buffer) {{
+            var bytes = new Uint8Array(buffer);
+            if (bytes[0] === 0x1f && bytes[1] === 0x8b) {{
+                var stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('gzip'));
+                return new Response(stream).json();
+            }}
+            return JSON.parse(new TextDecoder().decode(bytes));
+        }}
+        function decodeTrace(trace) {{
+            var columns = trace.customdata_columns.map(function(column) {{
+                return column.codes ? column.codes.map(function(code) {{ return column.values[code]; }}) : column.data;
+            }});
+            trace.customdata = trace.lat.map(function(_, i) {{
+                return columns.map(function(column) {{ return column[i]; }});
+            }});
+            delete trace.customdata_columns;
+            if (trace.meta && trace.meta.zoom_layer !== undefined) {{
+                trace.visible = layerFor(gd.layout.mapbox.zoom) === trace.meta.zoom_layer;
+            }}
+            return trace;
+        }}
+        function load() {{
+            if (location.protocol === 'file:') {{
+                console.warn('Los puntos del mapa ({points_url}) no se pueden descargar desde file://; sirve la carpeta por HTTP');
+            }}
+            fetch('{points_url}')
+                .then(function(response) {{
+                    if (!response.ok) throw new Error(response.status + ' ' + response.statusText);
+                    return response.arrayBuffer();
+                }})
+                .then(readPayload)
+                .then(function(payload) {{ return Plotly.addTraces(gd, payload.traces.map(decodeTrace)); }})
+                .catch(function(error) {{ console.error('No se pudieron cargar los puntos del mapa:', error); }});
+        }}
+        if (document.readyState === 'complete') setTimeout(load, 0);
+        else window.addEventListener('load', function() {{ setTimeout(load, 0); }});
+    }})();
+    </script>
+    """
 
 def generate_statistics(df):
     """Generar estadísticas detalladas"""
@@ -189,8 +627,17 @@ def generate_statistics(df):
     }
     return stats
 
-def generate_html_output(fig, df, stats):
-    """Generar salida HTML completa con estadísticas"""
+def generate_html_output(fig, df, stats, plotlyjs_url=None, points_url=None, page_title='Colombia'):
+    """
+    Generar salida HTML completa con estadísticas.
+
+    Args:
+        plotlyjs_url: URL de plotly.js (por defecto el CDN de la versión instalada)
+        points_url: URL del payload de puntos individuales, si van aparte
+        page_title: Ámbito del mapa para el título de la página
+    """
+    plotlyjs_url = plotlyjs_url or plotlyjs_src(offline=False)
+    points_script = points_loader_script(points_url, 'map') if points_url else ''
 
     # Crear HTML para estadísticas de segmentos
     stats_html = ""
@@ -214,8 +661,8 @@ def generate_html_output(fig, df, stats):
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Mapa de Propiedades - Colombia</title>
-        <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+        <title>Mapa de Propiedades - {html.escape(page_title)}</title>
+        <script src="{plotlyjs_url}"></script>
         <style>
             body {{
                 background-color: {BACKGROUND_COLOR};
@@ -281,7 +728,9 @@ def generate_html_output(fig, df, stats):
             </div>
 
             <div class="map-container">
-                {fig.to_html(include_plotlyjs='cdn', div_id='map', full_html=False)}
+                {pio.to_html(fig, include_plotlyjs=False, div_id='map', full_html=False, validate=False)}
+                {zoom_layers_script('map', ZOOM_LAYERS if points_url else INLINE_ZOOM_LAYERS)}
+                {points_script}
             </div>
         </div>
     </body>
@@ -290,34 +739,88 @@ def generate_html_output(fig, df, stats):
 
     return html_content
 
-def main():
-    """Función principal"""
-    print("🚀 Iniciando generación del mapa de Colombia...")
-
-    print("📊 Cargando y procesando datos...")
-    df = load_and_process_data()
+def build_map_html(df, plotlyjs_url=None, points_url=None, geojson=None, view=None):
+    """
+    Generar la página HTML del mapa a partir de los datos procesados.
 
-    if df is None or len(df) == 0:
-        print("❌ No se encontraron datos válidos con coordenadas.")
-        return
+    Args:
+        plotlyjs_url: URL de plotly.js (ver plotlyjs_src)
+        points_url: Si se indica, los puntos individuales no se incluyen en la
+                    página y se descargan de esta URL (ver points_payload)
+        geojson: GeoJSON ya cargado (por defecto get_colombia_geojson())
+        view: Título, centro y zoom del mapa (ver DEFAULT_VIEW)
 
-    print("🗺️ Configurando datos geográficos de Colombia...")
-    geojson = get_colombia_geojson()
+    Returns:
+        tuple: (contenido HTML, estadísticas)
+    """
+    if geojson is None:
+        print("🗺️ Configurando datos geográficos de Colombia...")
+        geojson = get_colombia_geojson()
 
     print("🎨 Generando mapa interactivo...")
-    fig = create_interactive_map(df, geojson)
+    fig = create_interactive_map(df, geojson, include_points=points_url is None, view=view)
 
     print("📈 Calculando estadísticas...")
     stats = generate_statistics(df)
 
     print("💻 Generando archivo HTML...")
-    html_content = generate_html_output(fig, df, stats)
+    page_title = (view or {}).get('page_title', 'Colombia')
+    html_content = generate_html_output(fig, df, stats, plotlyjs_url, points_url, page_title)
 
-    # Guardar archivo HTML
-    with open('colombia_properties_map.html', 'w', encoding='utf-8') as f:
+    return html_content, stats
+
+def write_map(df, output_path=MAP_OUTPUT_PATH, external_data=MAP_EXTERNAL_DATA, offline=MAP_OFFLINE,
+              assets_dir=None, geojson=None, view=None):
+    """
+    Escribir la página del mapa y, según el modo, sus archivos auxiliares.
+
+    Args:
+        external_data: Escribir los puntos individuales en un .points.json.gz
+                       junto a la página y descargarlos de forma diferida
+        offline: Usar la copia local de plotly.js en `assets_dir` (por defecto
+                 la carpeta de la página) en lugar del CDN
+        assets_dir: Carpeta compartida de assets, para varias páginas
+        geojson: GeoJSON ya cargado (por defecto get_colombia_geojson())
+        view: Título, centro y zoom del mapa (ver DEFAULT_VIEW)
+
+    Returns:
+        dict: Estadísticas del mapa
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    plotlyjs_url = plotlyjs_src(output_path, assets_dir or output_dir, offline)
+    zoom = (view or {}).get('zoom', MAP_ZOOM)
+
+    points_url = None
+    if external_data:
+        points_path = write_points_payload(points_payload(df, zoom), points_path_for(output_path))
+        points_url = os.path.basename(points_path)
+        print(f"📦 Puntos guardados aparte: {points_path} ({os.path.getsize(points_path) / 1e6:.1f} MB)")
+        print("⚠️  Los puntos se descargan con fetch: abre la página desde un servidor HTTP "
+              f"(p. ej. python -m http.server en {output_dir}), no como archivo local (file://)")
+    elif len(df) >= AGGREGATE_MIN_POINTS:
+        print("ℹ️  Mapa agregado por celdas; usa MIIA_MAP_EXTERNAL_DATA=1 para ver las propiedades individuales")
+
+    html_content, stats = build_map_html(df, plotlyjs_url, points_url, geojson, view)
+    with open(output_path, 'w', encoding='utf-8') as f:
         f.write(html_content)
+    return stats
+
+def main():
+    """Función principal"""
+    print("🚀 Iniciando generación del mapa de Colombia...")
+
+    print("📊 Cargando y procesando datos...")
+    df = load_and_process_data()
+
+    if df is None or len(df) == 0:
+        print("❌ No se encontraron datos válidos con coordenadas.")
+        return
+
+    # Guardar archivo HTML (y el payload de puntos / plotly.js local según el modo)
+    stats = write_map(df, MAP_OUTPUT_PATH)
 
-    print("✅ Mapa generado exitosamente: colombia_properties_map.html")
+    print(f"✅ Mapa generado exitosamente: {MAP_OUTPUT_PATH}")
     print(f"📊 Estadísticas finales:")
     print(f"   - Propiedades mapeadas: {stats['total_properties']:,}")
     print(f"   - Ciudades únicas: {stats['unique_cities']}")
@@ -0,0 +1,223 @@
+import os
+import math
+import hashlib
+import numpy as np
+import pandas as pd
+from json2csv import CHUNK_SIZE, _filter_chunk, json_to_csv
+from listing_decoder import ListingDecoder
+from listings_io import atomic_write, dataset_path, is_parquet_path, read_listings, write_listings
+
+STATE_COLUMNS = ['web_id', 'update_date', 'content_hash']
+# Campos que deciden si una línea pasa los filtros de json2csv (ver _filter_chunk)
+FILTER_FIELDS = ['business_type', 'rent_value']
+
+def normalize_web_id(web_id):
+    """web_id como texto, igual para 123, 123.0 y "123" (None si falta)"""
+    if web_id is None or web_id is pd.NA or (isinstance(web_id, float) and math.isnan(web_id)):
+        return None
+    if isinstance(web_id, float) and web_id.is_integer():
+        return str(int(web_id))
+    return str(web_id)
+
+def scan_listing_hashes(json_file_path, decoder=None):
+    """
+    Recorrer el archivo y calcular el hash de contenido de cada web_id.
+
+    El web_id y la update_date se toman del registro decodificado (solo las
+    claves de primer nivel) y el hash se calcula sobre el texto de la línea.
+    Si un web_id aparece varias veces, su hash combina todas sus líneas.
+    Además se guarda, por cada línea válida, su posición, su web_id y los
+    campos de FILTER_FIELDS, para ubicar cada fila en el orden del archivo.
+
+    Returns:
+        tuple: (dict web_id -> (update_date, hash), DataFrame de líneas,
+                líneas inválidas o sin web_id)
+    """
+    listing_decoder = ListingDecoder(decoder)
+    current = {}
+    skipped = 0
+    lines = {'line': [], 'web_id': []}
+    fields = {field: [] for field in FILTER_FIELDS}
+    present = set()
+
+    with open(json_file_path, 'rb') as file:
+        for line_number, raw_line in enumerate(file):
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            try:
+                obj = listing_decoder.decode(line)
+            except listing_decoder.errors:
+                skipped += 1
+                continue
+            if not isinstance(obj, dict):
+                skipped += 1
+                continue
+
+            web_id = normalize_web_id(obj.get('web_id'))
+            lines['line'].append(line_number)
+            lines['web_id'].append(web_id)
+            for field in FILTER_FIELDS:
+                fields[field].append(obj.get(field))
+            present.update(field for field in FILTER_FIELDS if field in obj)
+            if web_id is None:
+                skipped += 1
+                continue
+
+            digest = hashlib.blake2b(line, digest_size=16).digest()
+            if web_id in current:
+                digest = hashlib.blake2b(current[web_id][1] + digest, digest_size=16).digest()
+            current[web_id] = (obj.get('update_date'), digest)
+
+    lines.update((field, values) for field, values in fields.items() if field in present)
+    return current, pd.DataFrame(lines), skipped
+
+def load_state(state_path):
+    """Cargar el estado persistido web_id -> (update_date, hash)"""
+    if not os.path.exists(state_path):
+        return None
+
+    if is_parquet_path(state_path):
+        state_df = read_listings(state_path, columns=STATE_COLUMNS)
+    else:
+        state_df = pd.read_csv(state_path, usecols=STATE_COLUMNS, dtype=str)
+    state = {}
+    for web_id, update_date, content_hash in state_df[STATE_COLUMNS].itertuples(index=False):
+        state[str(web_id)] = (None if pd.isna(update_date) else update_date, bytes.fromhex(content_hash))
+    return state
+
+def save_state(current, state_path):
+    """Guardar el estado de forma atómica"""
+    state_df = pd.DataFrame({
+        'web_id': list(current.keys()),
+        'update_date': [update_date for update_date, _ in current.values()],
+        'content_hash': [digest.hex() for _, digest in current.values()],
+    })
+    with atomic_write(state_path) as tmp_path:
+        write_listings(state_df, tmp_path)
+
+def _load_changed_records(json_file_path, changed_lines, decoder=None):
+    """Segunda pasada: parsear solo las líneas de los web_id nuevos o modificados"""
+    listing_decoder = ListingDecoder(decoder)
+    records, positions = [], []
+    with open(json_file_path, 'rb') as file:
+        for line_number, raw_line in enumerate(file):
+            if line_number not in changed_lines:
+                continue
+            records.append(listing_decoder.decode(raw_line))
+            positions.append(line_number)
+    return pd.DataFrame(records, index=positions)
+
+def _row_positions(existing_ids, lines):
+    """
+    Posición en el archivo de cada fila conservada del dataset.
+
+    Las líneas de un web_id sin cambios son idénticas a las de la ejecución
+    anterior, así que sus filas son, en orden, las líneas de ese web_id que
+    pasan los filtros. Las filas sin línea correspondiente van al final.
+    """
+    kept, _ = _filter_chunk(lines)
+    kept = kept[['web_id', 'line']].assign(n=kept.groupby('web_id', dropna=False).cumcount())
+    keys = pd.DataFrame({'web_id': existing_ids.to_numpy(),
+                         'n': existing_ids.groupby(existing_ids, dropna=False).cumcount().to_numpy()})
+    positions = keys.merge(kept, how='left', on=['web_id', 'n'])['line']
+    return positions.fillna(np.inf).to_numpy()
+
+def incremental_json_to_csv(json_file_path, output_path, state_path=None, workers=None, decoder=None):
+    """
+    Actualizar el dataset de salida procesando solo las propiedades nuevas o modificadas.
+
+    Se compara el hash de contenido de cada web_id con el estado de la
+    ejecución anterior. Las filas de los web_id modificados o que ya no
+    aparecen en el export (tombstones) se eliminan del dataset, y las de los
+    web_id nuevos o modificados se parsean y filtran. Todas las filas quedan
+    en el orden de sus líneas en el export, así que el resultado es el mismo
+    que el de una conversión completa. Sin estado previo se hace una
+    conversión completa.
+
+    Args:
+        json_file_path (str): Export completo del portal en JSON Lines
+        output_path (str): Dataset filtrado (.csv o .parquet) a mantener
+        state_path (str, optional): Archivo de estado. Por defecto junto al dataset
+        workers (int, optional): Procesos para la conversión completa inicial
+        decoder (str, optional): Backend de JSON (ver listing_decoder)
+
+    Returns:
+        str: Ruta del dataset actualizado
+    """
+    if state_path is None:
+        root, extension = os.path.splitext(output_path)
+        state_path = f"{root}_state{'.parquet' if is_parquet_path(output_path) else extension}"
+
+    print(f"Calculando hashes de contenido: {json_file_path}")
+    current, lines, skipped = scan_listing_hashes(json_file_path, decoder)
+    if skipped:
+        print(f"⚠️ {skipped} líneas inválidas o sin web_id se ignoran en el modo incremental")
+
+    state = load_state(state_path)
+    if state is None or not os.path.exists(output_path):
+        print("Sin estado previo: conversión completa")
+        result = json_to_csv(json_file_path, output_path, chunksize=CHUNK_SIZE, workers=workers, decoder=decoder)
+        if result:
+            save_state(current, state_path)
+        return result
+
+    new_ids = current.keys() - state.keys()
+    removed_ids = state.keys() - current.keys()
+    modified_ids = {
+        web_id for web_id in current.keys() & state.keys()
+        if current[web_id][1] != state[web_id][1]
+    }
+    changed_ids = new_ids | modified_ids
+
+    print(f"Nuevos: {len(new_ids)} · Modificados: {len(modified_ids)} · "
+          f"Eliminados: {len(removed_ids)} · Sin cambios: {len(current) - len(changed_ids)}")
+
+    if not changed_ids and not removed_ids:
+        print("✅ El dataset ya está actualizado")
+        return output_path
+
+    if is_parquet_path(output_path):
+        existing = read_listings(output_path)
+    else:
+        # round_trip evita que los flotantes cambien en cada reescritura del CSV
+        existing = pd.read_csv(output_path, float_precision='round_trip')
+    existing_ids = existing['web_id'].map(normalize_web_id)
+    stale = existing_ids.isin(changed_ids | removed_ids)
+    existing = existing[~stale]
+    positions = _row_positions(existing_ids[~stale], lines)
+
+    changed_lines = set(lines.loc[lines['web_id'].isin(changed_ids), 'line'])
+    updates = _load_changed_records(json_file_path, changed_lines, decoder)
+    if len(updates):
+        columns = list(existing.columns) + [col for col in updates.columns if col not in existing.columns]
+        updates, _ = _filter_chunk(updates.reindex(columns=columns))
+
+    print(f"Filas eliminadas: {int(stale.sum())} · Filas añadidas: {len(updates)}")
+
+    if len(updates):
+        positions = np.concatenate([positions, updates.index.to_numpy(dtype=float)])
+        existing = pd.concat([existing, updates], ignore_index=True)
+        existing = existing.iloc[np.argsort(positions, kind='stable')].reset_index(drop=True)
+    with atomic_write(output_path) as tmp_path:
+        write_listings(existing, tmp_path)
+    save_state(current, state_path)
+
+    print(f"✅ Dataset actualizado: {output_path} ({len(existing)} registros)")
+    return output_path
+
+def main():
+    """Función principal para la actualización incremental diaria"""
+    json_file = "json_habi_data/inmobiliario.json"
+    output_file = dataset_path("inmobiliario")
+
+    result = incremental_json_to_csv(json_file, output_file, workers=os.cpu_count())
+
+    if result:
+        print(f"Archivo actualizado en: {result}")
+    else:
+        print("La actualización falló")
+
+if __name__ == "__main__":
+    main()
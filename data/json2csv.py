@@ -1,15 +1,336 @@
 import os
-import json
+from array import array
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from listing_decoder import ListingDecoder
+from listing_index import index_path_for, web_id_key, write_index
+from listings_io import ParquetChunkWriter, dataset_path, is_parquet_path, listing_arrow_schema, write_listings
 
-def json_to_csv(json_file_path, csv_file_path=None):
+# Número de líneas por bloque en el modo streaming
+CHUNK_SIZE = 100000
+
+def iter_json_records(json_file_path, decoder=None):
+    """Iterar los objetos de un archivo JSON Lines, reportando líneas inválidas"""
+    listing_decoder = ListingDecoder(decoder)
+    decode = listing_decoder.decode
+    with open(json_file_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if line:  # Ignorar líneas vacías
+                try:
+                    yield decode(line)
+                except listing_decoder.errors as e:
+                    print(f"Error en línea {line_number}: {e}")
+                    print(f"Contenido de la línea: {line}")
+
+def _merge_dtype(current, new):
+    """Combinar dos dtypes de columna igual que pandas al construir un único DataFrame"""
+    if current is None or current == new:
+        return new
+    if (pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(new)
+            and not pd.api.types.is_bool_dtype(current) and not pd.api.types.is_bool_dtype(new)):
+        return np.dtype('float64')
+    return np.dtype('O')
+
+def _dtype_with_missing(dtype):
+    """Dtype resultante cuando una columna tiene valores faltantes en algún registro"""
+    if pd.api.types.is_bool_dtype(dtype):
+        return np.dtype('O')
+    if pd.api.types.is_integer_dtype(dtype):
+        return np.dtype('float64')
+    return dtype
+
+def _filter_chunk(df):
+    """Aplicar los filtros de venta y rent_value a un bloque sin imprimir progreso"""
+    if 'business_type' in df.columns:
+        df = df[df['business_type'].str.contains('venta', case=False, na=False)]
+
+    rent_dtype = None
+    if 'rent_value' in df.columns:
+        df = df.copy()
+        df['rent_value'] = pd.to_numeric(df['rent_value'], errors='coerce')
+        if len(df):
+            rent_dtype = df['rent_value'].dtype
+        df = df[df['rent_value'].notna() & (df['rent_value'] >= 1000000)]
+
+    return df, rent_dtype
+
+def shard_offsets(json_file_path, n_shards):
+    """
+    Dividir un archivo en `n_shards` rangos de bytes alineados a inicio de línea.
+
+    Returns:
+        list: Pares (inicio, fin) contiguos que cubren todo el archivo
+    """
+    size = os.path.getsize(json_file_path)
+    boundaries = [0]
+    with open(json_file_path, 'rb') as file:
+        for i in range(1, n_shards):
+            file.seek(max(size * i // n_shards, boundaries[-1]))
+            if file.tell() > 0:
+                file.seek(file.tell() - 1)
+                file.readline()  # Avanzar hasta el inicio de la siguiente línea
+            boundaries.append(min(file.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def _summarize_chunk(records, spool_path):
+    """
+    Filtrar un bloque de registros y guardarlo en `spool_path`.
+
+    Returns:
+        dict: Resumen del bloque con las columnas y dtypes antes de filtrar,
+              necesarios para reconstruir el esquema del archivo completo
+    """
+    df = pd.DataFrame(records)
+    columns = [(col, None if df[col].isna().all() else df[col].dtype) for col in df.columns]
+    absent_filters = {col for col in ('business_type', 'rent_value') if col not in df.columns}
+    # Los enteros de una columna float64 ya se convirtieron (5 -> 5.0); si otro
+    # bloque la vuelve object se necesitan los valores tal como se decodificaron
+    float_columns = [col for col, dtype in columns if dtype == np.dtype('float64') and col != 'rent_value']
+    df, rent_dtype = _filter_chunk(df)
+
+    object_kinds = {}
+    if len(df):
+        raw = pd.DataFrame(records, columns=float_columns, dtype=object).loc[df.index]
+        pd.to_pickle({'frame': df, 'raw': raw}, spool_path)
+        # Tipos de los valores de las columnas que pueden quedar object, para
+        # el esquema Parquet sin volver a leer los bloques
+        object_kinds = {col: pd.api.types.infer_dtype(df[col], skipna=True)
+                        for col in df.columns if df[col].dtype == np.dtype('O')}
+        object_kinds.update({col: pd.api.types.infer_dtype(raw[col], skipna=True) for col in raw.columns})
+    else:
+        spool_path = None
+
+    return {
+        'n_read': len(records),
+        'columns': columns,
+        'absent_filters': absent_filters,
+        'rent_dtype': rent_dtype,
+        'object_kinds': object_kinds,
+        'path': spool_path,
+    }
+
+def _parse_shard(json_file_path, start, end, chunksize, spool_dir, shard_id, decoder=None, with_index=False):
+    """
+    Parsear y filtrar las líneas que empiezan en el rango de bytes [start, end).
+
+    Los errores se devuelven con el número de línea relativo al shard; quien
+    combina los resultados los traslada a números de línea del archivo.
+    Con `with_index` también se devuelven, por cada registro con web_id, el
+    hash del web_id, el byte de inicio y la longitud de la línea.
+
+    Returns:
+        tuple: (resúmenes de bloque, líneas leídas, errores, entradas de índice)
+    """
+    listing_decoder = ListingDecoder(decoder)
+    decode = listing_decoder.decode
+    summaries = []
+    errors = []
+    records = []
+    line_count = 0
+    position = start
+    index_entries = (array('Q'), array('Q'), array('I')) if with_index else None
+
+    with open(json_file_path, 'rb') as file:
+        file.seek(start)
+        while position < end:
+            raw_line = file.readline()
+            if not raw_line:
+                break
+            line_start = position
+            position += len(raw_line)
+            line_count += 1
+            line = raw_line.strip()
+            if not line:  # Ignorar líneas vacías
+                continue
+            try:
+                json_obj = decode(line)
+            except listing_decoder.errors as e:
+                errors.append((line_count, str(e), line.decode('utf-8', errors='replace')))
+                continue
+            records.append(json_obj)
+
+            if with_index and isinstance(json_obj, dict) and json_obj.get('web_id') is not None:
+                index_entries[0].append(web_id_key(json_obj['web_id']))
+                index_entries[1].append(line_start)
+                index_entries[2].append(len(raw_line.rstrip(b'\r\n')))
+
+            if len(records) >= chunksize:
+                spool_path = os.path.join(spool_dir, f'shard_{shard_id:05d}_{len(summaries):06d}.pkl')
+                summaries.append(_summarize_chunk(records, spool_path))
+                records = []
+
+    if records:
+        spool_path = os.path.join(spool_dir, f'shard_{shard_id:05d}_{len(summaries):06d}.pkl')
+        summaries.append(_summarize_chunk(records, spool_path))
+
+    return summaries, line_count, errors, index_entries
+
+def _merge_chunk_schemas(summaries):
+    """Reconstruir el orden de columnas y los dtypes que pandas inferiría sobre todo el archivo"""
+    columns = {}        # columna -> dtype combinado, en orden de aparición
+    missing = set()     # columnas ausentes o totalmente nulas en algún bloque
+    rent_dtype = None
+
+    for chunk_number, summary in enumerate(summaries):
+        chunk_columns = dict(summary['columns'])
+        for col in columns:
+            if col not in chunk_columns:
+                missing.add(col)
+        for col, dtype in summary['columns']:
+            if col not in columns:
+                columns[col] = None
+                if chunk_number > 0:
+                    missing.add(col)
+            if dtype is None:
+                missing.add(col)
+            else:
+                columns[col] = _merge_dtype(columns[col], dtype)
+        if summary['rent_dtype'] is not None:
+            rent_dtype = _merge_dtype(rent_dtype, summary['rent_dtype'])
+
+    final_dtypes = {}
+    for col, dtype in columns.items():
+        if dtype is None:
+            dtype = np.dtype('O')
+        if col in missing:
+            dtype = _dtype_with_missing(dtype)
+        final_dtypes[col] = dtype
+
+    # rent_value pasa por pd.to_numeric después del filtro de venta
+    if 'rent_value' in final_dtypes and final_dtypes['rent_value'] == np.dtype('O'):
+        final_dtypes['rent_value'] = rent_dtype if rent_dtype is not None else np.dtype('float64')
+
+    return final_dtypes
+
+def _json_to_csv_streaming(json_file_path, csv_file_path, chunksize, workers=1, decoder=None, index_path=None):
+    """
+    Convertir JSON Lines a CSV por bloques, con memoria acotada por `chunksize`.
+
+    Cada bloque se filtra y se guarda filtrado en un directorio temporal. Al
+    terminar se conoce el esquema global (orden de columnas y dtypes que
+    pandas habría inferido sobre el archivo completo) y los bloques se
+    escriben en orden con ese esquema, de modo que el CSV resultante es
+    idéntico byte a byte al del modo en memoria.
+
+    Con `workers > 1` el archivo se divide en rangos de bytes alineados a
+    línea que se parsean en un pool de procesos; los resultados se combinan
+    en el orden original del archivo.
+
+    Con `index_path` se escribe además el índice web_id -> (offset, longitud)
+    del archivo fuente (ver listing_index).
+    """
+    total_kept = 0
+    with_index = index_path is not None
+
+    with tempfile.TemporaryDirectory(prefix='json2csv_') as spool_dir:
+        if workers > 1:
+            shards = shard_offsets(json_file_path, workers * 4)
+            print(f"Parseando {len(shards)} shards con {workers} procesos...")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(_parse_shard, json_file_path, start, end, chunksize, spool_dir, shard_id,
+                                    decoder, with_index)
+                    for shard_id, (start, end) in enumerate(shards)
+                ]
+                shard_results = [future.result() for future in futures]
+        else:
+            size = os.path.getsize(json_file_path)
+            shard_results = [_parse_shard(json_file_path, 0, size, chunksize, spool_dir, 0, decoder, with_index)]
+
+        summaries = []
+        lines_before = 0
+        for shard_summaries, line_count, errors, _ in shard_results:
+            for line_number, message, line in errors:
+                print(f"Error en línea {lines_before + line_number}: {message}")
+                print(f"Contenido de la línea: {line}")
+            summaries.extend(summary for summary in shard_summaries if summary['n_read'])
+            lines_before += line_count
+
+        total_read = sum(summary['n_read'] for summary in summaries)
+        print(f"{total_read} registros leídos en {len(summaries)} bloques")
+
+        if with_index:
+            keys, offsets, lengths = array('Q'), array('Q'), array('I')
+            for *_, (shard_keys, shard_starts, shard_lengths) in shard_results:
+                keys.extend(shard_keys)
+                offsets.extend(shard_starts)
+                lengths.extend(shard_lengths)
+            n_entries = write_index(index_path, keys, offsets, lengths)
+            print(f"Índice de {n_entries} registros guardado en: {index_path}")
+
+        final_dtypes = _merge_chunk_schemas(summaries)
+        # Si la columna de filtro existe en el archivo pero no en un bloque,
+        # sus filas serían NaN y el filtro las descartaría todas
+        kept_summaries = [summary for summary in summaries
+                          if summary['path'] is not None and not summary['absent_filters'] & set(final_dtypes)]
+
+        def aligned_chunks():
+            for summary in kept_summaries:
+
+                spooled = pd.read_pickle(summary['path'])
+                df = spooled['frame'].reindex(columns=list(final_dtypes))
+                raw = spooled['raw']
+                for col, dtype in final_dtypes.items():
+                    if dtype == np.dtype('O') and col in raw.columns:
+                        df[col] = raw[col]
+                    elif df[col].dtype != dtype:
+                        df[col] = df[col].astype(dtype)
+                yield df
+
+        if is_parquet_path(csv_file_path):
+            print(f"Convirtiendo a Parquet: {csv_file_path}")
+            object_kinds = {}
+            for summary in kept_summaries:
+                for col, kind in summary['object_kinds'].items():
+                    object_kinds.setdefault(col, set()).add(kind)
+            writer = ParquetChunkWriter(csv_file_path, listing_arrow_schema(final_dtypes, object_kinds))
+            for df in aligned_chunks():
+                writer.write(df)
+                total_kept += len(df)
+            writer.close()
+        else:
+            print(f"Convirtiendo a CSV: {csv_file_path}")
+            header = True
+            with open(csv_file_path, 'w', encoding='utf-8', newline='') as out:
+                for df in aligned_chunks():
+                    df.to_csv(out, index=False, header=header)
+                    header = False
+                    total_kept += len(df)
+
+                if header:
+                    pd.DataFrame(columns=list(final_dtypes)).to_csv(out, index=False)
+
+    print(f"Conversión completada exitosamente!")
+    print(f"Total de registros procesados: {total_kept} de {total_read}")
+    print(f"Columnas en el CSV: {list(final_dtypes)}")
+
+    return csv_file_path
+
+def json_to_csv(json_file_path, csv_file_path=None, chunksize=None, workers=None, decoder=None,
+                index_path=None):
     """
     Convierte un archivo JSON Lines a formato CSV usando pandas.
 
     Args:
         json_file_path (str): Ruta al archivo JSON de entrada
         csv_file_path (str, optional): Ruta al archivo CSV de salida.
-                                      Si es None, se usa la misma ubicación con extensión .csv
+                                      Si es None, se usa la misma ubicación con extensión .csv.
+                                      Con extensión .parquet se escribe en Parquet con el
+                                      esquema tipado de listings_io.
+        chunksize (int, optional): Si se indica, procesa el archivo en bloques de
+                                   este número de líneas (modo streaming). El uso de
+                                   memoria depende del bloque y no del tamaño del archivo.
+        workers (int, optional): Número de procesos para parsear el archivo en paralelo
+                                 por rangos de bytes. Implica el modo por bloques.
+        decoder (str, optional): Backend de JSON ('orjson', 'msgspec' o 'json'). Por
+                                 defecto listing_decoder.DEFAULT_BACKEND (json).
+        index_path (str, optional): Si se indica, escribe un índice binario web_id ->
+                                    (offset, longitud) del archivo JSON para consultas
+                                    con listing_index. Implica el modo por bloques.
 
     Returns:
         str: Ruta del archivo CSV generado
@@ -20,17 +341,11 @@ def json_to_csv(json_file_path, csv_file_path=None):
     try:
         print(f"Leyendo archivo JSON: {json_file_path}")
 
-        data = []
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            for line_number, line in enumerate(file, 1):
-                line = line.strip()
-                if line:  # Ignorar líneas vacías
-                    try:
-                        json_obj = json.loads(line)
-                        data.append(json_obj)
-                    except json.JSONDecodeError as e:
-                        print(f"Error en línea {line_number}: {e}")
-                        print(f"Contenido de la línea: {line}")
+        if chunksize or index_path or (workers and workers > 1):
+            return _json_to_csv_streaming(json_file_path, csv_file_path, chunksize or CHUNK_SIZE,
+                                          workers or 1, decoder, index_path)
+
+        data = list(iter_json_records(json_file_path, decoder))
 
         df = pd.DataFrame(data)
 
@@ -48,8 +363,8 @@ def json_to_csv(json_file_path, csv_file_path=None):
             removed_count = initial_count - len(df)
             print(f"Eliminados {removed_count} registros con rent_value NaN o < 1,000,000")
 
-        print(f"Convirtiendo a CSV: {csv_file_path}")
-        df.to_csv(csv_file_path, index=False, encoding='utf-8')
+        print(f"Convirtiendo a {'Parquet' if is_parquet_path(csv_file_path) else 'CSV'}: {csv_file_path}")
+        write_listings(df, csv_file_path)
 
         print(f"Conversión completada exitosamente!")
         print(f"Total de registros procesados: {len(df)}")
@@ -67,9 +382,10 @@ def json_to_csv(json_file_path, csv_file_path=None):
 def main():
     """Función principal para ejecutar la conversión"""
     json_file = "json_habi_data/inmobiliario.json"
-    csv_file = "json_habi_data/inmobiliario.csv"
+    csv_file = dataset_path("inmobiliario")
 
-    result = json_to_csv(json_file, csv_file)
+    result = json_to_csv(json_file, csv_file, chunksize=CHUNK_SIZE, workers=os.cpu_count(),
+                         index_path=index_path_for(json_file))
 
     if result:
         print(f"Archivo CSV generado en: {result}")
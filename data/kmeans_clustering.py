@@ -1,54 +1,186 @@
+import os
+import sys
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
+# plotting elige el backend (Agg sin pantalla) antes de que se importe pyplot
+from plotting import (PLOTS_DIR, draw_cluster_scatter, scatter_summary, stratified_sample,
+                      submit_figure, wait_for_figures)
 import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.decomposition import PCA
 import warnings
+from threadpoolctl import threadpool_limits
+from listings_io import dataset_path, load_listing_frame, write_listings, write_with_column
+from cluster_model import CLUSTER_FEATURES, ClusterModel
+from cluster_quality import QUALITY_SAMPLE_SIZE, cluster_quality
+from chunked_preprocess import scaled_features
+from cluster_profile import (PROFILE_COLUMNS, PROFILE_REPORT_PATH, print_profile, profile_clusters,
+                             save_profile_report, stats_table)
 warnings.filterwarnings('ignore')
 
-def load_and_preprocess_data(csv_path):
-    """Cargar y preprocesar los datos para clustering"""
-    print("Cargando datos...")
-    df = pd.read_csv(csv_path)
-
-    # Seleccionar características numéricas relevantes
-    numeric_features = [
-        'rent_value', 'rooms', 'bathrooms', 'garage', 'area',
-        'built_area', 'sale_value', 'stratum', 'lon', 'lat'
-    ]
-
-    # Filtrar solo las columnas que existen en el dataset
-    available_features = [col for col in numeric_features if col in df.columns]
+# Modo de clustering: 'full' (KMeans), 'minibatch' o 'streaming' (partial_fit por bloques)
+KMEANS_MODE = os.environ.get('MIIA_KMEANS_MODE', 'full')
+KMEANS_MODES = ('full', 'minibatch', 'streaming')
+# Filas por bloque al predecir, calcular inercia o alimentar partial_fit
+FEATURE_CHUNK_SIZE = 100000
+MINIBATCH_SIZE = 4096
+# Filas de la muestra sobre la que se barre k en los modos 'minibatch' y 'streaming'
+SWEEP_SAMPLE_SIZE = int(os.environ.get('MIIA_SWEEP_SAMPLE_SIZE', '200000'))
+# Criterio para elegir k: 'elbow' (codo de la inercia) o, opcionalmente,
+# 'silhouette' (silueta muestreada; también con --silhouette)
+CLUSTER_CRITERION = os.environ.get('MIIA_CLUSTER_CRITERION', 'elbow')
+# Rango de k aceptado para los segmentos
+MIN_CLUSTERS, MAX_CLUSTERS = 6, 10
+# Preprocesar por bloques a una matriz float32 mapeada en memoria en lugar de en memoria
+OUT_OF_CORE = os.environ.get('MIIA_OUT_OF_CORE', '0') == '1'
+
+# Inercia y métricas de calidad por k ya calculadas, indexadas por
+# (hash de la matriz barrida, k, tamaño de la muestra de silueta, modo)
+_ELBOW_CACHE = {}
+# Matriz compartida por los procesos del barrido de k
+_ELBOW_X = None
+
+def preprocess_data(df):
+    """
+    Preprocesar un DataFrame ya cargado para clustering.
+
+    Returns:
+        tuple: (X_scaled, características usadas, scaler, imputer)
+    """
+    # Filtrar solo las características numéricas que existen en el dataset
+    available_features = [col for col in CLUSTER_FEATURES if col in df.columns]
     print(f"Características numéricas disponibles: {available_features}")
 
-    # Crear dataset para clustering
-    X = df[available_features].copy()
-
-    # Manejar valores faltantes
+    # Manejar valores faltantes (el imputer ya devuelve una matriz nueva)
     imputer = SimpleImputer(strategy='median')
-    X_imputed = imputer.fit_transform(X)
-    X = pd.DataFrame(X_imputed, columns=available_features, index=X.index)
+    X_imputed = imputer.fit_transform(df[available_features])
+    # El imputer descarta las columnas sin ningún valor; las características
+    # usadas son las que conserva
+    available_features = list(imputer.get_feature_names_out(available_features))
+
+    # Escalar los datos en sitio sobre la matriz imputada
+    scaler = StandardScaler(copy=False)
+    X_scaled = scaler.fit_transform(X_imputed)
 
-    # Escalar los datos
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    return X_scaled, available_features, scaler, imputer
 
+def load_and_preprocess_data(csv_path):
+    """Cargar y preprocesar los datos para clustering"""
+    print("Cargando datos...")
+    df = load_listing_frame(csv_path)
+    X_scaled, available_features, scaler, _ = preprocess_data(df)
     return df, X_scaled, available_features, scaler
 
-def determine_optimal_clusters(X_scaled, max_clusters=15):
-    """Determinar el número óptimo de clusters usando el método del codo"""
+def features_digest(X_scaled):
+    """Hash del contenido de la matriz de características (forma, dtype y datos)"""
+    X = np.ascontiguousarray(X_scaled)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{X.shape}{X.dtype.str}".encode('utf-8'))
+    digest.update(memoryview(X).cast('B'))
+    return digest.hexdigest()
+
+def _init_elbow_worker(X_scaled, threads):
+    """Inicializar un proceso del barrido: recibe la matriz una sola vez"""
+    global _ELBOW_X
+    _ELBOW_X = X_scaled
+    threadpool_limits(threads)
+
+def _fit_k(k, X_scaled, sample_size, mode='full', inertia_scale=1.0):
+    """Ajustar KMeans (o MiniBatchKMeans) con k clusters y devolver su inercia y métricas de calidad"""
+    if mode == 'full':
+        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3,
+                                 batch_size=MINIBATCH_SIZE, max_iter=100)
+    kmeans.fit(X_scaled)
+    metrics = cluster_quality(X_scaled, kmeans.labels_, kmeans.cluster_centers_, sample_size=sample_size)
+    return k, {'inertia': kmeans.inertia_ * inertia_scale, **metrics}
+
+def _fit_k_worker(k, sample_size, mode, inertia_scale):
+    """Versión de _fit_k para los procesos del pool, sobre su matriz compartida"""
+    return _fit_k(k, _ELBOW_X, sample_size, mode, inertia_scale)
+
+def sweep_sample(X_scaled, max_rows=SWEEP_SAMPLE_SIZE, seed=42):
+    """Muestra aleatoria de como máximo `max_rows` filas, leída en orden (también de un np.memmap)"""
+    if len(X_scaled) <= max_rows:
+        return np.asarray(X_scaled)
+    rows = np.sort(np.random.RandomState(seed).choice(len(X_scaled), max_rows, replace=False))
+    return np.asarray(X_scaled[rows])
+
+def k_sweep(X_scaled, k_range, workers=None, sample_size=QUALITY_SAMPLE_SIZE, mode='full'):
+    """
+    Inercia y métricas de calidad de KMeans para cada k, en paralelo y memoizadas.
+
+    Los k se reparten en un pool de procesos. Los resultados se guardan en
+    memoria bajo el hash de la matriz barrida, así que pedir de nuevo los
+    mismos k (por ejemplo, para el gráfico del codo) no vuelve a ajustar modelos.
+
+    En los modos 'minibatch' y 'streaming' el barrido usa MiniBatchKMeans
+    sobre una muestra de SWEEP_SAMPLE_SIZE filas, de modo que su costo no
+    crece con el dataset; la inercia se escala al número total de filas para
+    que sea comparable con la del modelo final.
+
+    Returns:
+        dict: Para cada k, inercia, silueta muestreada, silueta simplificada,
+              Davies-Bouldin y Calinski-Harabasz
+    """
+    if mode == 'full':
+        X_sweep, inertia_scale = X_scaled, 1.0
+    else:
+        X_sweep = sweep_sample(X_scaled)
+        inertia_scale = len(X_scaled) / max(len(X_sweep), 1)
+    digest = features_digest(X_sweep)
+    sweep_mode = 'full' if mode == 'full' else 'minibatch'
+    pending = [k for k in k_range if (digest, k, sample_size, sweep_mode) not in _ELBOW_CACHE]
+
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        if workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_elbow_worker,
+                                     initargs=(X_sweep, threads)) as executor:
+                results = list(executor.map(_fit_k_worker, pending, [sample_size] * len(pending),
+                                            [sweep_mode] * len(pending), [inertia_scale] * len(pending)))
+        else:
+            results = [_fit_k(k, X_sweep, sample_size, sweep_mode, inertia_scale) for k in pending]
+        for k, result in results:
+            _ELBOW_CACHE[(digest, k, sample_size, sweep_mode)] = result
+
+    return {k: _ELBOW_CACHE[(digest, k, sample_size, sweep_mode)] for k in k_range}
+
+def elbow_inertia(X_scaled, k_range, workers=None, mode='full'):
+    """Inercia de KMeans para cada k de `k_range` (ver k_sweep)"""
+    sweep = k_sweep(X_scaled, k_range, workers=workers, mode=mode)
+    return [sweep[k]['inertia'] for k in k_range]
+
+def determine_optimal_clusters(X_scaled, max_clusters=15, workers=None, criterion=None,
+                               sample_size=QUALITY_SAMPLE_SIZE, mode=None):
+    """
+    Determinar el número óptimo de clusters.
+
+    Con el criterio 'elbow' (por defecto) se elige el codo de la curva de
+    inercia; con 'silhouette', dentro del rango aceptado (MIN_CLUSTERS a
+    MAX_CLUSTERS), el k con mayor silueta muestreada. En los modos 'minibatch' y
+    'streaming' el barrido se hace sobre una muestra (ver k_sweep).
+    """
+    criterion = criterion or CLUSTER_CRITERION
+    mode = mode or KMEANS_MODE
     print("Determinando número óptimo de clusters...")
 
-    inertia = []
     k_range = range(2, max_clusters + 1)
+    sweep = k_sweep(X_scaled, k_range, workers=workers, sample_size=sample_size, mode=mode)
+    inertia = [sweep[k]['inertia'] for k in k_range]
 
+    print(f"{'k':>3} {'inercia':>14} {'silueta':>8} {'sil. simpl.':>11} {'Davies-B.':>10} {'Calinski-H.':>13}")
     for k in k_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X_scaled)
-        inertia.append(kmeans.inertia_)
+        metrics = sweep[k]
+        print(f"{k:>3} {metrics['inertia']:>14,.0f} {metrics['silhouette']:>8.3f} "
+              f"{metrics['simplified_silhouette']:>11.3f} {metrics['davies_bouldin']:>10.3f} "
+              f"{metrics['calinski_harabasz']:>13,.0f}")
 
     # Calcular la diferencia de inercia para encontrar el "codo"
     differences = np.diff(inertia)
@@ -57,145 +189,282 @@ def determine_optimal_clusters(X_scaled, max_clusters=15):
     # Encontrar el punto donde la segunda derivada es máxima (el codo)
     optimal_k = np.argmax(np.abs(second_diff)) + 3  # +3 porque empezamos desde k=2
 
+    candidates = [k for k in k_range if MIN_CLUSTERS <= k <= MAX_CLUSTERS
+                  and not np.isnan(sweep[k]['silhouette'])]
+    if criterion == 'silhouette' and candidates:
+        optimal_k = max(candidates, key=lambda k: sweep[k]['silhouette'])
+
     # Asegurarnos de tener entre 6 y 10 clusters
-    optimal_k = min(max(optimal_k, 6), 10)
+    optimal_k = min(max(optimal_k, MIN_CLUSTERS), MAX_CLUSTERS)
 
-    print(f"Número óptimo de clusters sugerido: {optimal_k}")
+    print(f"Número óptimo de clusters sugerido ({criterion}): {optimal_k}")
     return optimal_k, inertia, k_range
 
-def perform_kmeans_clustering(X_scaled, n_clusters):
-    """Realizar clustering K-means"""
-    print(f"Realizando clustering con {n_clusters} clusters...")
-
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=20, max_iter=300)
-    clusters = kmeans.fit_predict(X_scaled)
+def iter_feature_chunks(X, chunk_size=FEATURE_CHUNK_SIZE):
+    """Iterar una matriz (o memmap) por bloques de filas"""
+    for start in range(0, X.shape[0], chunk_size):
+        yield X[start:start + chunk_size]
+
+def predict_in_chunks(model, X, chunk_size=FEATURE_CHUNK_SIZE):
+    """
+    Asignar clusters y calcular la inercia total por bloques.
+
+    La inercia es la suma de distancias al cuadrado de todas las filas a su
+    centroide, igual que `KMeans.inertia_`, de modo que es comparable entre modos.
+
+    Returns:
+        tuple: (etiquetas, inercia)
+    """
+    labels = np.empty(X.shape[0], dtype=np.int32)
+    inertia = 0.0
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = np.asarray(X[start:start + chunk_size], dtype=model.cluster_centers_.dtype)
+        chunk_labels = model.predict(chunk)
+        labels[start:start + len(chunk)] = chunk_labels
+        inertia += float(((chunk - model.cluster_centers_[chunk_labels]) ** 2).sum())
+    return labels, inertia
+
+def perform_kmeans_clustering(X_scaled, n_clusters, mode=None, chunk_size=FEATURE_CHUNK_SIZE,
+                              batch_size=MINIBATCH_SIZE, n_epochs=3):
+    """
+    Realizar clustering K-means.
+
+    Args:
+        X_scaled: Matriz de características escaladas (también un np.memmap)
+        n_clusters (int): Número de clusters
+        mode (str, optional): 'full' ajusta KMeans sobre toda la matriz;
+                              'minibatch' usa MiniBatchKMeans; 'streaming' recorre
+                              la matriz por bloques con partial_fit durante
+                              `n_epochs` pasadas sin cargarla completa. Por defecto
+                              KMEANS_MODE.
+
+    Returns:
+        tuple: (etiquetas de cluster, modelo ajustado)
+    """
+    mode = mode or KMEANS_MODE
+    if mode not in KMEANS_MODES:
+        raise ValueError(f"Modo de clustering desconocido: {mode}")
+
+    print(f"Realizando clustering con {n_clusters} clusters (modo {mode})...")
+
+    if mode == 'full':
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=20, max_iter=300)
+        clusters = kmeans.fit_predict(X_scaled)
+        return clusters, kmeans
+
+    if mode == 'minibatch':
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3,
+                                 batch_size=batch_size, max_iter=100)
+        kmeans.fit(X_scaled)
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3,
+                                 batch_size=batch_size)
+        for epoch in range(n_epochs):
+            for chunk in iter_feature_chunks(X_scaled, chunk_size):
+                if len(chunk) >= n_clusters:
+                    kmeans.partial_fit(chunk)
+
+    # Inercia sobre todos los datos, comparable con la del modo completo
+    clusters, kmeans.inertia_ = predict_in_chunks(kmeans, X_scaled, chunk_size)
+    print(f"Inercia ({mode}): {kmeans.inertia_:,.2f}")
 
     return clusters, kmeans
 
-def analyze_clusters(df, clusters, original_df):
-    """Analizar y describir los clusters"""
+def analyze_clusters(df, clusters, original_df, report_path=PROFILE_REPORT_PATH):
+    """
+    Analizar y describir los clusters.
+
+    El perfil de todos los clusters se calcula en una pasada de groupby
+    (ver cluster_profile) y se guarda como reporte JSON o Parquet en
+    `report_path` (None para no guardarlo).
+
+    Returns:
+        pd.DataFrame: Copia de `original_df` con la columna 'cluster'
+    """
     print("\n=== ANÁLISIS DE CLUSTERS ===")
 
-    # Añadir clusters al DataFrame original
-    df_with_clusters = original_df.copy()
-    df_with_clusters['cluster'] = clusters
+    # Añadir clusters a una copia del DataFrame original, sin modificar el recibido
+    df_with_clusters = original_df.assign(cluster=pd.to_numeric(clusters, downcast='integer'))
 
-    # Estadísticas por cluster
-    cluster_stats = df_with_clusters.groupby('cluster').agg({
-        'rent_value': ['count', 'mean', 'std', 'min', 'max'],
-        'sale_value': ['mean', 'std', 'min', 'max'],
-        'area': ['mean', 'std'],
-        'rooms': ['mean', 'std'],
-        'bathrooms': ['mean', 'std'],
-        'stratum': ['mean', 'std']
-    }).round(2)
+    report = profile_clusters(df_with_clusters)
 
+    # Estadísticas por cluster
     print("Estadísticas por cluster:")
-    print(cluster_stats)
+    print(stats_table(report))
 
     # Descripción de cada cluster
     print("\n=== DESCRIPCIÓN DE CLUSTERS ===")
-    for cluster_id in range(len(cluster_stats)):
-        cluster_data = df_with_clusters[df_with_clusters['cluster'] == cluster_id]
-
-        print(f"\n--- Cluster {cluster_id} ({len(cluster_data)} propiedades) ---")
-        print(f"Valor de renta promedio: ${cluster_data['rent_value'].mean():,.0f}")
-        print(f"Valor de venta promedio: ${cluster_data['sale_value'].mean():,.0f}")
-        print(f"Área promedio: {cluster_data['area'].mean():.0f} m²")
-        print(f"Habitaciones promedio: {cluster_data['rooms'].mean():.1f}")
-        print(f"Baños promedio: {cluster_data['bathrooms'].mean():.1f}")
-        print(f"Estrato promedio: {cluster_data['stratum'].mean():.1f}")
-
-        # Ciudades más comunes (solo si hay datos)
-        if 'city_name' in cluster_data.columns and not cluster_data['city_name'].isna().all():
-            top_cities = cluster_data['city_name'].value_counts().head(3)
-            if not top_cities.empty:
-                print(f"Ciudades principales: {', '.join(top_cities.index.tolist())}")
-
-        # Tipos de propiedad más comunes (solo si hay datos)
-        if 'property_type' in cluster_data.columns and not cluster_data['property_type'].isna().all():
-            top_properties = cluster_data['property_type'].value_counts().head(3)
-            if not top_properties.empty:
-                print(f"Tipos de propiedad: {', '.join(top_properties.index.tolist())}")
-
-        # Mostrar características únicas si el cluster es pequeño
-        if len(cluster_data) <= 5:
-            print("🔍 Propiedades en este cluster:")
-            for idx, prop in cluster_data.head(3).iterrows():
-                if 'title' in prop and pd.notna(prop['title']):
-                    print(f"   - {prop['title']}")
+    print_profile(report)
+
+    if report_path:
+        print(f"\n📋 Perfil de clusters guardado en: {save_profile_report(report, report_path)}")
 
     return df_with_clusters
 
-def visualize_clusters(X_scaled, clusters, features, n_clusters):
-    """Visualizar los clusters usando PCA"""
-    print("\nGenerando visualizaciones...")
+# Filas usadas para ajustar el PCA de la visualización
+PCA_FIT_ROWS = 100000
 
-    # Reducción de dimensionalidad con PCA
-    pca = PCA(n_components=2)
-    X_pca = pca.fit_transform(X_scaled)
-
-    plt.figure(figsize=(15, 5))
+def _render_cluster_analysis(summary, n_clusters, k_range, inertia):
+    """Figura del scatter PCA de clusters y del método del codo"""
+    fig = plt.figure(figsize=(15, 5))
 
     # Scatter plot de clusters
-    plt.subplot(1, 2, 1)
-    scatter = plt.scatter(X_pca[:, 0], X_pca[:, 1], c=clusters, cmap='viridis', alpha=0.6)
-    plt.colorbar(scatter, label='Cluster')
-    plt.title(f'K-means Clustering ({n_clusters} clusters)')
-    plt.xlabel('Componente Principal 1')
-    plt.ylabel('Componente Principal 2')
+    ax = fig.add_subplot(1, 2, 1)
+    scatter = draw_cluster_scatter(ax, summary)
+    fig.colorbar(scatter, ax=ax, label='Cluster')
+    title = f'K-means Clustering ({n_clusters} clusters)'
+    if summary['density'] is not None:
+        title += f"\nDensidad de {summary['n']:,} propiedades, muestra de {len(summary['x']):,}"
+    ax.set_title(title)
+    ax.set_xlabel('Componente Principal 1')
+    ax.set_ylabel('Componente Principal 2')
 
     # Gráfico de inercia (método del codo)
-    plt.subplot(1, 2, 2)
-    k_range = range(2, 11)
-    inertia = []
-    for k in k_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X_scaled)
-        inertia.append(kmeans.inertia_)
-
-    plt.plot(k_range, inertia, 'bo-')
-    plt.xlabel('Número de clusters')
-    plt.ylabel('Inercia')
-    plt.title('Método del Codo')
-    plt.axvline(x=n_clusters, color='r', linestyle='--', label=f'K óptimo: {n_clusters}')
-    plt.legend()
-
-    plt.tight_layout()
-    plt.savefig('plots/cluster_analysis.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    ax = fig.add_subplot(1, 2, 2)
+    ax.plot(k_range, inertia, 'bo-')
+    ax.set_xlabel('Número de clusters')
+    ax.set_ylabel('Inercia')
+    ax.set_title('Método del Codo')
+    ax.axvline(x=n_clusters, color='r', linestyle='--', label=f'K óptimo: {n_clusters}')
+    ax.legend()
+
+    fig.tight_layout()
+    return fig
+
+def visualize_clusters(X_scaled, clusters, features, n_clusters, k_range=None, inertia=None, mode=None):
+    """
+    Visualizar los clusters usando PCA.
+
+    El gráfico del codo usa `k_range` e `inertia` si se pasan (los del barrido
+    de determine_optimal_clusters); si no, los toma de elbow_inertia, que
+    reutiliza los valores ya calculados para la misma matriz.
+
+    Con muchas propiedades el PCA se ajusta sobre una muestra y el scatter se
+    dibuja como densidad más una muestra estratificada por cluster. En modo
+    sin pantalla la figura se renderiza en otro proceso (ver plotting).
+    """
+    print("\nGenerando visualizaciones...")
 
-def save_clustered_data(df_with_clusters, output_path):
-    """Guardar datos con clusters"""
+    # Reducción de dimensionalidad con PCA, ajustada sobre una muestra y aplicada por bloques
+    pca = PCA(n_components=2)
+    fit_rows = stratified_sample(clusters, PCA_FIT_ROWS)
+    pca.fit(np.asarray(X_scaled[fit_rows]))
+    X_pca = np.empty((len(X_scaled), 2), dtype=np.float32)
+    for start in range(0, len(X_scaled), FEATURE_CHUNK_SIZE):
+        X_pca[start:start + FEATURE_CHUNK_SIZE] = pca.transform(np.asarray(X_scaled[start:start + FEATURE_CHUNK_SIZE]))
+
+    if k_range is None or inertia is None:
+        k_range = range(2, 11)
+        inertia = elbow_inertia(X_scaled, k_range, mode=mode or KMEANS_MODE)
+
+    summary = scatter_summary(X_pca[:, 0], X_pca[:, 1], clusters)
+    return submit_figure(_render_cluster_analysis, os.path.join(PLOTS_DIR, 'cluster_analysis.png'),
+                         summary, n_clusters, list(k_range), list(inertia))
+
+def save_clustered_data(df_with_clusters, output_path, source_path=None):
+    """
+    Guardar datos con clusters.
+
+    Con `source_path` (modo fuera de memoria) `df_with_clusters` solo tiene
+    algunas columnas: se copia ese archivo por bloques añadiendo 'cluster'.
+    """
     print(f"\nGuardando datos con clusters en: {output_path}")
-    df_with_clusters.to_csv(output_path, index=False, encoding='utf-8')
+    if source_path is None:
+        write_listings(df_with_clusters, output_path)
+    else:
+        write_with_column(source_path, output_path, 'cluster', df_with_clusters['cluster'].to_numpy())
     print("Datos guardados exitosamente!")
 
+def cluster_listings(df, max_clusters=10, visualize=True, mode=None, workers=None, save_model=False,
+                     source_path=None, criterion=None):
+    """
+    Ejecutar el clustering completo sobre un DataFrame en memoria.
+
+    Con `save_model` se guarda una nueva versión del modelo (imputer, scaler y
+    centroides) para asignar clusters a propiedades nuevas sin reentrenar.
+
+    Con `source_path` la matriz escalada no se calcula sobre `df` sino por
+    bloques desde ese archivo (ver chunked_preprocess), o se mapea del .npy
+    si ya existe y está al día; `df` debe tener las mismas filas de ese
+    archivo, pero basta con cargar las columnas del perfil (PROFILE_COLUMNS).
+
+    Returns:
+        tuple: (DataFrame con la columna 'cluster', número de clusters)
+    """
+    if source_path is None:
+        X_scaled, features, scaler, imputer = preprocess_data(df)
+        # Medianas de las características conservadas (el imputer omite las columnas vacías)
+        medians = pd.Series(imputer.statistics_, index=imputer.feature_names_in_)[features].to_numpy()
+        mean, scale = scaler.mean_, scaler.scale_
+    else:
+        X_scaled, params = scaled_features(source_path)
+        if len(X_scaled) != len(df):
+            raise ValueError(f"La matriz escalada tiene {len(X_scaled)} filas y el DataFrame {len(df)}")
+        features, medians, mean, scale = (params['features'], params['medians'], params['mean'], params['scale'])
+
+    # Determinar número óptimo de clusters (mínimo 6, máximo 10)
+    optimal_k, inertia, k_range = determine_optimal_clusters(
+        X_scaled, max_clusters=max_clusters, workers=workers, criterion=criterion, mode=mode)
+    optimal_k = min(max(optimal_k, MIN_CLUSTERS), MAX_CLUSTERS)  # Asegurar entre 6 y 10 clusters
+
+    # Realizar clustering
+    clusters, kmeans = perform_kmeans_clustering(X_scaled, optimal_k, mode=mode)
+
+    if save_model:
+        model = ClusterModel.from_params(features, medians, mean, scale, kmeans, X_scaled, clusters,
+                                         mode=mode or KMEANS_MODE)
+        print(f"📦 Modelo {model.version} guardado en: {model.save()}")
+
+    # Analizar clusters
+    df_with_clusters = analyze_clusters(df, clusters, df)
+
+    # Visualizar resultados
+    if visualize:
+        visualize_clusters(X_scaled, clusters, features, optimal_k, k_range, inertia, mode=mode)
+
+    return df_with_clusters, optimal_k
+
+def clustering_input_path(args=None):
+    """
+    Dataset sobre el que se entrena el clustering.
+
+    Se usan los datos sin duplicados si dedup_listings.py se ejecutó después
+    de la última actualización del dataset, siempre con --dedup y nunca con
+    --no-dedup (flags tomados de `args`, por defecto sys.argv).
+    """
+    args = sys.argv[1:] if args is None else args
+    input_csv = dataset_path("inmobiliario")
+    dedup_csv = dataset_path("inmobiliario_dedup")
+    if os.path.exists(dedup_csv) and '--no-dedup' not in args:
+        is_current = (not os.path.exists(input_csv)
+                      or os.path.getmtime(dedup_csv) >= os.path.getmtime(input_csv))
+        if is_current or '--dedup' in args:
+            print(f"Usando datos sin duplicados: {dedup_csv}")
+            return dedup_csv
+        print(f"⚠️ {dedup_csv} es anterior a {input_csv}; se ignora "
+              f"(ejecute dedup_listings.py o use --dedup)")
+    return input_csv
+
 def main():
-    """Función principal"""
+    """Función principal: python kmeans_clustering.py [--dedup | --no-dedup] [--silhouette]"""
     # Configuración
-    input_csv = "json_habi_data/inmobiliario.csv"
-    output_csv = "json_habi_data/inmobiliario_clustered.csv"
+    input_csv = clustering_input_path()
+    output_csv = dataset_path("inmobiliario_clustered")
 
     try:
-        # Cargar y preprocesar datos
-        original_df, X_scaled, features, scaler = load_and_preprocess_data(input_csv)
-
-        # Determinar número óptimo de clusters (mínimo 6, máximo 10)
-        optimal_k, inertia, k_range = determine_optimal_clusters(X_scaled, max_clusters=10)
-        optimal_k = min(max(optimal_k, 6), 10)  # Asegurar entre 6 y 10 clusters
-
-        # Realizar clustering
-        clusters, kmeans = perform_kmeans_clustering(X_scaled, optimal_k)
-
-        # Analizar clusters
-        df_with_clusters = analyze_clusters(original_df, clusters, original_df)
+        # Cargar datos (fuera de memoria, solo las columnas del perfil de clusters)
+        print("Cargando datos...")
+        original_df = load_listing_frame(input_csv, columns=PROFILE_COLUMNS if OUT_OF_CORE else None)
 
-        # Visualizar resultados
-        visualize_clusters(X_scaled, clusters, features, optimal_k)
+        # Preprocesar, agrupar, analizar y visualizar
+        criterion = 'silhouette' if '--silhouette' in sys.argv else None
+        df_with_clusters, optimal_k = cluster_listings(original_df, max_clusters=10, save_model=True,
+                                                       source_path=input_csv if OUT_OF_CORE else None,
+                                                       criterion=criterion)
 
         # Guardar resultados
-        save_clustered_data(df_with_clusters, output_csv)
+        save_clustered_data(df_with_clusters, output_csv, source_path=input_csv if OUT_OF_CORE else None)
+        wait_for_figures()
 
         print(f"\n✅ Análisis de clustering completado con {optimal_k} clusters!")
         print(f"📊 Archivo con clusters guardado en: {output_csv}")
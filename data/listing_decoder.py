@@ -0,0 +1,83 @@
+import os
+import re
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Orden en que se listan los backends (benchmark_decoders)
+BACKEND_PREFERENCE = ['orjson', 'msgspec', 'json']
+# Backend por defecto: el json de la biblioteca estándar, que define la salida
+# de referencia. orjson y msgspec son más rápidos pero opcionales
+# (MIIA_JSON_BACKEND=orjson o msgspec).
+DEFAULT_BACKEND = os.environ.get('MIIA_JSON_BACKEND', 'json')
+
+# orjson convierte a float los enteros de más de 64 bits; las líneas con 19 o
+# más dígitos seguidos se decodifican con json para conservarlos exactos
+_WIDE_NUMBER_BYTES = re.compile(rb'\d{19}')
+_WIDE_NUMBER_TEXT = re.compile(r'\d{19}')
+
+class ListingDecoder:
+    """Decodificador de líneas JSON con un backend intercambiable"""
+
+    # Todos los backends señalan líneas inválidas con subclases de ValueError
+    errors = (ValueError,)
+
+    def __init__(self, backend=None):
+        """
+        Inicializar el decodificador.
+
+        Args:
+            backend (str, optional): 'orjson', 'msgspec' o 'json'. Si es None se
+                                     usa DEFAULT_BACKEND.
+
+        Los backends rápidos devuelven los mismos diccionarios que json.loads:
+        msgspec decodifica sin esquema (conserva los campos desconocidos) y las
+        líneas que orjson o msgspec rechazan pero json acepta (NaN, Infinity,
+        surrogates sueltos, números fuera de rango) se decodifican con json.
+        """
+        backend = backend or DEFAULT_BACKEND
+        if not is_backend_available(backend):
+            raise ImportError(f"El backend de JSON '{backend}' no está instalado")
+
+        self.backend = backend
+        if backend == 'orjson':
+            self._fast_decode = orjson.loads
+            self._check_wide_numbers = True
+            self.decode = self._decode_with_fallback
+        elif backend == 'msgspec':
+            self._fast_decode = msgspec.json.Decoder().decode
+            self._check_wide_numbers = False
+            self.decode = self._decode_with_fallback
+        else:
+            self.decode = json.loads
+
+    def _decode_with_fallback(self, line):
+        """Decodificar con el backend rápido y usar json donde este difiere"""
+        if self._check_wide_numbers:
+            pattern = _WIDE_NUMBER_BYTES if isinstance(line, bytes) else _WIDE_NUMBER_TEXT
+            if pattern.search(line):
+                return json.loads(line)
+        try:
+            return self._fast_decode(line)
+        except ValueError:
+            return json.loads(line)
+
+def is_backend_available(backend):
+    """Indica si un backend de JSON está instalado"""
+    if backend == 'orjson':
+        return orjson is not None
+    if backend == 'msgspec':
+        return msgspec is not None
+    return backend == 'json'
+
+def available_backends():
+    """Backends instalados, en orden de preferencia"""
+    return [name for name in BACKEND_PREFERENCE if is_backend_available(name)]
@@ -0,0 +1,127 @@
+import os
+import sys
+import mmap
+import json
+import hashlib
+import numpy as np
+
+# Formato del índice: cabecera (magic + número de entradas) seguida de
+# entradas de tamaño fijo ordenadas por el hash de 64 bits del web_id
+INDEX_MAGIC = b'MIIAIDX\x01'
+INDEX_HEADER_SIZE = 16
+INDEX_DTYPE = np.dtype([('key', '<u8'), ('offset', '<u8'), ('length', '<u4')])
+
+def web_id_key(web_id):
+    """Hash de 64 bits de un web_id, usado como clave del índice"""
+    digest = hashlib.blake2b(str(web_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def index_path_for(json_file_path):
+    """Ruta por defecto del índice de un archivo JSON Lines"""
+    return json_file_path + '.idx'
+
+def write_index(index_path, keys, offsets, lengths):
+    """
+    Guardar el índice ordenado por clave.
+
+    Args:
+        index_path (str): Ruta del archivo de índice
+        keys, offsets, lengths: Secuencias alineadas con el hash del web_id, el
+                                byte de inicio y la longitud de cada registro
+
+    Returns:
+        int: Número de entradas escritas
+    """
+    entries = np.empty(len(keys), dtype=INDEX_DTYPE)
+    entries['key'] = np.asarray(keys, dtype='<u8')
+    entries['offset'] = np.asarray(offsets, dtype='<u8')
+    entries['length'] = np.asarray(lengths, dtype='<u4')
+    entries.sort(order=['key', 'offset'], kind='stable')
+
+    with open(index_path, 'wb') as file:
+        file.write(INDEX_MAGIC)
+        file.write(np.uint64(len(entries)).tobytes())
+        entries.tofile(file)
+    return len(entries)
+
+class ListingIndex:
+    """Acceso aleatorio a los registros crudos de un archivo JSON Lines por web_id"""
+
+    def __init__(self, json_file_path, index_path=None):
+        """Abrir el índice y mapear en memoria el archivo fuente"""
+        self.json_file_path = json_file_path
+        self.index_path = index_path or index_path_for(json_file_path)
+
+        with open(self.index_path, 'rb') as file:
+            header = file.read(INDEX_HEADER_SIZE)
+        if len(header) < INDEX_HEADER_SIZE or header[:8] != INDEX_MAGIC:
+            raise ValueError(f"{self.index_path} no es un índice de propiedades válido")
+
+        count = int(np.frombuffer(header, dtype='<u8', offset=8)[0])
+        if count:
+            self.entries = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r',
+                                     offset=INDEX_HEADER_SIZE, shape=(count,))
+        else:
+            self.entries = np.empty(0, dtype=INDEX_DTYPE)
+
+        self._file = open(json_file_path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(json_file_path) else b''
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, web_id):
+        """
+        Devolver los registros crudos (bytes) de un web_id mediante búsqueda binaria.
+
+        Returns:
+            list: Registros en orden de aparición en el archivo; vacía si no existe
+        """
+        key = np.uint64(web_id_key(web_id))
+        keys = self.entries['key']
+        start = int(np.searchsorted(keys, key, side='left'))
+        end = int(np.searchsorted(keys, key, side='right'))
+
+        records = []
+        for entry in self.entries[start:end]:
+            offset = int(entry['offset'])
+            raw = self._data[offset:offset + int(entry['length'])]
+            # Descartar colisiones del hash comparando el web_id real
+            if str(json.loads(raw).get('web_id')) == str(web_id):
+                records.append(raw)
+        return records
+
+    def close(self):
+        """Liberar el mapeo de memoria y el archivo"""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    """Consultar registros crudos: python listing_index.py WEB_ID [archivo.json] [archivo.idx]"""
+    if len(sys.argv) < 2:
+        print("Uso: python listing_index.py WEB_ID [archivo.json] [archivo.idx]")
+        sys.exit(1)
+
+    web_id = sys.argv[1]
+    json_file = sys.argv[2] if len(sys.argv) > 2 else "json_habi_data/inmobiliario.json"
+    index_file = sys.argv[3] if len(sys.argv) > 3 else None
+
+    with ListingIndex(json_file, index_file) as index:
+        records = index.lookup(web_id)
+
+    if not records:
+        print(f"❌ No se encontró el web_id {web_id}")
+        sys.exit(1)
+
+    for raw in records:
+        print(raw.decode('utf-8'))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import os
+import hashlib
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+# Formato de los datasets intermedios del pipeline ('csv' o 'parquet')
+DATA_FORMAT = os.environ.get('MIIA_DATA_FORMAT', 'csv').lower()
+DATA_DIR = "json_habi_data"
+
+# Esquema explícito para la salida columnar
+NUMERIC_COLUMNS = [
+    'rent_value', 'rooms', 'bathrooms', 'garage', 'area', 'built_area',
+    'sale_value', 'stratum', 'management_value', 'private_area', 'floor_num',
+    'lon', 'lat'
+]
+CATEGORICAL_COLUMNS = ['city_name', 'property_type', 'neighborhood']
+
+# Conteos pequeños: int8 si no hay faltantes, float32 en otro caso
+SMALL_COUNT_COLUMNS = ['rooms', 'bathrooms', 'garage', 'stratum', 'floor_num', 'cluster']
+# Medidas y coordenadas donde la precisión de float32 es suficiente
+APPROXIMATE_FLOAT_COLUMNS = ['area', 'built_area', 'private_area', 'lon', 'lat']
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+def dataset_path(name, data_format=None):
+    """Ruta de un dataset intermedio según el formato configurado"""
+    data_format = (data_format or DATA_FORMAT).lower()
+    extension = 'parquet' if data_format == 'parquet' else 'csv'
+    return os.path.join(DATA_DIR, f"{name}.{extension}")
+
+def is_parquet_path(path):
+    """Indica si la ruta corresponde a un archivo Parquet"""
+    return os.path.splitext(str(path))[1].lower() in PARQUET_EXTENSIONS
+
+def _require_pyarrow():
+    """Importar pyarrow o fallar con un mensaje claro"""
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("El formato Parquet requiere pyarrow: pip install pyarrow")
+    return pyarrow
+
+def apply_listing_schema(df):
+    """Aplicar el esquema tipado: numéricos float32 y texto repetido como categórico"""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+def compact_listing_frame(df, category_ratio=0.5):
+    """
+    Reducir la memoria de un DataFrame de propiedades, modificándolo en sitio.
+
+    - Conteos (habitaciones, baños, garajes, estrato, cluster) a enteros
+      pequeños cuando no hay faltantes y a float32 cuando los hay.
+    - Medidas y coordenadas a float32.
+    - Otros flotantes (valores en pesos) a float32 solo si la conversión
+      no pierde precisión.
+    - Texto con pocos valores distintos a categórico.
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame con los dtypes compactados
+    """
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            has_missing = series.isna().any()
+            if not has_missing and (pd.api.types.is_integer_dtype(series.dtype)
+                                    or (col in SMALL_COUNT_COLUMNS and (series % 1 == 0).all())):
+                df[col] = pd.to_numeric(series, downcast='integer')
+            elif pd.api.types.is_float_dtype(series.dtype) and series.dtype != np.float32:
+                values = series.to_numpy()
+                compact = values.astype(np.float32)
+                lossless = np.array_equal(compact.astype(values.dtype), values, equal_nan=True)
+                if col in SMALL_COUNT_COLUMNS or col in APPROXIMATE_FLOAT_COLUMNS or lossless:
+                    df[col] = compact
+        elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+            if series.nunique(dropna=True) <= category_ratio * len(series):
+                df[col] = series.astype('category')
+    return df
+
+def print_memory_report(df, before=None):
+    """
+    Imprimir el uso de memoria por columna.
+
+    Args:
+        df (pd.DataFrame): DataFrame a reportar
+        before (pd.Series, optional): Memoria por columna antes de compactar,
+                                      como la devuelve df.memory_usage(deep=True)
+    """
+    usage = df.memory_usage(deep=True, index=False)
+    print("💾 Memoria por columna:")
+    for col, nbytes in usage.items():
+        line = f"   {col:<18} {str(df[col].dtype):<10} {nbytes / 1e6:>9.2f} MB"
+        if before is not None and col in before:
+            line += f"  (antes {before[col] / 1e6:.2f} MB)"
+        print(line)
+
+    total = f"   {'TOTAL':<29} {usage.sum() / 1e6:>9.2f} MB"
+    if before is not None:
+        total += f"  (antes {before.sum() / 1e6:.2f} MB)"
+    print(total)
+
+def load_listing_frame(path, columns=None, report=True):
+    """Cargar un dataset de propiedades con dtypes compactos y reportar su memoria"""
+    df = read_listings(path, columns=columns)
+    before = df.memory_usage(deep=True, index=False) if report else None
+    compact_listing_frame(df)
+    if report:
+        print_memory_report(df, before)
+    return df
+
+def read_listings(path, columns=None):
+    """
+    Cargar un dataset de propiedades desde CSV o Parquet.
+
+    Args:
+        path (str): Ruta del archivo (.csv o .parquet)
+        columns (list, optional): Columnas a cargar. Las que no existan en el
+                                  archivo se ignoran. En Parquet solo se leen
+                                  del disco las columnas pedidas.
+
+    Returns:
+        pd.DataFrame: Datos cargados
+    """
+    if is_parquet_path(path):
+        pa = _require_pyarrow()
+        if columns is not None:
+            available = set(pa.parquet.read_schema(path).names)
+            columns = [col for col in columns if col in available]
+        return pd.read_parquet(path, columns=columns)
+
+    if columns is not None:
+        wanted = set(columns)
+        return pd.read_csv(path, usecols=lambda col: col in wanted)
+    return pd.read_csv(path)
+
+def iter_listing_chunks(path, columns=None, chunksize=100000):
+    """
+    Leer un dataset de propiedades por bloques de filas, sin cargarlo completo.
+
+    Args:
+        path (str): Ruta del archivo (.csv o .parquet)
+        columns (list, optional): Columnas a leer; las que no existan se ignoran
+        chunksize (int): Filas por bloque
+
+    Yields:
+        pd.DataFrame: Bloques consecutivos del dataset
+    """
+    if is_parquet_path(path):
+        pa = _require_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path)
+        if columns is not None:
+            available = set(parquet_file.schema_arrow.names)
+            columns = [col for col in columns if col in available]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda col: col in wanted
+    yield from pd.read_csv(path, usecols=usecols, chunksize=chunksize)
+
+def file_digest(path, block_size=1 << 20, missing_ok=False):
+    """Hash del contenido de un archivo, leído por bloques (None si no existe y `missing_ok`)"""
+    if missing_ok and (not path or not os.path.exists(path)):
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _umask():
+    """Máscara de permisos del proceso (mkstemp crea los archivos con 0600)"""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+@contextmanager
+def atomic_write(path):
+    """
+    Ruta temporal junto a `path` que lo reemplaza al salir del bloque sin errores.
+
+    El temporal tiene un nombre único y oculto (.xxxx.ext) con la misma
+    extensión, así que sirve para escritores que deciden el formato por la
+    extensión, no coincide con los patrones glob de los artefactos y dos
+    escritores del mismo archivo no se pisan. Si el bloque falla se elimina
+    y `path` queda intacto.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, 0o666 & ~_umask())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_listings(df, path):
+    """Guardar un dataset de propiedades en CSV o Parquet según la extensión"""
+    if is_parquet_path(path):
+        _require_pyarrow()
+        df = apply_listing_schema(df.copy())
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8')
+    return path
+
+# Tipo Arrow de una columna object según pd.api.types.infer_dtype de sus valores
+_OBJECT_KIND_TYPES = {
+    'string': 'string',
+    'boolean': 'bool',
+    'integer': 'int64',
+    'floating': 'float64',
+    'mixed-integer-float': 'float64',
+}
+
+def _arrow_type(dtype):
+    """Tipo Arrow que pyarrow asigna a una columna de pandas con este dtype"""
+    pa = _require_pyarrow()
+    frame = pd.DataFrame({'column': pd.Series([], dtype=dtype)})
+    return pa.Schema.from_pandas(frame, preserve_index=False).field('column').type
+
+def _object_arrow_type(kinds):
+    """Tipo Arrow de una columna object según los infer_dtype de sus bloques"""
+    pa = _require_pyarrow()
+    kinds = {kind for kind in kinds if kind != 'empty'}
+    if len(kinds) > 1 and kinds <= {'integer', 'floating', 'mixed-integer-float'}:
+        kinds = {'floating'}
+    if not kinds:
+        return pa.null()
+    if len(kinds) == 1:
+        return pa.type_for_alias(_OBJECT_KIND_TYPES.get(kinds.pop(), 'string'))
+    return pa.string()
+
+def listing_arrow_schema(dtypes, object_kinds=None):
+    """
+    Esquema Arrow de un dataset a partir de los dtypes de sus columnas.
+
+    Es el que pyarrow infiere al aplicar apply_listing_schema, sin recorrer
+    los datos: los numéricos del esquema son float32, los categóricos
+    diccionarios y las columnas object toman el tipo de `object_kinds`
+    (columna -> conjunto de resultados de infer_dtype de sus bloques): nulo
+    si no tienen valores y texto si los tipos se mezclan.
+    """
+    pa = _require_pyarrow()
+    object_kinds = object_kinds or {}
+    fields = []
+    for col, dtype in dtypes.items():
+        if col in NUMERIC_COLUMNS:
+            arrow_type = pa.float32()
+        elif dtype == np.dtype('O'):
+            arrow_type = _object_arrow_type(object_kinds.get(col, ()))
+        else:
+            arrow_type = _arrow_type(dtype)
+        if col in CATEGORICAL_COLUMNS:
+            value_type = pa.string() if pa.types.is_null(arrow_type) else arrow_type
+            arrow_type = pa.dictionary(pa.int32(), value_type)
+        fields.append(pa.field(col, arrow_type))
+    return pa.schema(fields)
+
+class ParquetChunkWriter:
+    """Escritor Parquet por bloques con un esquema común a todos ellos"""
+
+    def __init__(self, path, schema):
+        """
+        Inicializar el escritor.
+
+        `schema` es el esquema Arrow de todos los bloques (ver
+        listing_arrow_schema); cada bloque se convierte a él al escribirlo.
+        """
+        self.path = path
+        self.schema = schema
+        self._writer = None
+
+    def write(self, df):
+        """Añadir un bloque al archivo"""
+        pa = _require_pyarrow()
+        table = pa.Table.from_pandas(apply_listing_schema(df), preserve_index=False)
+        table = table.cast(self.schema)
+        if self._writer is None:
+            self._writer = pa.parquet.ParquetWriter(self.path, self.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        """Cerrar el archivo"""
+        if self._writer is not None:
+            self._writer.close()
+        elif self.schema is not None:
+            pa = _require_pyarrow()
+            pa.parquet.write_table(self.schema.empty_table(), self.path)
+
+def write_with_column(source_path, output_path, name, values, chunksize=100000):
+    """
+    Copiar un dataset añadiendo una columna, leyéndolo por bloques sin cargarlo completo.
+
+    En CSV los valores se copian como texto, tal cual están en el archivo; en
+    Parquet se conserva el esquema del original. Los dos archivos deben usar
+    el mismo formato.
+
+    Args:
+        source_path (str): Dataset original (.csv o .parquet)
+        output_path (str): Dataset de salida
+        name (str): Nombre de la nueva columna
+        values (np.ndarray): Un valor por fila del original, en orden
+        chunksize (int): Filas por bloque
+
+    Returns:
+        str: Ruta del dataset escrito
+    """
+    if is_parquet_path(source_path) != is_parquet_path(output_path):
+        raise ValueError(f"{source_path} y {output_path} deben tener el mismo formato")
+    values = np.asarray(values)
+
+    with atomic_write(output_path) as tmp_path:
+        if is_parquet_path(source_path):
+            pa = _require_pyarrow()
+            schema = pa.parquet.read_schema(source_path).remove_metadata()
+            schema = schema.append(pa.field(name, pa.from_numpy_dtype(values.dtype)))
+            chunks = iter_listing_chunks(source_path, chunksize=chunksize)
+            writer = ParquetChunkWriter(tmp_path, schema)
+        else:
+            chunks = pd.read_csv(source_path, dtype=str, keep_default_na=False, chunksize=chunksize)
+            writer = None
+
+        start = 0
+        for chunk in chunks:
+            chunk[name] = values[start:start + len(chunk)]
+            if writer is not None:
+                writer.write(chunk)
+            else:
+                chunk.to_csv(tmp_path, mode='a' if start else 'w', header=not start,
+                             index=False, encoding='utf-8')
+            start += len(chunk)
+        if start != len(values):
+            raise ValueError(f"{source_path} tiene {start} filas y se recibieron {len(values)} valores")
+        if writer is not None:
+            writer.close()
+        elif start == 0:
+            pd.read_csv(source_path, nrows=0).assign(**{name: []}).to_csv(tmp_path, index=False)
+    return output_path
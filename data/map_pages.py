@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import html
+import hashlib
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import colombia_geo
+import generate_colombia_map
+from listings_io import atomic_write, file_digest
+from generate_colombia_map import (MAP_EXTERNAL_DATA, MAP_OFFLINE, get_colombia_geojson,
+                                   load_and_process_data, plotlyjs_src, points_path_for, write_map)
+
+MAP_PAGES_DIR = os.environ.get('MIIA_MAP_PAGES_DIR', 'maps')
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT_VERSION = 1
+# Ciudades con al menos estas propiedades tienen su propia página
+MIN_CITY_LISTINGS = int(os.environ.get('MIIA_MIN_CITY_LISTINGS', '200'))
+MAX_CITY_PAGES = 40
+CITY_ZOOM = 11
+MAP_WORKERS = int(os.environ.get('MIIA_MAP_WORKERS', '0')) or os.cpu_count() or 1
+
+# DataFrame y GeoJSON de cada proceso del pool (se reciben una sola vez)
+_PAGES_DF = None
+_PAGES_GEOJSON = None
+
+def _slug(text):
+    """Nombre de archivo a partir de un texto ('Santa Marta' -> 'santa-marta')"""
+    normalized = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return '-'.join(''.join(c if c.isalnum() else ' ' for c in normalized.lower()).split()) or 'sin-nombre'
+
+def _unique_file(prefix, name, used):
+    """
+    Nombre de archivo único para una página.
+
+    Nombres distintos pueden dar el mismo slug ('Bogotá' y 'Bogota'); en ese
+    caso se añade un hash corto del nombre original.
+    """
+    file_name = f"{prefix}-{_slug(name)}.html"
+    if file_name in used:
+        suffix = hashlib.blake2b(str(name).encode('utf-8'), digest_size=3).hexdigest()
+        file_name = f"{prefix}-{_slug(name)}-{suffix}.html"
+    used.add(file_name)
+    return file_name
+
+def plan_pages(df, min_city_listings=MIN_CITY_LISTINGS, max_city_pages=MAX_CITY_PAGES):
+    """
+    Páginas a generar: la nacional, una por ciudad principal y una por segmento.
+
+    Returns:
+        list: Diccionarios con 'file', 'kind' ('national', 'city', 'segment'),
+              'value' (ciudad o cluster) y 'view' (título, centro y zoom)
+    """
+    pages = [{'file': 'colombia.html', 'kind': 'national', 'value': None,
+              'view': {'page_title': 'Colombia'}}]
+
+    city_counts = df['city_name'].value_counts()
+    cities = city_counts[city_counts >= min_city_listings].head(max_city_pages)
+    centers = df[df['city_name'].isin(cities.index)].groupby('city_name', observed=True)[['lat', 'lon']].median()
+    used = {page['file'] for page in pages}
+    for city in cities.index:
+        pages.append({
+            'file': _unique_file('ciudad', city, used), 'kind': 'city', 'value': str(city),
+            'view': {
+                'page_title': str(city),
+                'title': f'Mapa de Propiedades Inmobiliarias en {city}',
+                'center': {'lat': float(centers.loc[city, 'lat']), 'lon': float(centers.loc[city, 'lon'])},
+                'zoom': CITY_ZOOM,
+            },
+        })
+
+    segments = df.groupby('cluster', sort=True)['segment_label'].first()
+    for cluster, label in segments.items():
+        pages.append({
+            'file': f"segmento-{int(cluster)}.html", 'kind': 'segment', 'value': int(cluster),
+            'view': {
+                'page_title': f'Segmento {int(cluster)}',
+                'title': f'Segmento {int(cluster)}: {label}',
+            },
+        })
+    return pages
+
+def page_slice(df, page):
+    """Propiedades de una página"""
+    if page['kind'] == 'city':
+        return df[df['city_name'] == page['value']]
+    if page['kind'] == 'segment':
+        return df[df['cluster'] == page['value']]
+    return df
+
+def render_settings(external_data=MAP_EXTERNAL_DATA, offline=MAP_OFFLINE):
+    """
+    Todo lo que, además de los datos, cambia el resultado de una página: el modo
+    de salida, el código del mapa y el GeoJSON de regiones.
+    """
+    return {
+        'external_data': external_data,
+        'offline': offline,
+        'code': [file_digest(module.__file__) for module in (generate_colombia_map, colombia_geo)],
+        'regions': file_digest(colombia_geo.DEPARTMENTS_GEOJSON_PATH, missing_ok=True),
+    }
+
+def slice_hash(df, page, settings):
+    """Hash del contenido de una página: sus filas, su vista y la configuración de render"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({'page': page, 'settings': settings}, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(df, index=False).to_numpy()).tobytes())
+    return digest.hexdigest()
+
+def load_manifest(output_dir):
+    """Hashes de la última generación de cada página"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    if manifest.get('format_version') != MANIFEST_FORMAT_VERSION:
+        return {}
+    return manifest.get('pages', {})
+
+def save_manifest(output_dir, pages):
+    """Guardar los hashes de las páginas de forma atómica"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with atomic_write(path) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({'format_version': MANIFEST_FORMAT_VERSION, 'pages': pages}, file, indent=2, sort_keys=True)
+    return path
+
+def _init_page_worker(df, geojson):
+    """Inicializar un proceso del pool: recibe los datos y el GeoJSON una sola vez"""
+    global _PAGES_DF, _PAGES_GEOJSON
+    _PAGES_DF = df
+    _PAGES_GEOJSON = geojson
+
+def _render_page(page, output_dir, external_data, offline, df=None, geojson=None):
+    """Generar una página y devolver (archivo, propiedades, segundos)"""
+    df = _PAGES_DF if df is None else df
+    geojson = _PAGES_GEOJSON if geojson is None else geojson
+    start = time.perf_counter()
+    page_df = page_slice(df, page)
+    write_map(page_df, os.path.join(output_dir, page['file']), external_data=external_data,
+              offline=offline, assets_dir=output_dir, geojson=geojson, view=page['view'])
+    return page['file'], len(page_df), time.perf_counter() - start
+
+def remove_stale_pages(previous, pages, output_dir):
+    """
+    Eliminar las páginas de la última generación que ya no están en el plan
+    (y su payload de puntos), para que el índice y la carpeta coincidan.
+
+    Returns:
+        list: Archivos de página eliminados
+    """
+    planned = {page['file'] for page in pages}
+    removed = []
+    for file_name in sorted(set(previous) - planned):
+        page_path = os.path.join(output_dir, file_name)
+        for path in (page_path, points_path_for(page_path)):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(file_name)
+    return removed
+
+def write_index(pages, output_dir):
+    """Página índice con enlaces a todos los mapas"""
+    sections = {'national': 'Nacional', 'city': 'Ciudades', 'segment': 'Segmentos'}
+    items = []
+    for kind, heading in sections.items():
+        links = ''.join(f'<li><a href="{html.escape(page["file"])}">{html.escape(page["view"]["page_title"])}</a></li>'
+                        for page in pages if page['kind'] == kind)
+        if links:
+            items.append(f"<h2>{heading}</h2><ul>{links}</ul>")
+    path = os.path.join(output_dir, 'index.html')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f"""<!DOCTYPE html>
+<html lang="es">
+<head><meta charset="UTF-8"><title>Mapas de Propiedades</title></head>
+<body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: {generate_colombia_map.BACKGROUND_COLOR};">
+<h1>🌎 Mapas de Propiedades Inmobiliarias</h1>
+{''.join(items)}
+</body>
+</html>
+""")
+    return path
+
+def generate_map_pages(df, output_dir=MAP_PAGES_DIR, workers=MAP_WORKERS, force=False,
+                       external_data=MAP_EXTERNAL_DATA, offline=MAP_OFFLINE):
+    """
+    Generar el mapa nacional y los mapas por ciudad y por segmento.
+
+    Cada página se identifica por el hash de sus filas, su vista y la
+    configuración de render; las que no cambiaron desde la última ejecución
+    (según el manifest.json de la carpeta) no se regeneran. Las pendientes
+    se generan en un pool de procesos que recibe los datos y el GeoJSON una
+    sola vez, así que el tiempo total depende del número de núcleos y no del
+    de páginas.
+
+    Returns:
+        dict: Páginas 'generated', 'skipped' y 'removed'
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pages = plan_pages(df)
+    settings = render_settings(external_data, offline)
+    last_manifest = load_manifest(output_dir)
+    previous = {} if force else last_manifest
+
+    hashes, pending = {}, []
+    for page in pages:
+        hashes[page['file']] = slice_hash(page_slice(df, page), page, settings)
+        up_to_date = (previous.get(page['file']) == hashes[page['file']]
+                      and os.path.exists(os.path.join(output_dir, page['file'])))
+        if not up_to_date:
+            pending.append(page)
+
+    print(f"🗺️ {len(pages)} páginas: {len(pending)} por generar, {len(pages) - len(pending)} sin cambios")
+    removed = remove_stale_pages(last_manifest, pages, output_dir)
+    if removed:
+        print(f"🧹 {len(removed)} páginas que ya no están en el plan eliminadas")
+    geojson = get_colombia_geojson()
+    if offline:
+        # Copia compartida de plotly.js, escrita antes de lanzar los procesos
+        plotlyjs_src(os.path.join(output_dir, pages[0]['file']), output_dir, offline=True)
+
+    # Las páginas ya generadas se conservan en el manifest aunque falle otra
+    pending_files = {page['file'] for page in pending}
+    manifest = {page['file']: previous[page['file']] for page in pages
+                if page['file'] not in pending_files and page['file'] in previous}
+    workers = max(1, min(workers, len(pending)))
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker,
+                                     initargs=(df, geojson)) as executor:
+                futures = [executor.submit(_render_page, page, output_dir, external_data, offline)
+                           for page in pending]
+                for future in as_completed(futures):
+                    file_name, n_rows, seconds = future.result()
+                    manifest[file_name] = hashes[file_name]
+                    print(f"   ✅ {file_name:<40} {n_rows:>9,} propiedades {seconds:>6.2f} s")
+        else:
+            for page in pending:
+                file_name, n_rows, seconds = _render_page(page, output_dir, external_data, offline, df, geojson)
+                manifest[file_name] = hashes[file_name]
+                print(f"   ✅ {file_name:<40} {n_rows:>9,} propiedades {seconds:>6.2f} s")
+    finally:
+        save_manifest(output_dir, manifest)
+
+    write_index(pages, output_dir)
+    return {'generated': [page['file'] for page in pending],
+            'skipped': [page['file'] for page in pages if page['file'] not in pending_files],
+            'removed': removed}
+
+def main():
+    """Generar todas las páginas de mapas: python map_pages.py [DATASET] [--force]"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    data_path = args[0] if args else None
+
+    try:
+        print("📊 Cargando y procesando datos...")
+        df = load_and_process_data(data_path)
+        if df is None or len(df) == 0:
+            print("❌ No se encontraron datos válidos con coordenadas.")
+            return
+
+        start = time.perf_counter()
+        result = generate_map_pages(df, force='--force' in sys.argv)
+        print(f"\n🎉 {len(result['generated'])} páginas generadas y {len(result['skipped'])} sin cambios "
+              f"en {time.perf_counter() - start:.2f} s")
+        print(f"📁 Índice de mapas: {os.path.join(MAP_PAGES_DIR, 'index.html')}")
+    except Exception as e:
+        print(f"❌ Error durante la generación de mapas: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+
+# Modo sin pantalla: backend Agg, sin plt.show() y figuras en procesos aparte.
+# Por defecto se activa en Linux cuando no hay DISPLAY (servidores batch).
+_DEFAULT_HEADLESS = sys.platform.startswith('linux') and not os.environ.get('DISPLAY')
+HEADLESS = os.environ.get('MIIA_HEADLESS', '1' if _DEFAULT_HEADLESS else '0') == '1'
+if HEADLESS:
+    matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+PLOTS_DIR = 'plots'
+PLOT_DPI = int(os.environ.get('MIIA_PLOT_DPI', '150'))
+PLOT_WORKERS = int(os.environ.get('MIIA_PLOT_WORKERS', '2'))
+# Por encima de este número de puntos los scatters se dibujan como densidad + muestra
+MAX_SCATTER_POINTS = 20000
+DENSITY_BINS = 200
+
+_executor = None
+_pending = []
+
+def stratified_sample(labels, max_points, seed=42):
+    """
+    Posiciones de una muestra estratificada por etiqueta de hasta `max_points` filas.
+
+    Cada etiqueta recibe una parte proporcional a su tamaño, con un mínimo
+    para que los clusters pequeños sigan siendo visibles.
+    """
+    labels = np.asarray(labels)
+    if len(labels) <= max_points:
+        return np.arange(len(labels))
+
+    rng = np.random.default_rng(seed)
+    values, counts = np.unique(labels, return_counts=True)
+    minimum = max_points // (4 * len(values))
+    quotas = np.minimum(counts, np.maximum(np.round(counts / counts.sum() * max_points), minimum)).astype(int)
+
+    order = np.argsort(labels, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    chosen = [order[start + rng.choice(count, quota, replace=False)]
+              for start, count, quota in zip(starts, counts, quotas)]
+    return np.sort(np.concatenate(chosen))
+
+def scatter_summary(x, y, labels, max_points=MAX_SCATTER_POINTS, bins=DENSITY_BINS):
+    """
+    Resumen de tamaño acotado de un scatter para dibujarlo en otro proceso.
+
+    Con pocos puntos guarda todos. Con muchos guarda una rejilla de densidad
+    de todos los puntos y una muestra estratificada por etiqueta, de modo
+    que el tiempo de dibujo y el tamaño del PNG no crecen con n.
+
+    Returns:
+        dict: Puntos (o muestra), etiquetas y rejilla de densidad opcional
+    """
+    x, y, labels = np.asarray(x), np.asarray(y), np.asarray(labels)
+    sample = stratified_sample(labels, max_points)
+    summary = {'n': len(x), 'x': x[sample], 'y': y[sample], 'labels': labels[sample], 'density': None}
+    if len(x) > max_points:
+        counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+        summary['density'] = (counts, x_edges, y_edges)
+    return summary
+
+def draw_cluster_scatter(ax, summary, cmap='viridis'):
+    """Dibujar un scatter resumido: densidad de fondo (si la hay) y puntos por cluster"""
+    if summary['density'] is not None:
+        counts, x_edges, y_edges = summary['density']
+        ax.imshow(np.log1p(counts.T), origin='lower', aspect='auto', cmap='Greys',
+                  extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+        size, alpha = 4, 0.5
+    else:
+        size, alpha = None, 0.6
+    return ax.scatter(summary['x'], summary['y'], c=summary['labels'], cmap=cmap, s=size, alpha=alpha)
+
+def _render(render, path, args):
+    """Construir una figura, guardarla y mostrarla o cerrarla según el modo"""
+    fig = render(*args)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fig.savefig(path, dpi=PLOT_DPI, bbox_inches='tight')
+    if HEADLESS:
+        plt.close(fig)
+    else:
+        plt.show()
+    return path
+
+def submit_figure(render, path, *args):
+    """
+    Renderizar una figura con `render(*args)` y guardarla en `path`.
+
+    En modo sin pantalla la figura se renderiza en un pool de procesos y la
+    función vuelve de inmediato; wait_for_figures() espera a que terminen.
+    `render` debe ser una función de módulo y `args` datos ya resumidos
+    (pequeños), porque se envían al proceso que dibuja.
+    """
+    global _executor
+    if not HEADLESS or PLOT_WORKERS < 1:
+        return _render(render, path, args)
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PLOT_WORKERS)
+    _pending.append(_executor.submit(_render, render, path, args))
+    return path
+
+def wait_for_figures():
+    """Esperar las figuras pendientes y devolver sus rutas"""
+    global _executor
+    paths = [future.result() for future in _pending]
+    _pending.clear()
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+    return paths
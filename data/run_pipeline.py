@@ -0,0 +1,209 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import pandas as pd
+import json2csv
+import listings_io
+import listing_decoder
+import dedup_listings
+import kmeans_clustering
+import cluster_model
+import cluster_quality
+import cluster_profile
+import chunked_preprocess
+import plotting
+import cluster_categories
+import generate_colombia_map
+import colombia_geo
+from plotting import wait_for_figures
+from json2csv import CHUNK_SIZE, json_to_csv
+from listings_io import DATA_DIR, atomic_write, dataset_path, file_digest, load_listing_frame, write_listings
+
+CACHE_DIR = os.path.join(DATA_DIR, '.pipeline_cache')
+# Artefactos que se conservan por etapa (los más recientes)
+CACHE_KEEP_PER_STAGE = 3
+
+def stage_key(stage, upstream, params, modules):
+    """
+    Clave de caché de una etapa.
+
+    Combina la clave (o hash) de la entrada, los parámetros de la etapa y el
+    código fuente de los módulos que la implementan, de modo que cambiar por
+    ejemplo la paleta del mapa solo invalida la etapa del mapa.
+    """
+    payload = json.dumps({
+        'stage': stage,
+        'upstream': upstream,
+        'params': params,
+        'code': [file_digest(module.__file__) for module in modules],
+    }, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+class StageCache:
+    """Caché en disco de las salidas de cada etapa, indexada por su clave"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, stage, key, extension='pkl'):
+        """Ruta del artefacto de una etapa"""
+        return os.path.join(self.cache_dir, f"{stage}-{key}.{extension}")
+
+    def has(self, stage, key, extension='pkl'):
+        return os.path.exists(self.path(stage, key, extension))
+
+    def load(self, stage, key, extension='pkl'):
+        """Cargar un artefacto: DataFrame (pkl) o texto"""
+        path = self.path(stage, key, extension)
+        if extension == 'pkl':
+            return pd.read_pickle(path)
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def save(self, stage, key, artifact, extension='pkl'):
+        """Guardar un artefacto de forma atómica y podar los antiguos de la etapa"""
+        with atomic_write(self.path(stage, key, extension)) as tmp_path:
+            if extension == 'pkl':
+                artifact.to_pickle(tmp_path, compression=None)
+            else:
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    file.write(artifact)
+        self._prune(stage, extension)
+
+    def _prune(self, stage, extension):
+        """Eliminar los artefactos más antiguos de una etapa"""
+        artifacts = sorted(glob.glob(os.path.join(self.cache_dir, f"{stage}-*.{extension}")),
+                           key=os.path.getmtime, reverse=True)
+        for path in artifacts[CACHE_KEEP_PER_STAGE:]:
+            os.remove(path)
+
+def run_pipeline(json_file_path="json_habi_data/inmobiliario.json",
+                 output_html="colombia_properties_map.html",
+                 deduplicate=True, max_clusters=10, visualize=True, workers=None,
+                 cache_dir=CACHE_DIR, force=False, kmeans_mode=None):
+    """
+    Ejecutar json_to_csv → deduplicación → KMeans → categorías → mapa en un solo proceso.
+
+    Los DataFrames pasan de una etapa a otra en memoria. La salida de cada
+    etapa se guarda en caché bajo un hash de su entrada, sus parámetros y su
+    código; al volver a ejecutar solo corren las etapas cuya clave cambió, a
+    partir de la última salida válida en caché.
+
+    Returns:
+        str: Ruta del HTML del mapa
+    """
+    cache = StageCache(cache_dir)
+    kmeans_mode = kmeans_mode or kmeans_clustering.KMEANS_MODE
+
+    # Backend de JSON configurado (MIIA_JSON_BACKEND); forma parte de la clave de ingest
+    decoder = listing_decoder.DEFAULT_BACKEND
+
+    print(f"🔑 Calculando hash de la entrada: {json_file_path}")
+    upstream = file_digest(json_file_path)
+
+    def ingest(_):
+        tmp_path = cache.path('ingest', keys['ingest'], 'parquet' if listings_io.DATA_FORMAT == 'parquet' else 'csv')
+        if not json_to_csv(json_file_path, tmp_path, chunksize=CHUNK_SIZE, workers=workers, decoder=decoder):
+            raise RuntimeError("La conversión del JSON falló")
+        df = load_listing_frame(tmp_path)
+        os.remove(tmp_path)
+        return df
+
+    def dedup(df):
+        deduplicated, mapping = dedup_listings.deduplicate_listings(df)
+        write_listings(mapping, dataset_path("inmobiliario_duplicates"))
+        print(f"🔎 {len(df) - len(deduplicated)} propiedades duplicadas eliminadas")
+        return deduplicated
+
+    def clustering(df):
+        return kmeans_clustering.cluster_listings(df, max_clusters=max_clusters, visualize=visualize,
+                                                  mode=kmeans_mode, workers=workers,
+                                                  save_model=True)[0]
+
+    def categories(df):
+        return cluster_categories.categorize_listings(df, visualize=visualize)
+
+    def render_map(df):
+        map_df = generate_colombia_map.process_data(df)
+        if len(map_df) == 0:
+            raise RuntimeError("No se encontraron datos válidos con coordenadas")
+        plotlyjs_url = generate_colombia_map.plotlyjs_src(output_html, offline=generate_colombia_map.MAP_OFFLINE)
+        return generate_colombia_map.build_map_html(map_df, plotlyjs_url)[0]
+
+    # El mapa también depende del GeoJSON local de departamentos, si existe
+    regions_path = colombia_geo.DEPARTMENTS_GEOJSON_PATH
+    regions_digest = file_digest(regions_path, missing_ok=True)
+
+    # (nombre, función, parámetros, módulos de los que depende su resultado)
+    stages = [('ingest', ingest, {'decoder': decoder, 'data_format': listings_io.DATA_FORMAT},
+               [json2csv, listings_io, listing_decoder])]
+    if deduplicate:
+        stages.append(('dedup', dedup, {}, [dedup_listings]))
+    stages += [
+        ('clustering', clustering,
+         {'max_clusters': max_clusters, 'kmeans_mode': kmeans_mode,
+          'criterion': kmeans_clustering.CLUSTER_CRITERION,
+          'sweep_sample_size': kmeans_clustering.SWEEP_SAMPLE_SIZE,
+          'out_of_core': kmeans_clustering.OUT_OF_CORE},
+         [kmeans_clustering, cluster_model, cluster_quality, cluster_profile, chunked_preprocess,
+          plotting, listings_io]),
+        ('categories', categories, {}, [cluster_categories]),
+        ('map', render_map, {'offline': generate_colombia_map.MAP_OFFLINE, 'regions': regions_digest},
+         [generate_colombia_map, colombia_geo]),
+    ]
+
+    keys = {}
+    for name, _, params, modules in stages:
+        keys[name] = upstream = stage_key(name, upstream, params, modules)
+
+    def extension(name):
+        return 'html' if name == 'map' else 'pkl'
+
+    # Buscar la última etapa con salida en caché; solo se ejecuta lo posterior
+    first_pending = 0
+    if not force:
+        for position in range(len(stages) - 1, -1, -1):
+            name = stages[position][0]
+            if cache.has(name, keys[name], extension(name)):
+                first_pending = position + 1
+                break
+
+    artifact = None
+    if first_pending > 0:
+        cached_name = stages[first_pending - 1][0]
+        print(f"♻️ Usando caché hasta la etapa '{cached_name}'")
+        artifact = cache.load(cached_name, keys[cached_name], extension(cached_name))
+
+    for name, run_stage, _, _ in stages[first_pending:]:
+        print(f"\n⚙️ Ejecutando etapa '{name}'...")
+        artifact = run_stage(artifact)
+        cache.save(name, keys[name], artifact, extension(name))
+
+    with open(output_html, 'w', encoding='utf-8') as file:
+        file.write(artifact)
+    if generate_colombia_map.MAP_OFFLINE:
+        # La página en caché referencia la copia local de plotly.js
+        generate_colombia_map.vendor_plotlyjs(os.path.dirname(os.path.abspath(output_html)))
+    wait_for_figures()
+
+    print(f"\n✅ Pipeline completado. Mapa generado en: {output_html}")
+    return output_html
+
+def main():
+    """Función principal: python run_pipeline.py [--force] [--no-dedup]"""
+    try:
+        run_pipeline(
+            deduplicate='--no-dedup' not in sys.argv,
+            workers=os.cpu_count(),
+            force='--force' in sys.argv,
+        )
+    except Exception as e:
+        print(f"❌ Error durante el pipeline: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
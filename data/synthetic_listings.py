@@ -0,0 +1,142 @@
+import sys
+import json
+import numpy as np
+
+# (ciudad, city_id, lat, lon, peso en el feed, precio medio por m² en pesos)
+CITIES = [
+    ('Bogotá', 1, 4.65, -74.08, 0.38, 5.2e6),
+    ('Medellín', 2, 6.24, -75.58, 0.20, 4.6e6),
+    ('Cali', 3, 3.45, -76.53, 0.12, 3.4e6),
+    ('Barranquilla', 4, 10.96, -74.80, 0.09, 3.6e6),
+    ('Cartagena', 5, 10.39, -75.51, 0.07, 5.0e6),
+    ('Bucaramanga', 6, 7.12, -73.12, 0.05, 3.2e6),
+    ('Pereira', 7, 4.81, -75.69, 0.04, 3.0e6),
+    ('Santa Marta', 8, 11.24, -74.20, 0.03, 3.8e6),
+    ('Chía', 9, 4.86, -74.05, 0.02, 4.8e6),
+]
+NEIGHBORHOODS = ['Centro', 'Chapinero', 'El Poblado', 'Laureles', 'Ciudad Jardín', 'El Prado',
+                 'Bocagrande', 'Cabecera', 'Pinares', 'Rodadero', 'Usaquén', 'Suba', 'Envigado',
+                 'Granada', 'Castillogrande', 'Riomar', 'Cedritos', 'Salitre', 'Normandía', 'La Castellana']
+# (tipo, peso, mediana del área en m²)
+PROPERTY_TYPES = [
+    ('apartamento', 0.58, 75), ('casa', 0.22, 140), ('apartaestudio', 0.05, 38),
+    ('local', 0.05, 90), ('oficina', 0.04, 70), ('lote', 0.03, 400),
+    ('bodega', 0.02, 600), ('finca', 0.01, 3000),
+]
+BUSINESS_TYPES = [('venta', 0.7), ('venta y arriendo', 0.1), ('arriendo', 0.2)]
+STATUSES = ['usado', 'nuevo', 'sobre planos']
+
+# Probabilidad de que cada campo venga nulo en el feed
+NULL_RATES = {
+    'rent_value': 0.12, 'rooms': 0.10, 'bathrooms': 0.08, 'garage': 0.30, 'built_area': 0.45,
+    'elevator': 0.55, 'description': 0.20, 'built_time': 0.70, 'management_value': 0.40,
+    'private_area': 0.60, 'floor_num': 0.65, 'check_in_date': 0.80, 'published_date': 0.50,
+    'stratum': 0.15, 'neighborhood': 0.05, 'coordinates': 0.04,
+}
+
+def _choice(rng, options, size):
+    """Elegir índices de `options` (tuplas cuyo segundo campo es el peso)"""
+    weights = np.array([option[1] for option in options], dtype=np.float64)
+    return rng.choice(len(options), size=size, p=weights / weights.sum())
+
+def generate_listings(n_rows, seed=42, start_id=0):
+    """
+    Generar propiedades sintéticas con el esquema del feed.
+
+    Las ciudades y tipos siguen pesos parecidos a los del feed, las
+    coordenadas se dispersan alrededor del centro de cada ciudad (con algunas
+    en 0,0 como en los datos reales), el área y el precio por m² son
+    log-normales (cola larga de propiedades muy caras) y el precio crece con
+    el estrato. Cada campo opcional es nulo con la tasa de NULL_RATES.
+
+    Returns:
+        list: Diccionarios listos para serializar como JSON
+    """
+    rng = np.random.default_rng(seed)
+
+    city = rng.choice(len(CITIES), size=n_rows, p=np.array([c[4] for c in CITIES]) / sum(c[4] for c in CITIES))
+    property_type = _choice(rng, PROPERTY_TYPES, n_rows)
+    business_type = _choice(rng, BUSINESS_TYPES, n_rows)
+
+    stratum = np.clip(np.round(rng.normal(3.5, 1.3, n_rows)), 1, 6).astype(int)
+    median_area = np.array([p[2] for p in PROPERTY_TYPES])[property_type]
+    area = np.round(median_area * rng.lognormal(0.0, 0.45, n_rows), 1)
+    price_m2 = np.array([c[5] for c in CITIES])[city] * (0.55 + 0.18 * stratum) * rng.lognormal(0.0, 0.35, n_rows)
+    sale_value = np.round(area * price_m2, -5)
+    rent_value = np.round(sale_value * rng.uniform(0.004, 0.007, n_rows), -4)
+    rooms = np.clip(np.round(area / 30 + rng.normal(0, 0.8, n_rows)), 1, 8)
+    bathrooms = np.clip(np.round(rooms * 0.7 + rng.normal(0, 0.5, n_rows)), 1, 6)
+    garage = np.clip(np.round((stratum - 2) * 0.5 + rng.normal(0, 0.6, n_rows)), 0, 4)
+
+    lat = np.array([c[2] for c in CITIES])[city] + rng.normal(0, 0.035, n_rows)
+    lon = np.array([c[3] for c in CITIES])[city] + rng.normal(0, 0.035, n_rows)
+    zero_coordinates = rng.random(n_rows) < 0.01
+    lat[zero_coordinates] = 0.0
+    lon[zero_coordinates] = 0.0
+
+    neighborhood = rng.integers(len(NEIGHBORHOODS), size=n_rows)
+    status = rng.integers(len(STATUSES), size=n_rows)
+    day = rng.integers(1, 29, size=n_rows)
+    nulls = {field: rng.random(n_rows) < rate for field, rate in NULL_RATES.items()}
+
+    def value(field, i, raw):
+        return None if nulls[field][i] else raw
+
+    listings = []
+    for i in range(n_rows):
+        city_name, city_id = CITIES[city[i]][:2]
+        type_name = PROPERTY_TYPES[property_type[i]][0]
+        neighborhood_name = value('neighborhood', i, NEIGHBORHOODS[neighborhood[i]])
+        has_coordinates = not nulls['coordinates'][i]
+        listings.append({
+            'web_id': f"{10000 + (start_id + i) * 7919 % 90000}-M{start_id + i}",
+            'rent_value': value('rent_value', i, float(rent_value[i])),
+            'business_type': BUSINESS_TYPES[business_type[i]][0],
+            'property_type': type_name,
+            'rooms': value('rooms', i, float(rooms[i])),
+            'bathrooms': value('bathrooms', i, float(bathrooms[i])),
+            'garage': value('garage', i, float(garage[i])),
+            'area': float(area[i]),
+            'built_area': value('built_area', i, float(np.round(area[i] * 0.9, 1))),
+            'elevator': value('elevator', i, bool(stratum[i] >= 4 and type_name == 'apartamento')),
+            'title': f"{type_name.title()} en Venta, {neighborhood_name or 'Sin barrio'}, {city_name}",
+            'neighborhood': neighborhood_name,
+            'city_id': city_id,
+            'city_name': city_name,
+            'built_time': value('built_time', i, f"{int(rng.integers(0, 30))} años"),
+            'description': value('description', i, f"{type_name.title()} de {area[i]:.0f} m² en {city_name}"),
+            'status': STATUSES[status[i]],
+            'management_value': value('management_value', i, float(np.round(area[i] * 4500, -3))),
+            'sale_value': float(sale_value[i]),
+            'private_area': value('private_area', i, float(area[i])),
+            'floor_num': value('floor_num', i, float(rng.integers(1, 25))),
+            'update_date': f"2025-08-{day[i]:02d}",
+            'check_in_date': value('check_in_date', i, f"2025-07-{day[i]:02d}"),
+            'published_date': value('published_date', i, f"2025-06-{day[i]:02d}"),
+            'stratum': value('stratum', i, int(stratum[i])),
+            'lon': float(lon[i]) if has_coordinates else None,
+            'lat': float(lat[i]) if has_coordinates else None,
+        })
+    return listings
+
+def write_synthetic_feed(path, n_rows, seed=42, batch_size=100000):
+    """Escribir un archivo JSON Lines con `n_rows` propiedades sintéticas, por lotes"""
+    with open(path, 'w', encoding='utf-8') as file:
+        for start in range(0, n_rows, batch_size):
+            batch = generate_listings(min(batch_size, n_rows - start), seed=seed + start, start_id=start)
+            file.write(''.join(json.dumps(listing, ensure_ascii=False) + '\n' for listing in batch))
+    return path
+
+def main():
+    """Generar un feed sintético: python synthetic_listings.py SALIDA.json [FILAS]"""
+    if len(sys.argv) < 2:
+        print("Uso: python synthetic_listings.py SALIDA.json [FILAS]")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    write_synthetic_feed(path, n_rows)
+    print(f"✅ {n_rows:,} propiedades sintéticas escritas en: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from colombia_geo import RegionIndex, _BandedEdges, _feature_edges, aggregate_by_region
+
+def _square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+@pytest.fixture
+def regions():
+    """Dos cuadrados vecinos (el oeste con un hueco) y una región de dos partes"""
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'id': 'oeste', 'properties': {'name': 'Oeste'},
+         'geometry': {'type': 'Polygon',
+                      'coordinates': [_square(0, 0, 1, 1), _square(0.4, 0.4, 0.6, 0.6)]}},
+        {'type': 'Feature', 'id': 'este', 'properties': {'name': 'Este'},
+         'geometry': {'type': 'Polygon', 'coordinates': [_square(1, 0, 2, 1)]}},
+        {'type': 'Feature', 'id': 'islas', 'properties': {'name': 'Islas'},
+         'geometry': {'type': 'MultiPolygon',
+                      'coordinates': [[_square(3, 0, 4, 1)], [_square(5, 0, 6, 1)]]}},
+    ]}
+
+def test_points_are_located_in_their_region(regions):
+    index = RegionIndex(regions)
+    lon = [0.2, 1.5, 3.5, 5.5, 4.5, 7.0]
+    lat = [0.2, 0.5, 0.5, 0.5, 0.5, 0.5]
+    assert index.region_names(lon, lat).tolist() == ['Oeste', 'Este', 'Islas', 'Islas', None, None]
+
+def test_points_in_a_hole_are_outside(regions):
+    index = RegionIndex(regions)
+    assert index.region_names([0.5, 0.3], [0.5, 0.5]).tolist() == [None, 'Oeste']
+
+def test_point_on_a_shared_edge_belongs_to_one_region(regions):
+    """Un punto sobre el borde común de dos regiones se asigna a una sola, sin perderse"""
+    index = RegionIndex(regions)
+    assert index.region_names([1.0, 1.0], [0.5, 0.25]).tolist() == ['Este', 'Este']
+
+def test_missing_coordinates_are_not_located(regions):
+    index = RegionIndex(regions)
+    assert index.locate([np.nan, 0.2], [0.2, np.nan]).tolist() == [-1, -1]
+
+def test_banded_edges_match_brute_force():
+    """Con muchas franjas, la contención coincide con la prueba sobre todas las aristas"""
+    angles = np.linspace(0, 2 * np.pi, 400, endpoint=False)
+    radius = 1 + 0.3 * np.sin(7 * angles)
+    ring = np.column_stack([radius * np.cos(angles), radius * np.sin(angles)]).tolist()
+    edges = _feature_edges({'type': 'Polygon', 'coordinates': [ring]})
+    banded = _BandedEdges(edges)
+    assert banded.n_bands > 1
+
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-1.3, 1.3, (2, 5000))
+    x1, y1, x2, y2 = edges.T
+    straddles = (y1 > y[:, None]) != (y2 > y[:, None])
+    crosses = straddles & (x[:, None] < x1 + (y[:, None] - y1) * (x2 - x1) / np.where(y2 == y1, 1.0, y2 - y1))
+    expected = (np.count_nonzero(crosses, axis=1) & 1).astype(bool)
+    assert np.array_equal(banded.contains(x, y), expected)
+
+def test_aggregate_by_region(regions):
+    df = pd.DataFrame({
+        'lon': [0.2, 0.8, 1.5, 0.5, 9.0],
+        'lat': [0.2, 0.8, 0.5, 0.5, 9.0],
+        'sale_value': [100, 300, 500, 700, 900],
+        'area': [10, 10, 0, 10, 10],
+    })
+    summary = aggregate_by_region(df, RegionIndex(regions))
+    assert summary['region'].tolist() == ['oeste', 'este']
+    assert summary['count'].tolist() == [2, 1]
+    assert summary['median_price_m2'].tolist()[0] == 20
+    assert np.isnan(summary['median_price_m2'].tolist()[1])
+    assert summary['median_sale_value'].tolist() == [200, 500]
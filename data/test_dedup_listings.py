@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from dedup_listings import deduplicate_listings, find_duplicate_groups
+
+def _listing(web_id, lat, lon, sale_value=350000000, area=80):
+    return {
+        'web_id': web_id,
+        'title': 'Apartamento en venta Chapinero Alto con balcón',
+        'city_name': 'Bogotá',
+        'property_type': 'Apartamento',
+        'neighborhood': 'Chapinero',
+        'sale_value': sale_value,
+        'area': area,
+        'lat': lat,
+        'lon': lon,
+    }
+
+def test_duplicates_are_grouped():
+    """Dos publicaciones de la misma propiedad quedan en un grupo"""
+    df = pd.DataFrame([_listing('a', 4.6500, -74.0600), _listing('b', 4.6501, -74.0601)])
+    assert find_duplicate_groups(df).tolist() == [0, 0]
+
+def test_missing_coordinates_are_not_duplicates():
+    """Una propiedad sin coordenadas no es duplicado de otra"""
+    df = pd.DataFrame([_listing('a', 4.6500, -74.0600), _listing('b', np.nan, np.nan)])
+    assert find_duplicate_groups(df).tolist() == [0, 1]
+
+def test_missing_coordinates_do_not_bridge_groups():
+    """Una fila sin coordenadas no une dos propiedades lejanas"""
+    df = pd.DataFrame([
+        _listing('norte', 4.7100, -74.0300),
+        _listing('puente', np.nan, np.nan),
+        _listing('sur', 4.5800, -74.1400),
+    ])
+    canonical = find_duplicate_groups(df)
+    assert canonical.tolist() == [0, 1, 2]
+
+    deduplicated, mapping = deduplicate_listings(df)
+    assert len(deduplicated) == 3
+    assert mapping.empty
+
+def test_members_are_checked_against_canonical():
+    """En una cadena A~B~C, C no se une a A si no es duplicado de A"""
+    df = pd.DataFrame([
+        _listing('a', 4.6500, -74.0600, sale_value=350000000),
+        _listing('b', 4.6500, -74.0600, sale_value=365000000),
+        _listing('c', 4.6500, -74.0600, sale_value=380000000),
+    ])
+    canonical = find_duplicate_groups(df)
+    assert canonical[1] == 0
+    assert canonical[2] == 2
@@ -0,0 +1,65 @@
+import json
+import pandas as pd
+import pytest
+from incremental_ingest import incremental_json_to_csv, normalize_web_id
+from json2csv import json_to_csv
+
+def _listing(web_id, rent_value=2000000, business_type='venta', **fields):
+    return {'web_id': web_id, 'business_type': business_type, 'rent_value': rent_value,
+            'area': 60.5, **fields}
+
+def _write_feed(path, records):
+    with open(path, 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+
+def test_normalize_web_id():
+    assert normalize_web_id(123) == normalize_web_id(123.0) == normalize_web_id('123') == '123'
+    assert normalize_web_id('w1') == 'w1'
+    assert normalize_web_id(None) is None
+    assert normalize_web_id(float('nan')) is None
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_incremental_update_matches_full_conversion(tmp_path, extension):
+    """Tras cambios, altas y bajas el dataset es el mismo que el de una conversión completa"""
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    feed = tmp_path / 'feed.json'
+    output = tmp_path / f'incremental{extension}'
+    records = [_listing(i) for i in range(10)]
+    if extension == '.csv':
+        # Un web_id anidado no debe confundirse con el de la propiedad
+        # (Parquet no admite columnas con objetos anidados)
+        records[2]['nested'] = {'web_id': 7}
+    _write_feed(feed, records)
+    incremental_json_to_csv(str(feed), str(output))
+
+    records[3]['rent_value'] = 2500000                        # modificada, se queda en su lugar
+    records[5]['business_type'] = 'arriendo'                  # modificada, ya no pasa el filtro
+    records[7]['area'] = 72.25                                # el web_id anidado de la fila 2 es 7
+    del records[8]                                            # eliminada
+    records.insert(4, _listing(20, floor=3))                  # nueva, con una columna nueva
+    records.append(_listing(21.0))                            # nueva, con web_id decimal
+    records[0], records[1] = records[1], records[0]           # mismas líneas, otro orden
+    _write_feed(feed, records)
+
+    incremental = incremental_json_to_csv(str(feed), str(output))
+    full = json_to_csv(str(feed), str(tmp_path / f'full{extension}'), chunksize=4)
+    if extension == '.csv':
+        assert open(incremental, encoding='utf-8').read() == open(full, encoding='utf-8').read()
+    else:
+        pd.testing.assert_frame_equal(pd.read_parquet(incremental), pd.read_parquet(full))
+
+def test_float_web_id_is_not_reprocessed(tmp_path):
+    """Un web_id numérico leído como decimal del CSV coincide con el del export"""
+    feed = tmp_path / 'feed.json'
+    output = tmp_path / 'out.csv'
+    records = [_listing(1), _listing(2), {**_listing(None), 'title': 'sin id'}]
+    _write_feed(feed, records)
+    incremental_json_to_csv(str(feed), str(output))
+
+    records.append(_listing(3))
+    _write_feed(feed, records)
+    incremental_json_to_csv(str(feed), str(output))
+    assert open(output, encoding='utf-8').read() == open(
+        json_to_csv(str(feed), str(tmp_path / 'full.csv')), encoding='utf-8').read()
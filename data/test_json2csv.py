@@ -0,0 +1,91 @@
+import json
+import pandas as pd
+import pytest
+from json2csv import json_to_csv
+from listing_decoder import available_backends
+
+def _write_feed(path, records):
+    with open(path, 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+
+def _reference_csv(path):
+    """CSV de la conversión original: json.loads, DataFrame en memoria y los mismos filtros"""
+    with open(path, 'r', encoding='utf-8') as file:
+        df = pd.DataFrame([json.loads(line) for line in file if line.strip()])
+    df = df[df['business_type'].str.contains('venta', case=False, na=False)]
+    df['rent_value'] = pd.to_numeric(df['rent_value'], errors='coerce')
+    df = df[df['rent_value'].notna() & (df['rent_value'] >= 1000000)]
+    return df.to_csv(index=False)
+
+def _mixed_feed():
+    """Feed cuyas columnas cambian de tipo entre bloques"""
+    records = []
+    for i in range(12):
+        records.append({
+            'web_id': i,
+            'business_type': 'venta',
+            'rent_value': 2000000 + i,
+            # Enteros con faltantes en el primer bloque, texto en el último
+            'floor_num': None if i % 3 == 0 else (i if i < 8 else f'piso {i}'),
+            # Enteros y decimales en el primer bloque, texto en el último
+            'stratum': (i if i % 2 else i + 0.5) if i < 8 else 'N/A',
+            'area': 50 + i,
+        })
+    return records
+
+def _edge_case_lines():
+    """Líneas con campos desconocidos y números que no todos los decodificadores aceptan"""
+    lines = []
+    for i in range(12):
+        record = {'web_id': f'w{i}', 'business_type': 'venta' if i != 5 else 'arriendo',
+                  'rent_value': 2000000 + i, 'area': 60.25 + i, 'extra_field': f'extra {i}'}
+        lines.append(json.dumps(record))
+    lines[1] = lines[1][:-1] + ', "management_value": NaN}'
+    lines[2] = lines[2][:-1] + ', "management_value": Infinity, "built_area": -Infinity}'
+    lines[3] = lines[3][:-1] + ', "big_id": 123456789012345678901234567890}'
+    lines[4] = lines[4][:-1] + ', "management_value": 1e400}'
+    lines[6] = lines[6][:-1] + ', "lat": 4.123456789012345678901}'
+    lines[7] = lines[7][:-1] + ', "nested": {"web_id": 1, "tags": ["a", "b"]}}'
+    return lines
+
+def test_streaming_matches_in_memory_with_mixed_types(tmp_path):
+    """El modo por bloques escribe el mismo CSV que el modo en memoria y que la referencia"""
+    feed = tmp_path / 'feed.json'
+    _write_feed(feed, _mixed_feed())
+
+    expected_text = _reference_csv(feed)
+    memory = json_to_csv(str(feed), str(tmp_path / 'memory.csv'))
+    streamed = json_to_csv(str(feed), str(tmp_path / 'streamed.csv'), chunksize=4)
+    sharded = json_to_csv(str(feed), str(tmp_path / 'sharded.csv'), chunksize=4, workers=2)
+
+    assert open(memory, encoding='utf-8').read() == expected_text
+    assert open(streamed, encoding='utf-8').read() == expected_text
+    assert open(sharded, encoding='utf-8').read() == expected_text
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('mode', [{}, {'chunksize': 3}, {'chunksize': 3, 'workers': 2}],
+                         ids=['memory', 'streaming', 'sharded'])
+def test_backends_match_json_reference(tmp_path, backend, mode):
+    """Todos los backends y modos escriben el CSV de json.loads, con campos desconocidos y números extremos"""
+    feed = tmp_path / 'feed.json'
+    feed.write_text('\n'.join(_edge_case_lines()) + '\n', encoding='utf-8')
+
+    output = json_to_csv(str(feed), str(tmp_path / 'out.csv'), decoder=backend, **mode)
+    assert open(output, encoding='utf-8').read() == _reference_csv(feed)
+
+def test_parquet_streaming_matches_in_memory(tmp_path):
+    """El Parquet por bloques, escrito en una sola pasada, tiene los mismos datos que el de memoria"""
+    pq = pytest.importorskip('pyarrow.parquet')
+    records = _mixed_feed()
+    for i, record in enumerate(records):
+        record['elevator'] = None if i % 5 == 0 else bool(i % 2)
+        record['city_name'] = 'Bogotá' if i % 2 else 'Medellín'
+        record['note'] = None if i < 9 else f'nota {i}'
+    feed = tmp_path / 'feed.json'
+    _write_feed(feed, records)
+
+    expected = pq.read_table(json_to_csv(str(feed), str(tmp_path / 'memory.parquet'))).to_pandas()
+    for mode in ({'chunksize': 4}, {'chunksize': 4, 'workers': 2}):
+        streamed = pq.read_table(json_to_csv(str(feed), str(tmp_path / 'streamed.parquet'), **mode)).to_pandas()
+        pd.testing.assert_frame_equal(streamed, expected)
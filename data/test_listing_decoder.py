@@ -0,0 +1,34 @@
+import json
+import pytest
+from listing_decoder import DEFAULT_BACKEND, ListingDecoder, available_backends
+
+EDGE_CASE_LINES = [
+    '{"web_id": "1", "extra_field": "se conserva"}',
+    '{"web_id": "2", "value": NaN, "low": -Infinity, "high": Infinity}',
+    '{"web_id": "3", "value": 123456789012345678901234567890}',
+    '{"web_id": "4", "value": -98765432109876543210}',
+    '{"web_id": "5", "value": 1e400}',
+    '{"web_id": "6", "title": "\\ud800 suelto"}',
+    '{"web_id": "7", "nested": {"web_id": 8}}',
+]
+
+def test_default_backend_is_stdlib_json():
+    assert DEFAULT_BACKEND == 'json'
+    assert ListingDecoder().decode is json.loads
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('line', EDGE_CASE_LINES)
+def test_backends_decode_like_json(backend, line):
+    """Cada backend devuelve lo mismo que json.loads, tanto para texto como para bytes"""
+    decoder = ListingDecoder(backend)
+    expected = json.loads(line)
+    for raw in (line, line.encode('utf-8', 'surrogatepass')):
+        decoded = decoder.decode(raw)
+        assert repr(decoded) == repr(expected)
+        assert [type(value) for value in decoded.values()] == [type(value) for value in expected.values()]
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_invalid_lines_raise_decoder_errors(backend):
+    decoder = ListingDecoder(backend)
+    with pytest.raises(decoder.errors):
+        decoder.decode('{"web_id": ')